@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_asgi_application()
+
+# uvicorn starts its workers as new processes, so each one warms up on its
+# own before accepting requests.
+if settings.WARMUP:
+    from core.warmup import warmup
+    warmup()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -56,7 +57,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.TracingMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SQLProfilingMiddleware',
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.MemoryMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -85,19 +92,268 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'app.wsgi.application'
 
+# Keeps the shared cache in memory while testing (see core.runner).
+TEST_RUNNER = 'core.runner.TestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # Checks kept connections before reusing them, and counts them in
+        # /metrics (see core.backends.postgresql).
+        'ENGINE': 'core.backends.postgresql',
         'HOST': os.environ.get('POSTGRES_HOST', 'host'),
         'NAME': os.environ.get('POSTGRES_DB', 'db'),
         'USER': os.environ.get('POSTGRES_USER', 'user'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'password'),
-        'PORT': os.environ.get('POSTGRES_PORT', '5432')
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # Fail fast when the server is unreachable instead of waiting for the
+        # OS to give up. This also bounds the deep health check.
+        'OPTIONS': {
+            'connect_timeout': int(
+                os.environ.get('POSTGRES_CONNECT_TIMEOUT', 5)
+            ),
+        },
+        # Each thread keeps its connection for up to this many seconds
+        # instead of connecting for every request, which saves the TCP and
+        # authentication round trips. 0 closes it after every request, which
+        # the development server needs: it starts a thread per request.
+        'CONN_MAX_AGE': int(
+            os.environ.get('POSTGRES_CONN_MAX_AGE', 0 if DEBUG else 600)
+        ),
+        # Check a kept connection with a SELECT 1 before a request uses it,
+        # so requests don't fail after the database restarted.
+        'CONN_HEALTH_CHECKS': bool(
+            int(os.environ.get('POSTGRES_CONN_HEALTH_CHECKS', 1))
+        ),
+    }
+}
+
+# Set POSTGRES_PGBOUNCER=1 when POSTGRES_HOST is a PgBouncer in transaction
+# pooling mode. Consecutive transactions of a connection may then run on
+# different server connections, so cursors can't outlive a transaction, and
+# nothing may be set on the session (the time zone of the database role
+# must already be TIME_ZONE).
+DATABASE_PGBOUNCER = bool(int(os.environ.get('POSTGRES_PGBOUNCER', 0)))
+if DATABASE_PGBOUNCER:
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+# Shards holding the recipes, tags and ingredients, e.g.
+# POSTGRES_SHARD_HOSTS=db-shard-1,db-shard-2/recipes. An entry is a host and
+# optionally a database name, which defaults to the primary's. Users and
+# tokens stay on the primary, which is also the first shard, so a single
+# database is a single shard. core.db_routers.ShardRouter sends each user's
+# data to their shard (see core.sharding).
+#
+# Outside the API views and sharding.use_shard() blocks, queries on the
+# recipe data go to the primary only, e.g. in shell sessions and management
+# commands. The admin pages of the recipe data show one shard at a time,
+# picked with their Shard filter. On the other shards they show the users as
+# their placeholder rows, and new rows are only added through the API (see
+# core.admin.ShardedAdminMixin).
+DATABASE_SHARDS = ['default']
+for index, shard in enumerate(filter(
+    None,
+    os.environ.get('POSTGRES_SHARD_HOSTS', '').split(','),
+)):
+    host, _, name = shard.partition('/')
+    alias = f'shard_{index + 1}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'NAME': name or DATABASES['default']['NAME'],
+    }
+    DATABASE_SHARDS.append(alias)
+
+# Rows keep their ids when a user moves to another shard, so each shard
+# hands out ids from its own range (see the init_shards command).
+SHARD_ID_RANGE = 10 ** 12
+# How long the workers cache where a user's data lives.
+SHARD_ASSIGNMENT_CACHE_SECONDS = 60
+SHARD_ASSIGNMENT_CACHE = 'shared'
+
+# Read replicas, e.g. POSTGRES_REPLICA_HOSTS=db-replica-1,db-replica-2. They
+# use the same credentials as the primary. core.db_routers.ReplicaRouter
+# sends the reads of safe API requests to them. In tests they mirror the
+# primary, so no extra test database is created.
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(
+    None,
+    os.environ.get('POSTGRES_REPLICA_HOSTS', '').split(','),
+)):
+    alias = f'replica_{index + 1}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
     }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = [
+    'core.db_routers.ShardRouter',
+    'core.db_routers.ReplicaRouter',
+]
+
+# After a write, the user's reads stay on the primary for this many seconds.
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+# Replicas further behind the primary than this are out of rotation.
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 10))
+# How often each worker checks the lag of each replica.
+REPLICA_LAG_CHECK_INTERVAL = 5
+# The stickiness marks must be seen by every worker, so they are kept in a
+# cache shared by the workers of every container (see CACHES).
+REPLICA_STICKY_CACHE = 'shared'
+
+
+# Postgres cancels the queries of the API views that run longer than
+# API_STATEMENT_TIMEOUT milliseconds or wait longer than API_LOCK_TIMEOUT for
+# a lock, so a slow query can't hold a worker for long. The view then answers
+# 503 with a Retry-After header (see core.timeouts). 0 disables a timeout.
+# Views can set their own with the statement_timeout and lock_timeout
+# attributes of core.mixins.QueryTimeoutMixin.
+API_STATEMENT_TIMEOUT = int(os.environ.get('API_STATEMENT_TIMEOUT', 5000))
+API_LOCK_TIMEOUT = int(os.environ.get('API_LOCK_TIMEOUT', 2000))
+
+# The most ids the recipe filters accept, e.g. ?tags=1,2,3.
+RECIPE_FILTER_MAX_IDS = int(os.environ.get('RECIPE_FILTER_MAX_IDS', 100))
+
+
+# How many queries each ASGI worker runs at once for the async read views
+# (see recipe.async_views). Each thread holds its own database connection.
+ASYNC_DB_THREADS = int(os.environ.get('ASYNC_DB_THREADS', 8))
+
+
+# The deep health check gives up on a query after this many seconds, and
+# reuses its result for HEALTH_CHECK_CACHE_SECONDS.
+HEALTH_CHECK_TIMEOUT = float(os.environ.get('HEALTH_CHECK_TIMEOUT', 2))
+HEALTH_CHECK_CACHE_SECONDS = float(
+    os.environ.get('HEALTH_CHECK_CACHE_SECONDS', 5)
+)
+
+
+# Each worker process writes its metrics to a file in METRICS_DIR, at most
+# every METRICS_INTERVAL seconds, and /metrics sums the files. The directory
+# must be shared by the workers of every server (in production, the app, api
+# and asgi containers mount it from one volume). The files are named after
+# METRICS_SERVER, so each server removes its own when it starts.
+METRICS_DIR = os.environ.get('METRICS_DIR', '/tmp/django-metrics')
+METRICS_SERVER = os.environ.get('METRICS_SERVER', 'app')
+METRICS_INTERVAL = float(os.environ.get('METRICS_INTERVAL', 1))
+# When set, /metrics answers only requests with an
+# "Authorization: Bearer <METRICS_TOKEN>" header (Prometheus' bearer_token).
+# In production the proxy also only lets METRICS_ALLOW reach it.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+
+# Share of the requests whose queries are profiled (0 to 1). Profiled
+# requests log queries slower than SQL_SLOW_QUERY_MS, query shapes repeated
+# SQL_REPEATED_QUERY_THRESHOLD times or more (usually an N+1), and views
+# running more queries than their budget in SQL_QUERY_BUDGETS. With
+# SQL_QUERY_BUDGET_MODE=raise (e.g. in staging), going over budget is an
+# error instead of a warning.
+SQL_PROFILING_SAMPLE_RATE = float(
+    os.environ.get('SQL_PROFILING_SAMPLE_RATE', 0)
+)
+SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))
+SQL_REPEATED_QUERY_THRESHOLD = 5
+SQL_QUERY_BUDGET_MODE = os.environ.get('SQL_QUERY_BUDGET_MODE', 'log')
+SQL_QUERY_BUDGETS = {
+    'RecipeViewSet.list': 4,
+    'RecipeViewSet.retrieve': 4,
+    'TagViewSet.list': 2,
+    'IngredientViewSet.list': 2,
+    'ManageUserView': 3,
+}
+
+
+# Tracing: 'file' appends spans as JSON lines to TRACING_FILE, 'otlp' sends
+# them to an OpenTelemetry collector. Empty turns tracing off. Requests
+# without a traceparent header are sampled at TRACING_SAMPLE_RATE, the
+# others follow the caller's sampling decision.
+TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', '')
+TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', 0.01))
+TRACING_FILE = os.environ.get('TRACING_FILE', '/tmp/traces.jsonl')
+TRACING_OTLP_ENDPOINT = os.environ.get(
+    'TRACING_OTLP_ENDPOINT',
+    'http://localhost:4318/v1/traces',
+)
+TRACING_SERVICE_NAME = 'recipe-api'
+
+
+# Staff users can profile a single request with the "X-Profile: 1" header.
+# The pstats and collapsed stacks (for flamegraph.pl or speedscope, sampled
+# every PROFILING_SAMPLE_INTERVAL seconds) are kept in PROFILING_DIR, which
+# holds at most PROFILING_MAX_CAPTURES captures, and are listed at
+# /admin/profiles/. Like METRICS_DIR, it is shared by every server, so the
+# admin lists the captures of the API workers too.
+PROFILING_DIR = os.environ.get('PROFILING_DIR', '/tmp/django-profiles')
+PROFILING_MAX_CAPTURES = int(os.environ.get('PROFILING_MAX_CAPTURES', 50))
+PROFILING_SAMPLE_INTERVAL = 0.001
+
+
+# Memory diagnostics, off unless MEMORY_DIAGNOSTICS=1. Each worker records
+# how much every view grows its RSS and diffs tracemalloc snapshots taken
+# every MEMORY_SNAPSHOT_INTERVAL seconds (keeping MEMORY_TRACEMALLOC_FRAMES
+# frames per allocation). /api/memory/ shows the MEMORY_TOP_SITES lines that
+# grew the most. A worker over MEMORY_RECYCLE_RSS_MB asks uWSGI to replace
+# it (0 disables this).
+MEMORY_DIAGNOSTICS = bool(int(os.environ.get('MEMORY_DIAGNOSTICS', 0)))
+MEMORY_SNAPSHOT_INTERVAL = float(
+    os.environ.get('MEMORY_SNAPSHOT_INTERVAL', 300)
+)
+MEMORY_TRACEMALLOC_FRAMES = 1
+MEMORY_TOP_SITES = 20
+MEMORY_RECYCLE_RSS_MB = int(os.environ.get('MEMORY_RECYCLE_RSS_MB', 0))
+
+# Warm up the URL resolver, serializers, database and so on when the WSGI
+# or ASGI application loads (see core.warmup), before the first request.
+WARMUP = bool(int(os.environ.get('WARMUP', int(not DEBUG))))
+
+# Unfiltered admin change lists of tables with more rows than this show the
+# planner's estimate instead of an exact COUNT(*).
+ADMIN_ESTIMATED_COUNT_MIN = 100000
+
+
+# Logging
+# https://docs.djangoproject.com/en/3.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core': {
+            'handlers': ['console'],
+            'level': os.environ.get('CORE_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # A file based cache is shared by all workers without any extra service.
+    # The shard assignments and the replica stickiness marks are kept in it,
+    # so every server must see the same directory: in production, the app,
+    # api and asgi containers mount it from one volume.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'DJANGO_SHARED_CACHE_DIR',
+            '/tmp/django-shared-cache',
+        ),
+    },
 }
 
 
@@ -143,6 +399,9 @@ MEDIA_URL = '/static/media/'
 STATIC_ROOT = '/vol/web/static'
 MEDIA_ROOT = '/vol/web/media'
 
+# Same as the default storage, with file writes showing up in traces.
+DEFAULT_FILE_STORAGE = 'core.storage.TracedFileSystemStorage'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -150,11 +409,65 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+# The orjson renderer and parser fall back to the stdlib json module when
+# orjson isn't installed. Set FAST_JSON=0 to use DRF's JSON classes instead.
+# A single view can still pick its own with renderer_classes/parser_classes.
+FAST_JSON = bool(int(os.environ.get('FAST_JSON', 1)))
+
+API_RENDERER_CLASSES = [
+    'core.renderers.ORJSONRenderer' if FAST_JSON
+    else 'rest_framework.renderers.JSONRenderer',
+]
+API_PARSER_CLASSES = [
+    'core.parsers.ORJSONParser' if FAST_JSON
+    else 'rest_framework.parsers.JSONParser',
+    'rest_framework.parsers.FormParser',
+    'rest_framework.parsers.MultiPartParser',
+]
+
+# Binary formats for mobile clients, picked with the Accept and Content-Type
+# headers. They are only offered when their package is installed.
+if find_spec('msgpack'):
+    API_RENDERER_CLASSES.append('core.renderers.MessagePackRenderer')
+    API_PARSER_CLASSES.append('core.parsers.MessagePackParser')
+if find_spec('cbor2'):
+    API_RENDERER_CLASSES.append('core.renderers.CBORRenderer')
+    API_PARSER_CLASSES.append('core.parsers.CBORParser')
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': API_RENDERER_CLASSES + [
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': API_PARSER_CLASSES,
+    # Answers queries cancelled by a timeout with a 503.
+    'EXCEPTION_HANDLER': 'core.timeouts.exception_handler',
 }
 
 # Make the image uploaded to work to the browsable interface.
 SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
+
+# /api/schema/ is generated once and kept in memory and in SCHEMA_CACHE_DIR
+# (see core.schema), except in development where the code changes.
+SCHEMA_CACHE = bool(int(os.environ.get('SCHEMA_CACHE', int(not DEBUG))))
+SCHEMA_CACHE_DIR = os.environ.get('SCHEMA_CACHE_DIR', '/tmp/django-schema')
+
+# How RecipeViewSet builds the list response:
+# 'serializer' - RecipeSerializer (default).
+# 'values' - plain dicts built from values() and two flat m2m queries.
+# 'sql' - JSON built by Postgres and streamed without Python encoding.
+RECIPE_LIST_BACKEND = os.environ.get('RECIPE_LIST_BACKEND', 'serializer')
+
+# Response compression (core.middleware.CompressionMiddleware). Brotli is
+# used when the brotli package is installed and the client accepts it.
+COMPRESSION_ENABLED = bool(int(os.environ.get('COMPRESSION_ENABLED', 1)))
+# Responses smaller than this (in bytes) are sent as they are.
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 512))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(
+    os.environ.get('COMPRESSION_BROTLI_QUALITY', 4)
+)
+# Streaming responses are flushed to the client every this many bytes.
+COMPRESSION_STREAM_FLUSH_SIZE = 64 * 1024
@@ -0,0 +1,62 @@
+"""
+Django settings for the workers serving the token authenticated JSON API.
+
+Everything under /api/ (except the documentation) is routed to these workers
+by nginx. They don't serve the admin or the API docs, so the apps and
+middleware those need are left out, which makes every request go through a
+shorter middleware chain and every worker smaller. Run them with
+DJANGO_SETTINGS_MODULE=app.settings_api.
+
+What is left out is the admin app (its models, the ModelAdmin classes of the
+apps and its URLs), the sessions and staticfiles apps, and drf_spectacular's
+schema generator. Some of their modules are still imported: DRF's views
+import rest_framework.schemas, which imports django.contrib.admin.sites and
+options through admindocs, and the views import drf_spectacular.utils and
+types for their schema annotations.
+"""
+from app.settings import *  # noqa: F401,F403
+from app.settings import INSTALLED_APPS, MIDDLEWARE, REST_FRAMEWORK
+
+
+# contenttypes and auth stay: the user model and its permissions need them.
+INSTALLED_APPS = [
+    app for app in INSTALLED_APPS
+    if app not in (
+        'django.contrib.admin',
+        'django.contrib.sessions',
+        'django.contrib.messages',
+        'django.contrib.staticfiles',
+        'drf_spectacular',
+    )
+]
+
+# Sessions, authentication from the session, messages, CSRF protection of
+# cookie authenticated forms and X-Frame-Options for HTML pages have no use
+# for requests authenticated with a token header.
+MIDDLEWARE = [
+    middleware for middleware in MIDDLEWARE
+    if middleware not in (
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.middleware.csrf.CsrfViewMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+        'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    )
+]
+
+ROOT_URLCONF = 'app.urls_api'
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    # Without the sessions there is no browsable API to log into, and the
+    # schema is generated by the other workers.
+    'DEFAULT_RENDERER_CLASSES': API_RENDERER_CLASSES,  # noqa: F405
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    # Views need a schema class, but drf_spectacular's would import it.
+    'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.openapi.AutoSchema',
+}
+
+# The schema is served by the workers with the full settings.
+SCHEMA_CACHE = False
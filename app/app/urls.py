@@ -13,22 +13,33 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+from drf_spectacular.views import SpectacularSwaggerView
 from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 
+from core import admin_views
 from core import views as core_views
+from core.schema import SchemaView
 
 urlpatterns = [
+    # Before admin.site.urls, which would otherwise answer these paths.
+    path('admin/profiles/', admin_views.profiles, name='profiles'),
+    path(
+        'admin/profiles/<str:capture_id>.<str:extension>',
+        admin_views.profile_download,
+        name='profile-download',
+    ),
     path('admin/', admin.site.urls),
     path('api/health-check/', core_views.health_check, name='health-check'),
-    # generate schema file(yaml file) for project.
-    path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
+    path('api/health-check/live/', core_views.liveness, name='liveness'),
+    path('api/health-check/ready/', core_views.readiness, name='readiness'),
+    path('metrics', core_views.metrics, name='metrics'),
+    path('api/memory/', core_views.memory, name='memory'),
+    # generate schema file(yaml file) for project. It is generated once and
+    # cached, see core.schema.
+    path('api/schema/', SchemaView.as_view(), name='api-schema'),
     # tell what schema we will use when loading swagger docs.
     path(
         'api/docs/',
@@ -41,6 +52,11 @@ urlpatterns = [
     path(
         'api/recipe/', include('recipe.urls')
     ),
+    # Async versions of the recipe read endpoints, served by the ASGI
+    # server in production (see compose/production/django/start-asgi).
+    path(
+        'api/async/recipe/', include('recipe.async_urls')
+    ),
 ]
 
 # This code is used to serve static files (e.g. images, JavaScript, CSS) in
@@ -0,0 +1,18 @@
+"""
+URL configuration of the API-only workers (see app.settings_api).
+"""
+from django.urls import path, include
+
+from core import views as core_views
+
+
+urlpatterns = [
+    path('api/health-check/', core_views.health_check, name='health-check'),
+    path('api/health-check/live/', core_views.liveness, name='liveness'),
+    path('api/health-check/ready/', core_views.readiness, name='readiness'),
+    path('metrics', core_views.metrics, name='metrics'),
+    path('api/memory/', core_views.memory, name='memory'),
+    path('api/user/', include('user.urls')),
+    path('api/recipe/', include('recipe.urls')),
+    path('api/async/recipe/', include('recipe.async_urls')),
+]
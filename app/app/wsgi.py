@@ -9,8 +9,16 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
 application = get_wsgi_application()
+
+# uWSGI imports this module in its master process and forks the workers from
+# it, so what is warmed up here is done once and shared by all workers,
+# rather than slowing down the first requests of each one.
+if settings.WARMUP:
+    from core.warmup import warmup
+    warmup()
@@ -2,19 +2,310 @@
 Django admin customization.
 """
 # gettext_lazy: automatically translate text to the language you want.
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin import widgets
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ERROR_FLAG
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.http import Http404, HttpResponseRedirect, QueryDict
+from django.template.response import SimpleTemplateResponse
+from django.urls import path, reverse
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
-from . import models
+from . import exports, models, sharding
 
 
-class UserAdmin(BaseUserAdmin):
+def estimated_count(queryset):
+    """Return the planner's row estimate of the queryset's table, or None."""
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table],
+        )
+        row = cursor.fetchone()
+
+    # reltuples is -1 until the table is first vacuumed or analyzed.
+    if row is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+# COUNT(*) reads the whole table in PostgreSQL, which takes longer than the
+# page itself on big tables. The estimate kept up to date by autovacuum is
+# close enough to number the pages of an unfiltered list.
+class EstimatedCountPaginator(Paginator):
+    """Count big unfiltered querysets with the planner's estimate."""
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimated_count(self.object_list)
+            if (estimate is not None
+                    and estimate >= settings.ADMIN_ESTIMATED_COUNT_MIN):
+                return estimate
+        return super().count
+
+
+class ScalableModelAdmin(admin.ModelAdmin):
+    """Admin options that keep the change list fast on big tables."""
+    paginator = EstimatedCountPaginator
+    # Don't run a second COUNT(*) of the whole table next to the filtered
+    # one just to show "x results (y total)".
+    show_full_result_count = False
+
+
+# With several shards, the pages of the recipe data show one shard at a
+# time, picked with this filter (?shard=). The change and delete pages find
+# it in the change list's query string, which the admin keeps in their links
+# as _changelist_filters.
+class ShardFilter(admin.SimpleListFilter):
+    """Pick the shard the change list reads from."""
+    title = _('shard')
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [(alias, alias) for alias in settings.DATABASE_SHARDS]
+
+    def value(self):
+        return super().value() or settings.DATABASE_SHARDS[0]
+
+    def choices(self, changelist):
+        choices = super().choices(changelist)
+        # "All" would only show the first shard.
+        next(choices)
+        yield from choices
+
+    def queryset(self, request, queryset):
+        # The whole view already runs on the shard (see ShardedAdminMixin).
+        return queryset
+
+
+class ShardRawIdWidget(widgets.ManyToManyRawIdWidget):
+    """Raw id input whose lookup lists the objects of one shard."""
+
+    def __init__(self, rel, admin_site, shard, **kwargs):
+        super().__init__(rel, admin_site, **kwargs)
+        self.shard = shard
+
+    def base_url_parameters(self):
+        params = super().base_url_parameters()
+        params[ShardFilter.parameter_name] = self.shard
+        return params
+
+
+class ShardedAdminMixin:
+    """Serve the admin pages of a sharded model from the picked shard."""
+
+    def get_shard(self, request):
+        """Return the shard picked with ShardFilter, the first by default."""
+        shard = request.GET.get(ShardFilter.parameter_name)
+        if shard is None and '_changelist_filters' in request.GET:
+            shard = QueryDict(request.GET['_changelist_filters']).get(
+                ShardFilter.parameter_name,
+            )
+        shard = shard or settings.DATABASE_SHARDS[0]
+        if shard not in settings.DATABASE_SHARDS:
+            raise Http404
+        return shard
+
+    def _on_shard(self, request, view, *args, **kwargs):
+        with sharding.use_shard(self.get_shard(request)):
+            response = view(request, *args, **kwargs)
+            # Template responses run the queries of the page when they
+            # render, which must happen on the shard too.
+            if isinstance(response, SimpleTemplateResponse):
+                response.render()
+        return response
+
+    def changelist_view(self, request, extra_context=None):
+        return self._on_shard(
+            request, super().changelist_view, extra_context,
+        )
+
+    def changeform_view(self, request, object_id=None, form_url='',
+                        extra_context=None):
+        return self._on_shard(
+            request, super().changeform_view, object_id, form_url,
+            extra_context,
+        )
+
+    def delete_view(self, request, object_id, extra_context=None):
+        return self._on_shard(
+            request, super().delete_view, object_id, extra_context,
+        )
+
+    def history_view(self, request, object_id, extra_context=None):
+        return self._on_shard(
+            request, super().history_view, object_id, extra_context,
+        )
+
+    # Only reached when listed before ExportMixin.
+    def export_view(self, request, fmt):
+        return self._on_shard(request, super().export_view, fmt)
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if len(settings.DATABASE_SHARDS) > 1:
+            return [ShardFilter, *list_filter]
+        return list_filter
+
+    # New rows belong on their owner's shard, which the form can't pick, so
+    # with several shards they are only added through the API.
+    def has_add_permission(self, request):
+        if len(settings.DATABASE_SHARDS) > 1:
+            return False
+        return super().has_add_permission(request)
+
+    # The autocomplete requests don't say which shard the form is on, so the
+    # forms of the other shards get raw id inputs instead.
+    def get_autocomplete_fields(self, request):
+        if self.get_shard(request) != settings.DATABASE_SHARDS[0]:
+            return ()
+        return super().get_autocomplete_fields(request)
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        shard = self.get_shard(request)
+        if (shard != settings.DATABASE_SHARDS[0]
+                and db_field.name in self.autocomplete_fields):
+            kwargs['widget'] = ShardRawIdWidget(
+                db_field.remote_field,
+                self.admin_site,
+                shard,
+                using=kwargs.get('using'),
+            )
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+
+class ExportMixin:
+    """Export the selected or the listed objects as CSV or NDJSON."""
+    # values() lookups, e.g. 'user__email' or 'tags__name', many to many
+    # ones exported as lists.
+    export_fields = []
+    actions = ['export_csv', 'export_ndjson']
+    # Adds export links next to the "Add" button of the change list.
+    change_list_template = 'admin/export_change_list.html'
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path(
+                'export/<str:fmt>/',
+                self.admin_site.admin_view(self.export_view),
+                name='%s_%s_export' % info,
+            ),
+        ] + super().get_urls()
+
+    def export(self, queryset, fmt):
+        """Return a response streaming queryset in format fmt."""
+        # The rows are read while streaming, after the view returned, so the
+        # database (e.g. the shard picked in the admin) is fixed now.
+        return exports.export_response(
+            queryset.using(queryset.db),
+            self.export_fields,
+            fmt,
+            self.model._meta.verbose_name_plural.replace(' ', '-'),
+        )
+
+    def export_view(self, request, fmt):
+        """Export what the change list shows with the same query string."""
+        if fmt not in exports.FORMATS:
+            raise Http404
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        try:
+            changelist = self.get_changelist_instance(request)
+        except IncorrectLookupParameters:
+            # Same as the change list does with invalid filters.
+            opts = self.model._meta
+            return HttpResponseRedirect(reverse(
+                f'admin:{opts.app_label}_{opts.model_name}_changelist',
+            ) + f'?{ERROR_FLAG}=1')
+        return self.export(changelist.queryset, fmt)
+
+    @admin.action(
+        description=_('Export selected %(verbose_name_plural)s as CSV'),
+        permissions=['view'],
+    )
+    def export_csv(self, request, queryset):
+        return self.export(queryset, 'csv')
+
+    @admin.action(
+        description=_('Export selected %(verbose_name_plural)s as NDJSON'),
+        permissions=['view'],
+    )
+    def export_ndjson(self, request, queryset):
+        return self.export(queryset, 'ndjson')
+
+
+class HasImageFilter(admin.SimpleListFilter):
+    """Filter recipes on whether they have an image."""
+    title = _('image')
+    parameter_name = 'has_image'
+
+    def lookups(self, request, model_admin):
+        return (('yes', _('Yes')), ('no', _('No')))
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.exclude(image__isnull=True).exclude(image='')
+        if self.value() == 'no':
+            return queryset.filter(Q(image__isnull=True) | Q(image=''))
+        return queryset
+
+
+# Filtering on a field directly makes the admin SELECT DISTINCT all of its
+# values to build the choices. Fixed ranges cost no query at all.
+class CookingTimeFilter(admin.SimpleListFilter):
+    """Filter recipes on ranges of time_minutes."""
+    title = _('cooking time')
+    parameter_name = 'time'
+    ranges = {
+        'quick': (None, 15),
+        'medium': (15, 60),
+        'long': (60, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return (
+            ('quick', _('Under 15 minutes')),
+            ('medium', _('15 to 60 minutes')),
+            ('long', _('Over an hour')),
+        )
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.ranges:
+            return queryset
+        low, high = self.ranges[self.value()]
+        if low is not None:
+            queryset = queryset.filter(time_minutes__gte=low)
+        if high is not None:
+            queryset = queryset.filter(time_minutes__lt=high)
+        return queryset
+
+
+class UserAdmin(ExportMixin, BaseUserAdmin):
     """Define the admin pages for users."""
     # order by id
     # the list will only display email and name
     ordering = ['id']
     list_display = ['email', 'name']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # '^' searches by prefix (istartswith), which the UPPER(...) pattern
+    # indexes of migration 0009 can serve. A plain 'email' would search
+    # with icontains, a full scan of the table.
+    search_fields = ['^email', '^name']
+    export_fields = [
+        'id', 'email', 'name', 'is_active', 'is_staff', 'is_superuser',
+        'last_login',
+    ]
     # fieldset is a tuple, inside it contains more tuple/sub tuple,
     # each sub tuple contains a title and a field dict. The first one
     # doesn't have title --> None. If a set has a title, it should be in
@@ -88,7 +379,41 @@ class UserAdmin(BaseUserAdmin):
 # You must add the second argument if you want to register the user to
 # your custom admin. If you don't have custom admin then the second argument
 # is optional.
+class RecipeAdmin(ShardedAdminMixin, ExportMixin, ScalableModelAdmin):
+    """Define the admin pages for recipes."""
+    list_display = ['title', 'user', 'time_minutes', 'price']
+    # Fetch the users in the list query rather than one query per row.
+    list_select_related = ['user']
+    list_filter = [CookingTimeFilter, HasImageFilter]
+    search_fields = ['^title', '=user__email']
+    # The default widgets render every user, tag and ingredient in the
+    # database as an option. These only render the selected ones.
+    raw_id_fields = ['user']
+    autocomplete_fields = ['tags', 'ingredients']
+    export_fields = [
+        'id', 'user__email', 'title', 'time_minutes', 'price', 'link',
+        'description', 'image', 'tags__name', 'ingredients__name',
+    ]
+
+
+class TagAdmin(ShardedAdminMixin, ScalableModelAdmin):
+    """Define the admin pages for tags."""
+    list_display = ['name', 'user']
+    list_select_related = ['user']
+    # Also used by the autocomplete widget of RecipeAdmin.
+    search_fields = ['^name']
+    raw_id_fields = ['user']
+
+
+class IngredientAdmin(ShardedAdminMixin, ScalableModelAdmin):
+    """Define the admin pages for ingredients."""
+    list_display = ['name', 'user']
+    list_select_related = ['user']
+    search_fields = ['^name']
+    raw_id_fields = ['user']
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
+admin.site.register(models.Recipe, RecipeAdmin)
+admin.site.register(models.Tag, TagAdmin)
+admin.site.register(models.Ingredient, IngredientAdmin)
@@ -0,0 +1,39 @@
+"""
+Views added to the admin site.
+
+They are kept apart from core.views so that the API-only settings
+(app.settings_api) never import them.
+"""
+import os
+
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+
+from core import profiling
+
+
+@staff_member_required
+def profiles(request):
+    """Lists the captured request profiles in the admin."""
+    return render(request, 'admin/profiles.html', {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profiling.list_profiles(),
+    })
+
+
+@staff_member_required
+def profile_download(request, capture_id, extension):
+    """Returns the pstats or collapsed stacks file of a capture."""
+    path = profiling.profile_path(capture_id, extension)
+    if (extension not in ('prof', 'collapsed') or path is None
+            or not os.path.exists(path)):
+        raise Http404('No such profile.')
+
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=os.path.basename(path),
+    )
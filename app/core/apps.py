@@ -4,3 +4,22 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.backends.signals import connection_created
+
+        from core import metrics, sql_profiling, timeouts, tracing
+
+        # Every database connection counts the queries of the request it
+        # runs them for (see core.metrics), and profiles and traces them
+        # for sampled requests (see core.sql_profiling and core.tracing).
+        connection_created.connect(metrics.instrument_connection)
+        connection_created.connect(sql_profiling.instrument_connection)
+        connection_created.connect(tracing.instrument_connection)
+        # Applies the timeouts of the API views to their queries (see
+        # core.timeouts). Behind PgBouncer in transaction mode, a setting
+        # would stick to a server connection other clients then use, so the
+        # timeouts are left to PgBouncer's query_timeout.
+        if not settings.DATABASE_PGBOUNCER:
+            connection_created.connect(timeouts.instrument_connection)
@@ -0,0 +1,95 @@
+"""
+PostgreSQL backend keeping each thread's connection between requests.
+"""
+import time
+
+from django.db.backends.postgresql import base
+
+from core import metrics
+
+
+# Django keeps a connection per thread and alias, and closes it at the end
+# of every request unless CONN_MAX_AGE says otherwise. Kept connections are
+# then reused by the next requests of the same thread, so each uWSGI worker
+# and each thread of the async views holds a pool of one connection per
+# database.
+#
+# A kept connection may have been closed by the server since the last
+# request (a restart, a failover, an idle timeout). Django only notices when
+# a query fails, which fails the request. With CONN_HEALTH_CHECKS, the
+# connection is checked with a SELECT 1 before it is first used by a
+# request, and replaced when the check fails. This is Django 4.1's
+# CONN_HEALTH_CHECKS, so this backend can go once the project upgrades.
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL connection with health checks and metrics."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Whether the connection was checked since the request started.
+        self.health_check_done = False
+        # The timeouts set with SET LOCAL in the current transaction (see
+        # core.timeouts). They end with it, or with a rollback to a savepoint
+        # taken before them.
+        self.transaction_timeouts = None
+
+    @property
+    def health_check_enabled(self):
+        return self.settings_dict.get('CONN_HEALTH_CHECKS', False)
+
+    def connect(self):
+        # A new connection needs no check, including while connect() sets
+        # it up.
+        self.health_check_done = True
+        super().connect()
+        metrics.record_connection(self.alias, 'opened')
+
+    def close(self):
+        connected = self.connection is not None
+        super().close()
+        if connected and self.connection is None:
+            metrics.record_connection(self.alias, 'closed')
+
+    def close_if_health_check_failed(self):
+        """Replace the connection if it doesn't answer anymore."""
+        # In a transaction, the connection can't be replaced anyway.
+        if (self.connection is None or self.health_check_done
+                or self.in_atomic_block):
+            return
+        self.health_check_done = True
+        if self.health_check_enabled and not self.is_usable():
+            metrics.record_connection(self.alias, 'unhealthy')
+            self.close()
+        else:
+            metrics.record_connection(self.alias, 'reused')
+
+    def _commit(self):
+        self.transaction_timeouts = None
+        super()._commit()
+
+    def _rollback(self):
+        self.transaction_timeouts = None
+        super()._rollback()
+
+    def _savepoint_rollback(self, sid):
+        # Whether the savepoint is older than the SET LOCAL isn't known, so
+        # the timeouts are set again either way.
+        self.transaction_timeouts = None
+        super()._savepoint_rollback(sid)
+
+    def ensure_connection(self):
+        self.close_if_health_check_failed()
+        super().ensure_connection()
+
+    # Called by the request_started and request_finished signals.
+    def close_if_unusable_or_obsolete(self):
+        expired = (
+            self.connection is not None and self.close_at is not None
+            and time.monotonic() >= self.close_at
+        )
+        # The checks below use the connection, which must not count as
+        # the first use of the next request.
+        self.health_check_done = True
+        super().close_if_unusable_or_obsolete()
+        if expired and self.connection is None:
+            metrics.record_connection(self.alias, 'expired')
+        self.health_check_done = False
@@ -0,0 +1,91 @@
+"""
+Helpers for benchmark commands.
+"""
+import statistics
+import time
+import uuid
+
+
+def percentile(samples, pct):
+    """Return the pct-th percentile of samples (nearest rank)."""
+    ordered = sorted(samples)
+    index = max(0, int(round(pct / 100 * len(ordered))) - 1)
+    return ordered[index]
+
+
+def measure(func, repeat=10, warmup=1):
+    """Call func repeatedly and return timing statistics in milliseconds."""
+    # Warmup runs fill caches (query plans, imports, field maps) so that they
+    # don't skew the first measurements.
+    for _ in range(warmup):
+        func()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'repeat': repeat,
+        'mean': statistics.mean(samples),
+        'min': min(samples),
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+    }
+
+
+def format_stats(name, stats):
+    """Return a one-line summary of stats returned by measure()."""
+    return (
+        f'{name:<28} mean {stats["mean"]:9.2f}ms  '
+        f'p50 {stats["p50"]:9.2f}ms  p95 {stats["p95"]:9.2f}ms'
+    )
+
+
+def recipe_payload(size):
+    """Return size recipes shaped like RecipeDetailSerializer output."""
+    return [
+        {
+            'id': i,
+            'title': f'Recipe {i}',
+            'time_minutes': 5 + i % 120,
+            'price': f'{i % 100}.99',
+            'link': f'https://example.com/recipes/{i}',
+            'tags': [
+                {'id': i * 3 + j, 'name': f'Tag {j}'} for j in range(3)
+            ],
+            'ingredients': [
+                {'id': i * 5 + j, 'name': f'Ingredient {j}'} for j in range(5)
+            ],
+            'image': f'http://localhost/static/media/{uuid.uuid4()}.jpg',
+            'description': 'Mix everything and cook until done. ' * 4,
+        }
+        for i in range(size)
+    ]
+
+
+class Rollback(Exception):
+    """Raised to roll back the data a benchmark created."""
+
+
+def compare(baseline, current, threshold):
+    """Return [(key, base, now, regressed)] for stats in both runs.
+
+    Both are {key: stats} with a p50 and a query count. A key regressed if
+    its p50 grew by more than threshold (0.1 is 10%) or it runs more
+    queries.
+    """
+    rows = []
+    for key, now in current.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        regressed = (
+            now['p50'] > base['p50'] * (1 + threshold)
+            or now.get('queries', 0) > base.get('queries', 0)
+        )
+        rows.append((key, base, now, regressed))
+
+    return rows
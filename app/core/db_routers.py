@@ -0,0 +1,169 @@
+"""
+Database routers.
+"""
+import contextlib
+import contextvars
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from core import sharding
+
+
+# Reads only go to a replica inside use_replicas(). Views turn it on for
+# safe requests once the user is known (see core.mixins.ReplicaReadMixin),
+# so everything else, including authentication, reads from the primary.
+_use_replicas = contextvars.ContextVar('use_replicas', default=False)
+
+# {alias: (checked_at, lag_seconds)}, shared by the threads of a worker.
+_lag_cache = {}
+_lag_lock = threading.Lock()
+
+REPLICA_LAG_SQL = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+END
+"""
+
+
+@contextlib.contextmanager
+def use_replicas(enabled=True):
+    """Send reads inside the block to the replicas."""
+    token = _use_replicas.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replicas.reset(token)
+
+
+def allow_replica_reads():
+    """Send the remaining reads of this use_replicas() block to replicas."""
+    _use_replicas.set(True)
+
+
+def _sticky_key(user_id):
+    """Return the cache key marking a recent write by the user."""
+    return f'replica-sticky:{user_id}'
+
+
+def mark_write(user_id):
+    """Keep the user's reads on the primary for REPLICA_STICKY_SECONDS."""
+    caches[settings.REPLICA_STICKY_CACHE].set(
+        _sticky_key(user_id),
+        True,
+        timeout=settings.REPLICA_STICKY_SECONDS,
+    )
+
+
+def is_sticky(user_id):
+    """Return True if the user wrote recently."""
+    return caches[settings.REPLICA_STICKY_CACHE].get(
+        _sticky_key(user_id),
+        False,
+    )
+
+
+def replica_lag(alias):
+    """Return how many seconds the replica is behind the primary."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(REPLICA_LAG_SQL)
+        lag = cursor.fetchone()[0]
+
+    # A replica that never replayed anything has no timestamp yet.
+    return float(lag) if lag is not None else float('inf')
+
+
+def get_lag(alias):
+    """Return the replica lag, checked at most every few seconds."""
+    now = time.monotonic()
+    checked_at, lag = _lag_cache.get(alias, (None, None))
+
+    if (checked_at is None
+            or now - checked_at >= settings.REPLICA_LAG_CHECK_INTERVAL):
+        with _lag_lock:
+            try:
+                lag = replica_lag(alias)
+            except Exception:
+                # An unreachable replica is out of rotation until the next
+                # check succeeds.
+                lag = float('inf')
+            _lag_cache[alias] = (now, lag)
+
+    return lag
+
+
+def healthy_replicas():
+    """Return the replicas that are not lagging behind too much."""
+    return [
+        alias for alias in settings.DATABASE_REPLICAS
+        if get_lag(alias) <= settings.REPLICA_MAX_LAG_SECONDS
+    ]
+
+
+def choose_replica():
+    """Return a healthy replica alias, or None to use the primary."""
+    replicas = healthy_replicas()
+    return random.choice(replicas) if replicas else None
+
+
+class ShardRouter:
+    """Send queries on the recipe data to the owner's shard."""
+
+    def _db_for_model(self, model, **hints):
+        if model._meta.label not in sharding.SHARDED_MODELS:
+            return None
+
+        # Related managers and saves carry the instance, which must stay on
+        # the database it came from. Other queries use the request's shard.
+        instance = hints.get('instance')
+        db = getattr(getattr(instance, '_state', None), 'db', None)
+        shard = db if db in settings.DATABASE_SHARDS else (
+            sharding.current_shard()
+        )
+
+        # The primary is left to the next router, which may pick a replica.
+        return shard if shard != 'default' else None
+
+    db_for_read = _db_for_model
+    db_for_write = _db_for_model
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Sharded rows point to users, which live on the primary and are
+        # mirrored to each shard.
+        labels = {obj1._meta.label, obj2._meta.label}
+        if labels & sharding.SHARDED_MODELS:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every shard gets the whole schema for the foreign keys to work.
+        if db in settings.DATABASE_SHARDS:
+            return True
+        return None
+
+
+class ReplicaRouter:
+    """Send reads to the replicas and writes to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if not _use_replicas.get() or not settings.DATABASE_REPLICAS:
+            return None
+
+        return choose_replica()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data, so objects read from any of them
+        # can be related to each other.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary through replication.
+        return db not in settings.DATABASE_REPLICAS
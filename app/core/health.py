@@ -0,0 +1,107 @@
+"""
+Dependency probes for the deep health check.
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+
+
+# {'checked_at': .., 'result': ..}, shared by the threads of a worker.
+_last_check = {}
+_check_lock = threading.Lock()
+
+
+def check_database(alias):
+    """Run a trivial query that gives up after HEALTH_CHECK_TIMEOUT."""
+    timeout_ms = int(settings.HEALTH_CHECK_TIMEOUT * 1000)
+    # SET LOCAL only lasts until the end of the transaction, so the timeout
+    # doesn't stick to the connection.
+    with transaction.atomic(using=alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SET LOCAL statement_timeout = %s', [timeout_ms])
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+
+
+def check_cache(alias):
+    """Write, read back and delete a key."""
+    cache = caches[alias]
+    key = f'health-check:{uuid.uuid4()}'
+    value = str(uuid.uuid4())
+
+    cache.set(key, value, timeout=10)
+    try:
+        if cache.get(key) != value:
+            raise RuntimeError('Value read back does not match.')
+    finally:
+        cache.delete(key)
+
+
+def check_storage():
+    """Write and delete a file in the media storage."""
+    name = default_storage.save(
+        f'health-check/{uuid.uuid4()}',
+        ContentFile(b'ok'),
+    )
+    default_storage.delete(name)
+
+
+def probes():
+    """Return [(name, func, args)] for every dependency to check."""
+    return [
+        *(
+            (f'database:{alias}', check_database, [alias])
+            for alias in settings.DATABASE_SHARDS
+        ),
+        *(
+            (f'cache:{alias}', check_cache, [alias])
+            for alias in settings.CACHES
+        ),
+        ('storage', check_storage, []),
+    ]
+
+
+def run_checks():
+    """Probe every dependency and return the report."""
+    checks = {}
+    for name, func, args in probes():
+        start = time.perf_counter()
+        try:
+            func(*args)
+            check = {'healthy': True}
+        except Exception as exc:
+            # Only the error type is reported: the check is public and the
+            # message may contain hosts or paths.
+            check = {'healthy': False, 'error': type(exc).__name__}
+        check['latency_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        checks[name] = check
+
+    return {
+        'healthy': all(check['healthy'] for check in checks.values()),
+        'checks': checks,
+    }
+
+
+# Load balancers poll often, and every worker answers them. Reusing a recent
+# result keeps that from turning into a steady load on the database.
+def deep_check():
+    """Return the report, probing at most every HEALTH_CHECK_CACHE_SECONDS."""
+    with _check_lock:
+        now = time.monotonic()
+        checked_at = _last_check.get('checked_at')
+
+        if (checked_at is None
+                or now - checked_at >= settings.HEALTH_CHECK_CACHE_SECONDS):
+            _last_check['result'] = run_checks()
+            _last_check['checked_at'] = checked_at = now
+
+        return {
+            **_last_check['result'],
+            'age_seconds': round(now - checked_at, 2),
+        }
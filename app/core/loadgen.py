@@ -0,0 +1,252 @@
+"""
+Open-loop HTTP load generation with asyncio, and latency reports.
+"""
+import asyncio
+import math
+import ssl
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+from core.benchmark import percentile
+
+
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+class HTTPError(Exception):
+    """Raised when a response can't be read."""
+
+
+class Connection:
+    """A keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.https = parts.scheme == 'https'
+        self.port = parts.port or (443 if self.https else 80)
+        self.host_header = parts.netloc
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host,
+            self.port,
+            ssl=ssl.create_default_context() if self.https else None,
+        )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=b''):
+        """Send a request and return (status, headers, body)."""
+        lines = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.host_header}',
+            f'Content-Length: {len(body)}',
+            *(f'{name}: {value}' for name, value in (headers or {}).items()),
+        ]
+        try:
+            if self.writer is None:
+                await self._connect()
+            self.writer.write(
+                ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+            )
+            await self.writer.drain()
+            return await self._read_response()
+        except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+            self.close()
+            raise HTTPError(str(exc)) from exc
+
+    async def _read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HTTPError('Connection closed by the server.')
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding') == 'chunked':
+            body = await self._read_chunked()
+        else:
+            body = await self.reader.readexactly(
+                int(headers.get('content-length', 0))
+            )
+
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, headers, body
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                # Trailers, if any, end with an empty line.
+                while (await self.reader.readline()) not in (b'\r\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+
+class ConnectionPool:
+    """At most size connections, handed out to one request at a time."""
+
+    def __init__(self, url, size):
+        self.url = url
+        self.idle = asyncio.Queue()
+        for _ in range(size):
+            self.idle.put_nowait(Connection(url))
+
+    async def request(self, method, path, headers=None, body=b''):
+        """Send a request on a free connection, waiting for one if needed."""
+        connection = await self.idle.get()
+        try:
+            return await connection.request(method, path, headers, body)
+        finally:
+            self.idle.put_nowait(connection)
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get_nowait().close()
+
+
+class Results:
+    """Latencies and outcomes of the requests of a run."""
+
+    def __init__(self):
+        # {action: [seconds]}, measured from when the request was due
+        # (corrected) and from when it was actually sent (uncorrected).
+        self.corrected = defaultdict(list)
+        self.uncorrected = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.errors = Counter()
+        self.started = None
+        self.finished = None
+
+    def record(self, action, due, sent, done, status):
+        """Record a finished request; status None means it failed."""
+        self.corrected[action].append(done - due)
+        self.uncorrected[action].append(done - sent)
+        self.statuses[action][status or 'error'] += 1
+        if status is None or status >= 500:
+            self.errors[action] += 1
+
+    @property
+    def duration(self):
+        return self.finished - self.started
+
+    def summary(self):
+        """Return the report in a JSON friendly form."""
+        def latencies(samples):
+            if not samples:
+                return {}
+            return {
+                **{
+                    f'p{pct}': percentile(samples, pct) * 1000
+                    for pct in PERCENTILES
+                },
+                'max': max(samples) * 1000,
+            }
+
+        actions = {}
+        for action in self.corrected:
+            count = len(self.corrected[action])
+            actions[action] = {
+                'requests': count,
+                'errors': self.errors[action],
+                'error_rate': self.errors[action] / count,
+                'statuses': {
+                    str(status): n
+                    for status, n in self.statuses[action].items()
+                },
+                'corrected_ms': latencies(self.corrected[action]),
+                'uncorrected_ms': latencies(self.uncorrected[action]),
+            }
+
+        everything = [s for samples in self.corrected.values()
+                      for s in samples]
+        total = len(everything)
+        errors = sum(self.errors.values())
+        return {
+            'duration_s': self.duration,
+            'requests': total,
+            'throughput_rps': total / self.duration if self.duration else 0,
+            'errors': errors,
+            'error_rate': errors / total if total else 0,
+            'corrected_ms': latencies(everything),
+            'uncorrected_ms': latencies([
+                s for samples in self.uncorrected.values() for s in samples
+            ]),
+            'actions': actions,
+        }
+
+
+def histogram(samples, buckets_per_decade=4):
+    """Return [(upper bound in ms, count)] in log-spaced buckets."""
+    counts = Counter()
+    for seconds in samples:
+        ms = max(seconds * 1000, 0.001)
+        counts[math.ceil(math.log10(ms) * buckets_per_decade)] += 1
+
+    return [
+        (10 ** (bucket / buckets_per_decade), counts[bucket])
+        for bucket in range(min(counts), max(counts) + 1)
+    ] if counts else []
+
+
+# In a closed loop (each client waits for its response before sending the
+# next request), a slow server makes clients send less, and the requests
+# that would have waited are never measured: the "coordinated omission".
+# Here requests are due at a fixed rate whatever happens, and their
+# latency counts from when they were due, so time spent waiting for a free
+# connection is included.
+async def run(rate, duration, pick, send, results):
+    """Call send(action, results, due) for pick()ed actions at rate/s."""
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    results.started = loop.time()
+    interval = 1 / rate
+    count = int(rate * duration)
+
+    for i in range(count):
+        due = results.started + i * interval
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.ensure_future(send(pick(), results, due))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    if tasks:
+        await asyncio.wait(tasks)
+    results.finished = loop.time()
+
+
+async def timed(pool, action, results, due, method, path, headers=None,
+                body=b''):
+    """Send a request through pool and record it in results."""
+    loop = asyncio.get_running_loop()
+    sent = loop.time()
+    try:
+        status, _, _ = await pool.request(method, path, headers, body)
+    except HTTPError:
+        status = None
+    results.record(action, due, sent, loop.time(), status)
+    return status
+
+
+def now():
+    """Wall clock time, for reports."""
+    return time.strftime('%Y-%m-%dT%H:%M:%S%z')
@@ -0,0 +1,75 @@
+"""
+Django command to compare response compression settings.
+"""
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from drf_spectacular.generators import SchemaGenerator
+from drf_spectacular.renderers import OpenApiJsonRenderer
+
+from core.benchmark import (
+    format_stats,
+    measure,
+    recipe_payload,
+)
+from core.middleware import brotli, compress_bytes
+from core.renderers import ORJSONRenderer
+
+
+def payloads(sizes):
+    """Return (name, bytes) for each response body to compress."""
+    renderer = ORJSONRenderer()
+    bodies = [
+        (f'{size} recipes', renderer.render(recipe_payload(size)))
+        for size in sizes
+    ]
+    schema = SchemaGenerator().get_schema(request=None, public=True)
+    bodies.append(('openapi schema', OpenApiJsonRenderer().render(schema)))
+
+    return bodies
+
+
+def codings():
+    """Return (encoding, settings) for each level to compare."""
+    levels = [
+        ('gzip', {'COMPRESSION_GZIP_LEVEL': level}) for level in (1, 6, 9)
+    ]
+    if brotli is not None:
+        levels += [
+            ('br', {'COMPRESSION_BROTLI_QUALITY': quality})
+            for quality in (1, 4, 11)
+        ]
+
+    return levels
+
+
+class Command(BaseCommand):
+    """Benchmark bytes saved against CPU time for each coding."""
+    help = 'Compress realistic API responses with gzip and brotli levels.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[10, 100, 1000],
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        for name, body in payloads(options['sizes']):
+            self.stdout.write(f'{name} ({len(body):,} bytes):')
+
+            for encoding, level in codings():
+                with override_settings(**level):
+                    compressed = compress_bytes(body, encoding)
+                    stats = measure(
+                        lambda: compress_bytes(body, encoding),
+                        repeat=options['repeat'],
+                    )
+
+                label = f'{encoding} {list(level.values())[0]}'
+                saved = len(body) - len(compressed)
+                self.stdout.write(
+                    '  ' + format_stats(label, stats) +
+                    f'  {len(compressed):>10,} bytes '
+                    f'({saved / len(body) * 100:.1f}% saved, '
+                    f'{saved / 1024 / stats["p50"]:.0f}KB saved per ms)'
+                )
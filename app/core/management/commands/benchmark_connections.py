@@ -0,0 +1,129 @@
+"""
+Django command to benchmark keeping database connections between requests.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import percentile
+
+
+# How the connections are handled in each run, as environment variables.
+MODES = {
+    'connect per request': {'POSTGRES_CONN_MAX_AGE': '0'},
+    'kept, health checked': {
+        'POSTGRES_CONN_MAX_AGE': '600',
+        'POSTGRES_CONN_HEALTH_CHECKS': '1',
+    },
+    'kept, unchecked': {
+        'POSTGRES_CONN_MAX_AGE': '600',
+        'POSTGRES_CONN_HEALTH_CHECKS': '0',
+    },
+}
+
+# Runs in a fresh interpreter: load the WSGI application like a uWSGI
+# worker, then time requests through it. Looking up the unknown token is
+# the only query of the request, so what changes between the modes is the
+# cost of getting a connection.
+SCRIPT = '''
+import json
+import time
+
+from app.wsgi import application
+from django.test.client import RequestFactory
+
+from core import metrics
+
+environ = RequestFactory().get(
+    '/api/recipe/recipes/', HTTP_AUTHORIZATION='Token unknown',
+).environ
+
+def call():
+    response = application(dict(environ), lambda status, headers: None)
+    b''.join(response)
+    response.close()
+
+for _ in range(20):
+    call()
+metrics.REGISTRY.clear()
+samples = []
+for _ in range(%(requests)d):
+    begin = time.perf_counter()
+    call()
+    samples.append((time.perf_counter() - begin) * 1e6)
+
+print(json.dumps({
+    'request_us': samples,
+    'events': {
+        event: value
+        for (_, event), value in metrics.DB_CONNECTIONS.values.items()
+    },
+}))
+'''
+
+
+def run_once(env, requests):
+    """Start a fresh interpreter with env, return its timings."""
+    result = subprocess.run(
+        [sys.executable, '-c', SCRIPT % {'requests': requests}],
+        cwd=settings.BASE_DIR,
+        env={
+            **os.environ,
+            **env,
+            'WARMUP': '0',
+            # The requests are made to the RequestFactory's host.
+            'DJANGO_ALLOWED_HOSTS': 'testserver',
+        },
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError(f'Benchmark failed:\n{result.stderr[-2000:]}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    """Compare connecting per request with keeping the connections."""
+    help = (
+        'Time requests making one query, connecting to the database for '
+        'every request and keeping the connection with and without health '
+        'checks (see core.backends.postgresql).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--output', help='Save the results as JSON.')
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode, env in MODES.items():
+            stats = run_once(env, options['requests'])
+            samples = stats['request_us']
+            results[mode] = {
+                'p50_us': percentile(samples, 50),
+                'p99_us': percentile(samples, 99),
+                'mean_us': sum(samples) / len(samples),
+                'events': stats['events'],
+            }
+
+        base = results['connect per request']
+        for mode, stats in results.items():
+            self.stdout.write(
+                f'{mode:<22} p50 {stats["p50_us"]:7.0f}us '
+                f'({stats["p50_us"] - base["p50_us"]:+.0f})  '
+                f'p99 {stats["p99_us"]:7.0f}us  '
+                f'mean {stats["mean_us"]:7.0f}us  '
+                + ' '.join(
+                    f'{event} {count:.0f}'
+                    for event, count in sorted(stats['events'].items())
+                )
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f'Results saved to {options["output"]}.')
@@ -0,0 +1,109 @@
+"""
+Django command to compare API renderers and parsers.
+"""
+import io
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmark import (
+    format_stats,
+    measure,
+    recipe_payload,
+)
+from core.parsers import (
+    CBORParser,
+    MessagePackParser,
+    ORJSONParser,
+)
+from core.renderers import (
+    CBORRenderer,
+    MessagePackRenderer,
+    ORJSONRenderer,
+    cbor2,
+    msgpack,
+)
+
+
+def python_payload(size):
+    """Return size rows holding Decimal, datetime and UUID values."""
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            'id': i,
+            'price': Decimal(i) / 100,
+            'created': now,
+            'uuid': uuid.uuid4(),
+        }
+        for i in range(size)
+    ]
+
+
+def formats():
+    """Return (name, renderer, parser) for each format to compare."""
+    available = [
+        ('json', JSONRenderer(), JSONParser()),
+        ('orjson', ORJSONRenderer(), ORJSONParser()),
+    ]
+    if msgpack is not None:
+        available.append(
+            ('msgpack', MessagePackRenderer(), MessagePackParser())
+        )
+    if cbor2 is not None:
+        available.append(('cbor', CBORRenderer(), CBORParser()))
+
+    return available
+
+
+class Command(BaseCommand):
+    """Benchmark encode and decode throughput of each format."""
+    help = (
+        'Time rendering and parsing realistic recipe payloads and compare '
+        'their sizes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[100, 1000, 10000],
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            for label, payload in [
+                ('recipes', recipe_payload(size)),
+                ('python types', python_payload(size)),
+            ]:
+                self.stdout.write(f'{size} {label}:')
+                self._run(payload, options['repeat'])
+
+    def _run(self, payload, repeat):
+        json_size = len(JSONRenderer().render(payload))
+        for name, renderer, parser in formats():
+            body = renderer.render(payload)
+
+            encode = measure(lambda: renderer.render(payload), repeat=repeat)
+            decode = measure(
+                lambda: parser.parse(io.BytesIO(body)),
+                repeat=repeat,
+            )
+            megabytes = len(body) / 1024 / 1024
+
+            self.stdout.write(
+                '  ' + format_stats(f'{name} encode', encode) +
+                f'  {megabytes / encode["p50"] * 1000:8.1f}MB/s'
+            )
+            self.stdout.write(
+                '  ' + format_stats(f'{name} decode', decode) +
+                f'  {megabytes / decode["p50"] * 1000:8.1f}MB/s'
+            )
+            saved = (1 - len(body) / json_size) * 100
+            self.stdout.write(
+                f'  {name + " size":<28} {len(body):,} bytes '
+                f'({saved:.1f}% smaller than json)'
+            )
@@ -0,0 +1,146 @@
+"""
+Django command to compare the workers of different settings modules.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import percentile
+
+
+# Runs in a fresh interpreter: load and warm up the WSGI application like a
+# uWSGI worker, measure its memory, then time requests through it. Neither
+# request touches the database, so the time is the one spent in Django, the
+# middleware and DRF.
+SCRIPT = '''
+import json
+import sys
+import time
+
+from app.wsgi import application
+from django.test.client import RequestFactory
+
+def rss_kib():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+
+rss = rss_kib()
+factory = RequestFactory()
+requests = {
+    'liveness': factory.get('/api/health-check/live/').environ,
+    # Rejected by the authentication, which is as far as DRF goes.
+    'unauthenticated': factory.get('/api/recipe/recipes/').environ,
+}
+
+def call(environ):
+    response = application(dict(environ), lambda status, headers: None)
+    b''.join(response)
+    response.close()
+
+timings = {}
+for name, environ in requests.items():
+    for _ in range(50):
+        call(environ)
+    samples = []
+    for _ in range(%(requests)d):
+        begin = time.perf_counter()
+        call(environ)
+        samples.append((time.perf_counter() - begin) * 1e6)
+    timings[name] = samples
+
+print(json.dumps({
+    'rss_kib': rss,
+    'modules': len(sys.modules),
+    'admin_loaded': 'django.contrib.admin.models' in sys.modules,
+    'spectacular_loaded': 'drf_spectacular.openapi' in sys.modules,
+    'request_us': timings,
+}))
+'''
+
+
+def run_once(settings_module, requests):
+    """Start a fresh interpreter with settings_module, return its stats."""
+    result = subprocess.run(
+        [sys.executable, '-c', SCRIPT % {'requests': requests}],
+        cwd=settings.BASE_DIR,
+        env={
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': settings_module,
+            'WARMUP': '1',
+            # The requests are made to the RequestFactory's host.
+            'DJANGO_ALLOWED_HOSTS': 'testserver',
+        },
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError(
+            f'Loading {settings_module} failed:\n{result.stderr[-2000:]}'
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    """Compare the memory and request overhead of settings modules."""
+    help = (
+        'Load the WSGI application with each settings module in a fresh '
+        'interpreter, and report the memory of the warmed up worker, the '
+        'number of modules loaded and the median time of requests that '
+        'don\'t query the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'settings_modules', nargs='*',
+            default=['app.settings', 'app.settings_api'],
+        )
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--output', help='Save the results as JSON.')
+
+    def handle(self, *args, **options):
+        results = {}
+        for module in options['settings_modules']:
+            stats = run_once(module, options['requests'])
+            results[module] = {
+                'rss_mib': stats['rss_kib'] / 1024,
+                'modules': stats['modules'],
+                'admin_loaded': stats['admin_loaded'],
+                'spectacular_loaded': stats['spectacular_loaded'],
+                'request_us': {
+                    name: {
+                        'p50': percentile(samples, 50),
+                        'p99': percentile(samples, 99),
+                    }
+                    for name, samples in stats['request_us'].items()
+                },
+            }
+
+        base = results[options['settings_modules'][0]]
+        for module, stats in results.items():
+            self.stdout.write(
+                f'{module:<20} rss {stats["rss_mib"]:6.1f}MiB '
+                f'({stats["rss_mib"] - base["rss_mib"]:+.1f})  '
+                f'modules {stats["modules"]:4d} '
+                f'({stats["modules"] - base["modules"]:+d})  '
+                f'admin app {"yes" if stats["admin_loaded"] else "no"}  '
+                f'schema generator '
+                f'{"yes" if stats["spectacular_loaded"] else "no"}'
+            )
+            for name, timing in stats['request_us'].items():
+                base_p50 = base['request_us'][name]['p50']
+                self.stdout.write(
+                    f'  {name:<16} p50 {timing["p50"]:7.0f}us '
+                    f'({timing["p50"] - base_p50:+.0f})  '
+                    f'p99 {timing["p99"]:7.0f}us'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f'Results saved to {options["output"]}.')
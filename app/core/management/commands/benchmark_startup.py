@@ -0,0 +1,122 @@
+"""
+Django command to benchmark worker startup and the first requests.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark import percentile
+
+
+# Runs in a fresh interpreter: load the WSGI application like uWSGI does,
+# then time the same requests twice through it. The first time pays for
+# whatever the warmup didn't do.
+SCRIPT = '''
+import json
+import time
+
+start = time.perf_counter()
+from app.wsgi import application
+loaded = time.perf_counter()
+
+from django.test.client import RequestFactory
+
+factory = RequestFactory()
+requests = [
+    ('health check', lambda: factory.get('/api/health-check/')),
+    ('schema', lambda: factory.get('/api/schema/', {'format': 'json'})),
+    # Rejected by the serializer, so no password is hashed.
+    ('invalid signup', lambda: factory.post(
+        '/api/user/create/',
+        {'email': 'not an email', 'password': 'pw'},
+        content_type='application/json',
+    )),
+]
+
+def call(build):
+    environ = build().environ
+    begin = time.perf_counter()
+    response = application(environ, lambda status, headers: None)
+    b''.join(response)
+    response.close()
+    return (time.perf_counter() - begin) * 1000
+
+first = {name: call(build) for name, build in requests}
+again = {name: call(build) for name, build in requests}
+print(json.dumps({
+    'load_ms': (loaded - start) * 1000,
+    'first_ms': first,
+    'again_ms': again,
+}))
+'''
+
+
+def run_once(warmup):
+    """Start a fresh interpreter and return its timings."""
+    result = subprocess.run(
+        [sys.executable, '-c', SCRIPT],
+        cwd=settings.BASE_DIR,
+        env={
+            **os.environ,
+            'WARMUP': str(int(warmup)),
+            # The requests are made to the RequestFactory's host.
+            'DJANGO_ALLOWED_HOSTS': 'testserver',
+        },
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise CommandError(f'Startup failed:\n{result.stderr[-2000:]}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    """Time loading the application and its first requests."""
+    help = (
+        'Start fresh interpreters with and without the warmup (see '
+        'core.warmup), and report the median time to load app.wsgi and to '
+        'serve the first and second request of a few views.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', help='Save the results as JSON.')
+
+    def handle(self, *args, **options):
+        results = {}
+        for warmup in (False, True):
+            runs = [run_once(warmup) for _ in range(options['repeat'])]
+            mode = 'warmup' if warmup else 'cold'
+            results[mode] = {
+                'load_ms': percentile([r['load_ms'] for r in runs], 50),
+                'first_ms': {
+                    name: percentile([r['first_ms'][name] for r in runs], 50)
+                    for name in runs[0]['first_ms']
+                },
+                'again_ms': {
+                    name: percentile([r['again_ms'][name] for r in runs], 50)
+                    for name in runs[0]['again_ms']
+                },
+            }
+
+        for mode, stats in results.items():
+            first_total = sum(stats['first_ms'].values())
+            self.stdout.write(
+                f'{mode:<7} load {stats["load_ms"]:7.1f}ms  '
+                f'first requests {first_total:7.1f}ms  '
+                f'load + first {stats["load_ms"] + first_total:7.1f}ms'
+            )
+            for name, first in stats['first_ms'].items():
+                self.stdout.write(
+                    f'  {name:<14} first {first:7.1f}ms  '
+                    f'again {stats["again_ms"][name]:6.1f}ms'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f'Results saved to {options["output"]}.')
@@ -0,0 +1,38 @@
+"""
+Django command to generate the OpenAPI schema served at /api/schema/.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import schema
+
+
+class Command(BaseCommand):
+    """Write the schema files read by core.schema.SchemaView."""
+    help = (
+        'Generate the OpenAPI schema in every format into SCHEMA_CACHE_DIR, '
+        'replacing the files of the previous deploy. Other languages than '
+        'the default one can be added with --lang.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lang', nargs='*', default=[])
+
+    def handle(self, *args, **options):
+        for lang in options['lang']:
+            if schema.normalize_lang(lang) is None:
+                raise CommandError(f'{lang!r} is not in LANGUAGES.')
+
+        for lang in [None] + options['lang']:
+            for fmt in schema.RENDERERS:
+                content = schema.build(fmt, lang)
+                self.stdout.write(
+                    f'{schema.schema_path(fmt, lang)}: '
+                    f'{len(content) / 1024:.1f}KiB {schema.etag(content)}'
+                )
+
+        if not settings.SCHEMA_CACHE:
+            self.stdout.write(
+                'SCHEMA_CACHE is off, /api/schema/ generates the schema on '
+                'each request.'
+            )
@@ -0,0 +1,117 @@
+"""
+Django command to report what the application spends its import time on.
+"""
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def parse_importtime(output):
+    """Return [(module, self_us, cumulative_us, depth)] from -X importtime."""
+    imports = []
+    for line in output.splitlines():
+        # import time:  self [us] | cumulative | imported package
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        imports.append((
+            stripped,
+            int(fields[0]),
+            int(fields[1]),
+            (len(name) - len(stripped) - 1) // 2,
+        ))
+    return imports
+
+
+def digest(imports):
+    """Summarize the imports per top level package."""
+    packages = defaultdict(lambda: [0, 0])
+    for module, self_us, _, _ in imports:
+        package = packages[module.split('.')[0]]
+        package[0] += self_us
+        package[1] += 1
+
+    return {
+        'total_ms': sum(
+            cumulative for _, _, cumulative, depth in imports if depth == 0
+        ) / 1000,
+        'modules': len(imports),
+        'packages': sorted(
+            (
+                {'package': name, 'self_ms': self_us / 1000, 'modules': n}
+                for name, (self_us, n) in packages.items()
+            ),
+            key=lambda p: p['self_ms'],
+            reverse=True,
+        ),
+        'slowest': [
+            {'module': module, 'self_ms': self_us / 1000,
+             'cumulative_ms': cumulative / 1000}
+            for module, self_us, cumulative, _ in sorted(
+                imports, key=lambda i: i[1], reverse=True,
+            )
+        ],
+    }
+
+
+class Command(BaseCommand):
+    """Digest python -X importtime for loading the WSGI application."""
+    help = (
+        'Load --module (app.wsgi by default, without the warmup) and the '
+        'URLconf in a fresh interpreter with -X importtime, and report the '
+        'time spent importing each package and the slowest modules.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--module', default='app.wsgi')
+        parser.add_argument('--top', type=int, default=15)
+        parser.add_argument('--json', action='store_true',
+                            help='Print the whole digest as JSON.')
+
+    def handle(self, *args, **options):
+        # The URLconf, and so the views, DRF and drf_spectacular, is only
+        # imported by the first request or the warmup.
+        code = f'import {options["module"]}; import {settings.ROOT_URLCONF}'
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'WARMUP': '0'},
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(
+                f'Importing {options["module"]} failed:\n'
+                + result.stderr[-2000:]
+            )
+
+        report = digest(parse_importtime(result.stderr))
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f'{report["total_ms"]:.0f}ms importing {report["modules"]} '
+            f'modules for {options["module"]}\n'
+        )
+        self.stdout.write(f'{"package":<32}{"self":>10}{"modules":>9}')
+        for package in report['packages'][:options['top']]:
+            self.stdout.write(
+                f'{package["package"]:<32}{package["self_ms"]:>8.1f}ms'
+                f'{package["modules"]:>9}'
+            )
+        self.stdout.write(f'\n{"module":<48}{"self":>10}{"cumulative":>12}')
+        for module in report['slowest'][:options['top']]:
+            self.stdout.write(
+                f'{module["module"]:<48}{module["self_ms"]:>8.1f}ms'
+                f'{module["cumulative_ms"]:>10.1f}ms'
+            )
@@ -0,0 +1,43 @@
+"""
+Django command to prepare the shard databases.
+"""
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.sharding import SHARDED_MODELS
+
+
+class Command(BaseCommand):
+    """Migrate each shard and give it its own id range."""
+    help = (
+        'Run the migrations on every shard and move their id sequences to '
+        'disjoint ranges, so rows keep their ids when users change shards.'
+    )
+
+    def handle(self, *args, **options):
+        for index, alias in enumerate(settings.DATABASE_SHARDS):
+            call_command('migrate', database=alias, verbosity=0)
+            start = index * settings.SHARD_ID_RANGE + 1
+
+            with connections[alias].cursor() as cursor:
+                for label in sorted(SHARDED_MODELS):
+                    table = apps.get_model(label)._meta.db_table
+                    cursor.execute(
+                        "SELECT pg_get_serial_sequence(%s, 'id')",
+                        [table],
+                    )
+                    sequence = cursor.fetchone()[0]
+                    cursor.execute(f'SELECT last_value FROM {sequence}')
+                    # Never move a sequence backwards.
+                    if cursor.fetchone()[0] < start:
+                        cursor.execute(
+                            'SELECT setval(%s, %s, false)',
+                            [sequence, start],
+                        )
+
+            self.stdout.write(f'{alias}: ids from {start}')
+
+        self.stdout.write(self.style.SUCCESS('Shards ready!'))
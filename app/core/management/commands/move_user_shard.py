@@ -0,0 +1,114 @@
+"""
+Django command to move a user's recipe data to another shard.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from core.sharding import (
+    get_assignment,
+    mirror_user,
+    set_assignment,
+)
+
+
+# Parents before the rows referencing them.
+def user_rows(user, alias):
+    """Return [(model, rows)] of the user's data on the alias database."""
+    return [
+        (Tag, Tag.objects.using(alias).filter(user=user)),
+        (Ingredient, Ingredient.objects.using(alias).filter(user=user)),
+        (Recipe, Recipe.objects.using(alias).filter(user=user)),
+        (
+            Recipe.tags.through,
+            Recipe.tags.through.objects.using(alias).filter(
+                recipe__user=user,
+            ),
+        ),
+        (
+            Recipe.ingredients.through,
+            Recipe.ingredients.through.objects.using(alias).filter(
+                recipe__user=user,
+            ),
+        ),
+    ]
+
+
+class Command(BaseCommand):
+    """Move a user's recipes, tags and ingredients to another shard."""
+    help = (
+        'Copy the user\'s data to the target shard, switch the user over '
+        'and delete the data from the old shard. Reads keep working during '
+        'the move; writes get a 503 with Retry-After until it is done.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('shard', choices=settings.DATABASE_SHARDS)
+        parser.add_argument(
+            '--grace',
+            type=float,
+            default=2,
+            help='Seconds to let in-flight writes finish before copying.',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]}.')
+
+        source, _ = get_assignment(user.pk)
+        target = options['shard']
+        if source == target:
+            self.stdout.write(f'{user.email} is already on {target}.')
+            return
+
+        set_assignment(user.pk, source, moving=True)
+        time.sleep(options['grace'])
+
+        try:
+            copied = self._copy(user, source, target)
+        except Exception:
+            set_assignment(user.pk, source)
+            raise
+
+        set_assignment(user.pk, target)
+        self._delete(user, source)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {copied} rows of {user.email} from {source} to {target}.'
+        ))
+
+    def _copy(self, user, source, target):
+        """Copy the user's rows, keeping their ids. Returns the row count."""
+        copied = 0
+        with transaction.atomic(using=target):
+            mirror_user(user, target)
+            for model, rows in user_rows(user, source):
+                objs = list(rows)
+                if model._default_manager.using(target).filter(
+                    pk__in=[obj.pk for obj in objs],
+                ).exists():
+                    raise CommandError(
+                        f'{model._meta.label} ids already exist on {target}. '
+                        'Run init_shards to give each shard its own ids.'
+                    )
+                model._default_manager.using(target).bulk_create(objs)
+                copied += len(objs)
+
+        return copied
+
+    def _delete(self, user, source):
+        """Delete the user's rows from the old shard."""
+        with transaction.atomic(using=source):
+            for model, rows in reversed(user_rows(user, source)):
+                rows.delete()
@@ -0,0 +1,55 @@
+"""
+Django command to show how the data is spread over the shards.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from core.sharding import shard_for_user
+
+
+SHARD_LOAD_SQL = """
+SELECT pg_database_size(datname), xact_commit + xact_rollback, tup_fetched
+FROM pg_stat_database
+WHERE datname = current_database()
+"""
+
+
+class Command(BaseCommand):
+    """Print the users, rows, size and load of each shard."""
+    help = 'Show how users, rows and load are spread over the shards.'
+
+    def handle(self, *args, **options):
+        assigned = Counter(
+            shard_for_user(user_id)
+            for user_id in get_user_model().objects.values_list(
+                'id',
+                flat=True,
+            ).iterator()
+        )
+
+        self.stdout.write(
+            f'{"shard":<10} {"users":>8} {"recipes":>10} {"tags":>10} '
+            f'{"ingredients":>12} {"size MB":>9} {"xacts":>12} '
+            f'{"tup fetched":>14}'
+        )
+        for alias in settings.DATABASE_SHARDS:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(SHARD_LOAD_SQL)
+                size, xacts, fetched = cursor.fetchone()
+
+            self.stdout.write(
+                f'{alias:<10} {assigned[alias]:>8} '
+                f'{Recipe.objects.using(alias).count():>10} '
+                f'{Tag.objects.using(alias).count():>10} '
+                f'{Ingredient.objects.using(alias).count():>12} '
+                f'{size / 2 ** 20:>9.1f} {xacts:>12} {fetched:>14}'
+            )
@@ -0,0 +1,179 @@
+"""
+Worker memory diagnostics: RSS growth per view and tracemalloc diffs.
+"""
+import linecache
+import logging
+import os
+import signal
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+
+# The uwsgi module only exists inside uWSGI workers.
+try:
+    import uwsgi
+except ImportError:
+    uwsgi = None
+
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Allocations made by tracemalloc itself or while importing code are noise
+# when looking for what grows between snapshots.
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, linecache.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def rss_bytes():
+    """Return the resident memory of this process, or None if unknown."""
+    # statm is a single line of page counts, much cheaper to read than
+    # status. It only exists on Linux.
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class MemoryStats:
+    """RSS growth per view and tracemalloc snapshots of this worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # {view: [requests, requests that grew RSS, total growth, max]}
+        self.views = {}
+        self.peak_rss = 0
+        self.baseline = None
+        self.previous = None
+        self.snapshot_at = None
+        self.top_since_start = []
+        self.top_since_previous = []
+        self.recycling = False
+
+    def record(self, view, before, after):
+        """Add the RSS change of a request to its view."""
+        delta = after - before
+        with self.lock:
+            stats = self.views.setdefault(view, [0, 0, 0, 0])
+            stats[0] += 1
+            # RSS rarely shrinks (freed memory stays with the allocator),
+            # so only the growth is interesting.
+            if delta > 0:
+                stats[1] += 1
+                stats[2] += delta
+                stats[3] = max(stats[3], delta)
+            self.peak_rss = max(self.peak_rss, after)
+
+    def snapshot_due(self):
+        """Return True if the last snapshot is MEMORY_SNAPSHOT_INTERVAL old."""
+        return (
+            self.snapshot_at is None
+            or time.monotonic() - self.snapshot_at
+            >= settings.MEMORY_SNAPSHOT_INTERVAL
+        )
+
+    def take_snapshot(self):
+        """Snapshot the traced allocations and diff them with the others."""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMORY_TRACEMALLOC_FRAMES)
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            _SNAPSHOT_FILTERS,
+        )
+
+        with self.lock:
+            self.snapshot_at = time.monotonic()
+            if self.baseline is None:
+                # Only allocations made after tracing started are seen, so
+                # the first snapshot is the reference point.
+                self.baseline = snapshot
+            else:
+                self.top_since_start = top_sites(self.baseline, snapshot)
+                self.top_since_previous = top_sites(self.previous, snapshot)
+            self.previous = snapshot
+
+    def report(self):
+        """Return the diagnostics in a JSON friendly form."""
+        with self.lock:
+            views = [
+                {
+                    'view': view,
+                    'requests': requests,
+                    'requests_grown': grown,
+                    'growth_bytes': total,
+                    'max_growth_bytes': largest,
+                }
+                for view, (requests, grown, total, largest)
+                in self.views.items()
+            ]
+            return {
+                'pid': os.getpid(),
+                'rss_bytes': rss_bytes(),
+                'peak_rss_bytes': self.peak_rss,
+                'tracing': tracemalloc.is_tracing(),
+                'traced_bytes': (
+                    tracemalloc.get_traced_memory()[0]
+                    if tracemalloc.is_tracing() else None
+                ),
+                'views': sorted(
+                    views,
+                    key=lambda v: v['growth_bytes'],
+                    reverse=True,
+                ),
+                'top_since_start': self.top_since_start,
+                'top_since_previous': self.top_since_previous,
+            }
+
+
+def top_sites(old, new):
+    """Return the MEMORY_TOP_SITES lines that grew the most from old."""
+    diffs = new.compare_to(old, 'lineno')
+    return [
+        {
+            'site': str(diff.traceback[0]),
+            'size_diff_bytes': diff.size_diff,
+            'count_diff': diff.count_diff,
+            'size_bytes': diff.size,
+        }
+        for diff in diffs[:settings.MEMORY_TOP_SITES]
+        if diff.size_diff > 0
+    ]
+
+
+STATS = MemoryStats()
+
+
+def recycle_worker():
+    """Ask uWSGI to replace this worker once its requests are done."""
+    if uwsgi is None:
+        logger.warning('Not running under uWSGI, cannot recycle worker.')
+        return False
+
+    # A worker receiving SIGHUP stops accepting requests, finishes the ones
+    # in progress and exits. The master then forks a fresh one.
+    os.kill(os.getpid(), signal.SIGHUP)
+    return True
+
+
+def check_rss_limit(rss):
+    """Recycle the worker if rss is over MEMORY_RECYCLE_RSS_MB."""
+    limit = settings.MEMORY_RECYCLE_RSS_MB
+    if not limit or rss < limit * 1024 * 1024 or STATS.recycling:
+        return
+
+    STATS.recycling = True
+    logger.warning(
+        'Worker %d uses %.1fMiB, over MEMORY_RECYCLE_RSS_MB (%d), recycling',
+        os.getpid(),
+        rss / 1024 / 1024,
+        limit,
+    )
+    recycle_worker()
@@ -0,0 +1,348 @@
+"""
+Request metrics, aggregated across worker processes.
+"""
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+
+# Latency buckets in seconds, from a fast cached response to a slow query.
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+# Accumulates what happens during the current request (see RequestStats).
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+class Counter:
+    """Monotonic counter with labels."""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = defaultdict(float)
+
+    def inc(self, labels, amount=1):
+        """Add amount to the counter for labels (a tuple of values)."""
+        self.values[labels] += amount
+
+    def snapshot(self):
+        """Return the values in a JSON friendly form."""
+        return [[list(labels), value] for labels, value in self.values.items()]
+
+
+class Histogram:
+    """Histogram with fixed buckets and labels."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames,
+                 buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # {labels: [count per bucket..., count above the last, sum]}
+        self.values = {}
+
+    def observe(self, labels, value):
+        """Record value for labels (a tuple of values)."""
+        counts = self.values.get(labels)
+        if counts is None:
+            counts = self.values[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def snapshot(self):
+        """Return the values in a JSON friendly form."""
+        return [
+            [list(labels), counts] for labels, counts in self.values.items()
+        ]
+
+
+class Registry:
+    """The metrics of this process, written to a file for /metrics."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self._written_at = 0.0
+
+    def register(self, metric):
+        """Add metric to the registry and return it."""
+        self.metrics[metric.name] = metric
+        return metric
+
+    def clear(self):
+        """Reset every metric of this process."""
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.values.clear()
+
+    def snapshot(self):
+        """Return {name: [values]} of every metric."""
+        with self.lock:
+            return {
+                name: metric.snapshot()
+                for name, metric in self.metrics.items()
+            }
+
+    def path(self):
+        """Return the file holding the metrics of this process."""
+        return os.path.join(
+            settings.METRICS_DIR,
+            f'{settings.METRICS_SERVER}-{os.getpid()}.json',
+        )
+
+    def write(self, force=False):
+        """Write the metrics to the process file, at most every interval."""
+        now = time.monotonic()
+        if not force and now - self._written_at < settings.METRICS_INTERVAL:
+            return
+        self._written_at = now
+
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = self.path()
+        # Write then rename, so readers never see a half written file.
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f'{path}.tmp', path)
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'http_requests_total',
+    'Requests by view, method and status code.',
+    ('view', 'method', 'status'),
+))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds',
+    'Time spent handling requests.',
+    ('view',),
+))
+DB_QUERIES = REGISTRY.register(Histogram(
+    'db_queries_per_request',
+    'Database queries run by each request.',
+    ('view',),
+    buckets=QUERY_COUNT_BUCKETS,
+))
+DB_CONNECTIONS = REGISTRY.register(Counter(
+    'db_connections_total',
+    'Database connections opened, reused by a request, replaced after a '
+    'failed health check, expired and closed.',
+    ('alias', 'event'),
+))
+DB_QUERY_TIMEOUTS = REGISTRY.register(Counter(
+    'db_query_timeouts_total',
+    'Queries cancelled by statement_timeout or lock_timeout.',
+    ('view', 'timeout'),
+))
+DB_DURATION = REGISTRY.register(Counter(
+    'db_query_duration_seconds_total',
+    'Time spent in database queries.',
+    ('view',),
+))
+SERIALIZER_DURATION = REGISTRY.register(Histogram(
+    'serializer_duration_seconds',
+    'Time spent building serializer data in each request, without queries.',
+    ('view',),
+))
+
+
+class RequestStats:
+    """What the current request spent in the database and serializers."""
+    __slots__ = ('queries', 'db_time', 'serializer_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+
+def _record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding the query to the request stats."""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - start
+        stats.queries += 1
+
+
+# Installing the wrapper once per connection, instead of around every
+# request with connection.execute_wrapper(), keeps the per request cost down
+# to setting a context variable.
+def instrument_connection(sender, connection, **kwargs):
+    """Add the query recording wrapper to a new database connection."""
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+def start_request(stats):
+    """Collect stats for the current request, returning a reset token."""
+    return _request_stats.set(stats)
+
+
+def end_request(token):
+    """Stop collecting the stats set by start_request()."""
+    _request_stats.reset(token)
+
+
+# Building the data evaluates the queryset and runs the prefetch (or N+1)
+# queries, which are already counted in the database time, so their time
+# is left out of the serializer time.
+@contextlib.contextmanager
+def time_serializer():
+    """Add the time spent in the block to the request's serializer time."""
+    stats = _request_stats.get()
+    if stats is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    db_start = stats.db_time
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.serializer_time += elapsed - (stats.db_time - db_start)
+
+
+def record_connection(alias, event):
+    """Count a database connection event (see core.backends.postgresql)."""
+    with REGISTRY.lock:
+        DB_CONNECTIONS.inc((alias, event))
+
+
+def record_query_timeout(view, kind):
+    """Count a query cancelled by a timeout (see core.timeouts)."""
+    with REGISTRY.lock:
+        DB_QUERY_TIMEOUTS.inc((view, kind))
+
+
+def record_request(view, method, status_code, duration, stats):
+    """Record a finished request."""
+    labels = (view,)
+    with REGISTRY.lock:
+        REQUESTS.inc((view, method, str(status_code)))
+        REQUEST_DURATION.observe(labels, duration)
+        DB_QUERIES.observe(labels, stats.queries)
+        DB_DURATION.inc(labels, stats.db_time)
+        if stats.serializer_time:
+            SERIALIZER_DURATION.observe(labels, stats.serializer_time)
+
+    try:
+        REGISTRY.write()
+    except OSError:
+        # Metrics must never break a request.
+        pass
+
+
+def view_name(view_func, method):
+    """Return a label like RecipeViewSet.list for a resolved view."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', 'unknown')
+
+    # ViewSets map HTTP methods to actions, e.g. {'get': 'list'}. For
+    # @api_view functions, cls is named after the function.
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        action = actions.get(method.lower())
+        if action:
+            return f'{cls.__name__}.{action}'
+
+    return cls.__name__
+
+
+def request_view_name(request):
+    """Return the label of the view that served request, or 'unmatched'."""
+    # Set by Django once the URL resolved, so it is known after the response
+    # without a process_view() hook, which costs a thread switch per
+    # middleware under ASGI.
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return view_name(match.func, request.method)
+
+
+def collect():
+    """Return the metrics of every worker, summed."""
+    totals = {}
+    directory = settings.METRICS_DIR
+    names = os.listdir(directory) if os.path.isdir(directory) else []
+
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        for metric, values in snapshot.items():
+            merged = totals.setdefault(metric, {})
+            for labels, value in values:
+                labels = tuple(labels)
+                if isinstance(value, list):
+                    current = merged.get(labels, [0] * len(value))
+                    merged[labels] = [a + b for a, b in zip(current, value)]
+                else:
+                    merged[labels] = merged.get(labels, 0) + value
+
+    return totals
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    escaped = (
+        (name, str(value).replace('\\', r'\\').replace('"', r'\"'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{n}="{v}"' for n, v in escaped) + '}'
+
+
+def render(totals, registry=REGISTRY):
+    """Return totals in the Prometheus text exposition format."""
+    lines = []
+    for metric in registry.metrics.values():
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+
+        for labels, value in sorted(totals.get(metric.name, {}).items()):
+            if metric.kind == 'counter':
+                lines.append(
+                    f'{metric.name}'
+                    f'{_format_labels(metric.labelnames, labels)} {value}'
+                )
+                continue
+
+            cumulative = 0
+            bounds = [*metric.buckets, '+Inf']
+            for bound, count in zip(bounds, value[:-1]):
+                cumulative += count
+                le = _format_labels(metric.labelnames, labels, ('le', bound))
+                lines.append(f'{metric.name}_bucket{le} {cumulative}')
+            plain = _format_labels(metric.labelnames, labels)
+            lines.append(f'{metric.name}_sum{plain} {value[-1]}')
+            lines.append(f'{metric.name}_count{plain} {cumulative}')
+
+    return '\n'.join(lines) + '\n'
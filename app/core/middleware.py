@@ -0,0 +1,429 @@
+"""
+Middleware for the app.
+"""
+import asyncio
+import random
+import re
+import time
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from core import memory, metrics, profiling, sql_profiling, tracing
+
+# brotli is in the Pipfile. Without it, responses are only gzipped.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Images and files are already compressed, so we only compress data formats.
+# HTML pages (admin, browsable API) are left alone: they mix CSRF tokens with
+# user input, and compressing those can leak the token (BREACH).
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/(?!html)|application/(json|.+\+json|x-ndjson|javascript|xml|yaml'
+    r'|msgpack|cbor|vnd\.oai\.openapi))'
+)
+
+
+def parse_accept_encoding(header):
+    """Return {coding: q} from an Accept-Encoding header."""
+    codings = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        q = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        if coding:
+            codings[coding.strip().lower()] = q
+
+    return codings
+
+
+def choose_encoding(header):
+    """Return 'br', 'gzip' or None for an Accept-Encoding header."""
+    codings = parse_accept_encoding(header)
+    wildcard = codings.get('*', 0.0)
+
+    def accepted(coding):
+        return codings.get(coding, wildcard) > 0
+
+    # Brotli gives smaller responses for JSON at a similar CPU cost, so we
+    # prefer it whenever the client accepts both.
+    if brotli is not None and accepted('br'):
+        return 'br'
+    if accepted('gzip'):
+        return 'gzip'
+
+    return None
+
+
+class Compressor:
+    """Incremental gzip or brotli compressor."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(
+                quality=settings.COMPRESSION_BROTLI_QUALITY,
+            )
+        else:
+            # 16 + MAX_WBITS makes zlib write a gzip header and trailer.
+            self._compressor = zlib.compressobj(
+                settings.COMPRESSION_GZIP_LEVEL,
+                zlib.DEFLATED,
+                16 + zlib.MAX_WBITS,
+            )
+
+    def compress(self, data):
+        """Compress data, returning whatever output is ready."""
+        if self.encoding == 'br':
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self):
+        """Return all pending output, keeping the stream open."""
+        if self.encoding == 'br':
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        """Return the remaining output and close the stream."""
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterator of bytes, yielding compressed chunks."""
+    # Flushing after every chunk would ruin the ratio when a view streams
+    # many small pieces, so pending output is only flushed after every
+    # COMPRESSION_STREAM_FLUSH_SIZE bytes of input. That still sends data to
+    # the client while the view is producing it.
+    compressor = Compressor(encoding)
+    pending = 0
+
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= settings.COMPRESSION_STREAM_FLUSH_SIZE:
+            data += compressor.flush()
+            pending = 0
+        if data:
+            yield data
+
+    yield compressor.finish()
+
+
+def compress_bytes(data, encoding):
+    """Compress data in one go."""
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
+
+
+# Based on django.middleware.gzip.GZipMiddleware, with brotli support,
+# a configurable size threshold and levels, and a content type filter.
+class CompressionMiddleware(MiddlewareMixin):
+    """Compress responses with brotli or gzip if the client allows it."""
+
+    def process_response(self, request, response):
+        if not settings.COMPRESSION_ENABLED:
+            return response
+
+        # It's not worth attempting to compress really short responses.
+        if (not response.streaming
+                and len(response.content) < settings.COMPRESSION_MIN_SIZE):
+            return response
+
+        # Avoid compressing if we've already got a content-encoding.
+        if response.has_header('Content-Encoding'):
+            return response
+
+        if not COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            # We won't know the compressed size until we stream it.
+            response.streaming_content = compress_stream(
+                response.streaming_content,
+                encoding,
+            )
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+        else:
+            # Return the compressed content only if it's actually shorter.
+            compressed = compress_bytes(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(response.content))
+
+        # If there is a strong ETag, make it weak, because the body is no
+        # longer byte for byte the one the ETag was computed for.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+
+        return response
+
+
+# Under ASGI, Django runs the whole middleware chain on one thread as soon as
+# a single middleware is sync only, and then the async views serve one
+# request at a time. So the middleware below handles both: Django passes an
+# async get_response under ASGI, and __call__ then returns a coroutine.
+class SyncAndAsyncMiddleware:
+    """Base of middleware running sync under WSGI and async under ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # Makes Django see the instance as a coroutine function, the way
+            # django.utils.deprecation.MiddlewareMixin does.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.acall(request)
+        return self.call(request)
+
+    def call(self, request):
+        """Handle request, calling the sync get_response."""
+        raise NotImplementedError
+
+    async def acall(self, request):
+        """Handle request, awaiting the async get_response."""
+        raise NotImplementedError
+
+
+# It runs first, so the time includes the other middleware (compression,
+# sessions, ...). Queries run while a streaming response is consumed are not
+# counted, since that happens after the middleware returns.
+class MetricsMiddleware(SyncAndAsyncMiddleware):
+    """Record latency, status, queries and serializer time per view."""
+
+    def call(self, request):
+        start = time.perf_counter()
+        stats = metrics.RequestStats()
+        token = metrics.start_request(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+
+        self._record(request, response, start, stats)
+        return response
+
+    async def acall(self, request):
+        start = time.perf_counter()
+        stats = metrics.RequestStats()
+        token = metrics.start_request(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+
+        self._record(request, response, start, stats)
+        return response
+
+    def _record(self, request, response, start, stats):
+        metrics.record_request(
+            metrics.request_view_name(request),
+            request.method,
+            response.status_code,
+            time.perf_counter() - start,
+            stats,
+        )
+
+
+# Profiling keeps every query of the request in memory and normalizes their
+# SQL, so in production it only runs for SQL_PROFILING_SAMPLE_RATE of the
+# requests.
+class SQLProfilingMiddleware(SyncAndAsyncMiddleware):
+    """Log slow queries, repeated query shapes and query budget overruns."""
+
+    def _report(self, profile):
+        if profile.view is not None:
+            sql_profiling.report(profile)
+
+    def call(self, request):
+        if random.random() >= settings.SQL_PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = sql_profiling.start_profile(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            sql_profiling.stop_profile(profile)
+
+        self._report(profile)
+        return response
+
+    async def acall(self, request):
+        if random.random() >= settings.SQL_PROFILING_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        profile = sql_profiling.start_profile(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            sql_profiling.stop_profile(profile)
+
+        self._report(profile)
+        return response
+
+
+# Sampled requests get a root span, continuing the trace of the caller if it
+# sent a traceparent header. Without TRACING_EXPORTER the middleware does
+# nothing.
+class TracingMiddleware(SyncAndAsyncMiddleware):
+    """Trace sampled requests."""
+
+    def _trace(self, request):
+        return tracing.trace(
+            request.method,
+            traceparent=request.META.get('HTTP_TRACEPARENT'),
+            request_id=request.META.get('HTTP_X_REQUEST_ID'),
+            **{'http.method': request.method, 'http.target': request.path},
+        )
+
+    def _finish(self, root, request, response):
+        if root is None:
+            return
+        if request.resolver_match is not None:
+            view = metrics.request_view_name(request)
+            root.name = f'{request.method} {view}'
+        root.attributes['http.status_code'] = response.status_code
+
+    def call(self, request):
+        if not settings.TRACING_EXPORTER:
+            return self.get_response(request)
+
+        with self._trace(request) as root:
+            response = self.get_response(request)
+            self._finish(root, request, response)
+
+        return response
+
+    async def acall(self, request):
+        if not settings.TRACING_EXPORTER:
+            return await self.get_response(request)
+
+        with self._trace(request) as root:
+            response = await self.get_response(request)
+            self._finish(root, request, response)
+
+        return response
+
+
+# A staff user sends "X-Profile: 1" (or ?profile=1) with their API token to
+# run that one request under cProfile. Everyone else, and requests without
+# the flag, go straight through.
+class ProfilingMiddleware(SyncAndAsyncMiddleware):
+    """Capture a cProfile of the request for staff users who ask for it."""
+
+    def call(self, request):
+        if not profiling.wants_profile(request):
+            return self.get_response(request)
+        user = profiling.staff_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        response, profiler, sampler = profiling.run_profiled(
+            self.get_response,
+            request,
+        )
+        if profiler is None:
+            return response
+
+        response['X-Profile-Id'] = profiling.save_profile(profiler, sampler, {
+            'view': metrics.request_view_name(request),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+            'user': user.email,
+            'captured_at': time.time(),
+        })
+        return response
+
+    # Under ASGI the event loop runs many requests at once, so a profile of
+    # one would include the others. Requests to the async views are not
+    # profiled.
+    async def acall(self, request):
+        return await self.get_response(request)
+
+
+# Opt-in with MEMORY_DIAGNOSTICS. Reading the RSS costs a small /proc read
+# per request, while the tracemalloc snapshots are taken every
+# MEMORY_SNAPSHOT_INTERVAL seconds at the end of whichever request is
+# running then, and make it noticeably slower.
+class MemoryMiddleware(SyncAndAsyncMiddleware):
+    """Record RSS growth per view and snapshot allocations periodically."""
+
+    def call(self, request):
+        if not settings.MEMORY_DIAGNOSTICS:
+            return self.get_response(request)
+
+        before = memory.rss_bytes()
+        response = self.get_response(request)
+        after = memory.rss_bytes()
+        if before is None or after is None:
+            return response
+
+        if self._record(request, before, after):
+            memory.STATS.take_snapshot()
+        memory.check_rss_limit(after)
+
+        return response
+
+    # Under ASGI the growth also includes what the requests running at the
+    # same time allocated, so it is only a rough guide per view. The
+    # snapshot is taken on a thread, to keep the event loop serving.
+    async def acall(self, request):
+        if not settings.MEMORY_DIAGNOSTICS:
+            return await self.get_response(request)
+
+        before = memory.rss_bytes()
+        response = await self.get_response(request)
+        after = memory.rss_bytes()
+        if before is None or after is None:
+            return response
+
+        if self._record(request, before, after):
+            await sync_to_async(
+                memory.STATS.take_snapshot,
+                thread_sensitive=False,
+            )()
+        memory.check_rss_limit(after)
+
+        return response
+
+    def _record(self, request, before, after):
+        """Record the growth, returning whether a snapshot is due."""
+        memory.STATS.record(
+            metrics.request_view_name(request),
+            before,
+            after,
+        )
+        return memory.STATS.snapshot_due()
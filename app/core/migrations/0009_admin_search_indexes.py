@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+# The admin searches with istartswith (search_fields prefixed with '^') and
+# iexact ('='), which Django compiles to UPPER(column::text) LIKE/=
+# UPPER(%s). Only an index on the same expression with text_pattern_ops can
+# serve a LIKE prefix outside the C collation. Django 3.2 can't declare an
+# operator class on an expression index, hence the SQL.
+#
+# The indexes are built CONCURRENTLY, so the tables stay writable while they
+# build, which can't run in a transaction. If a build fails it leaves an
+# INVALID index behind, drop it before migrating again.
+INDEXES = [
+    ('core_user_email_upper_like', 'core_user', 'email'),
+    ('core_user_name_upper_like', 'core_user', 'name'),
+    ('core_recipe_title_upper_like', 'core_recipe', 'title'),
+    ('core_tag_name_upper_like', 'core_tag', 'name'),
+    ('core_ingredient_name_upper_like', 'core_ingredient', 'name'),
+]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_usershard'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'CREATE INDEX CONCURRENTLY {name} ON {table} '
+            f'(UPPER({column}::text) text_pattern_ops);',
+            f'DROP INDEX CONCURRENTLY {name};',
+        )
+        for name, table, column in INDEXES
+    ]
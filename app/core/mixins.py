@@ -0,0 +1,111 @@
+"""
+Mixins shared by the API views.
+"""
+from django.conf import settings
+from rest_framework import permissions
+
+from core.db_routers import (
+    allow_replica_reads,
+    is_sticky,
+    mark_write,
+    use_replicas,
+)
+from core.sharding import (
+    ShardMoveInProgress,
+    get_assignment,
+    mirror_user,
+    set_current_shard,
+    use_shard,
+)
+from core.timeouts import query_timeouts
+from core.tracing import span
+
+
+# A user who just wrote must read their own writes, which may not have
+# reached the replicas yet. So after a write, the user's requests stay on
+# the primary for REPLICA_STICKY_SECONDS.
+class ReplicaReadMixin:
+    """Send the reads of safe requests to the read replicas."""
+
+    def dispatch(self, request, *args, **kwargs):
+        # Reads start on the primary, and the flag is reset afterwards so it
+        # can't leak into the next request handled by this thread.
+        with use_replicas(False):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        # Authentication runs here, so it always reads from the primary.
+        super().initial(request, *args, **kwargs)
+        user = request.user
+
+        if not user.is_authenticated:
+            return
+
+        if request.method not in permissions.SAFE_METHODS:
+            mark_write(user.pk)
+        elif not is_sticky(user.pk):
+            allow_replica_reads()
+
+
+class ShardMixin:
+    """Send the queries on the user's recipe data to their shard."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_shard(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        user = request.user
+
+        if not user.is_authenticated:
+            return
+
+        shard, moving = get_assignment(user.pk)
+        # Reads are served from the old shard during a move, but writes
+        # could be lost while the rows are being copied.
+        if moving and request.method not in permissions.SAFE_METHODS:
+            raise ShardMoveInProgress()
+
+        mirror_user(user, shard)
+        set_current_shard(shard)
+
+
+# A query cancelled by a timeout answers the request with a 503 (see
+# core.timeouts.exception_handler). The API views should all use the same
+# timeouts: a kept connection only needs them set again when they change.
+class QueryTimeoutMixin:
+    """Cancel the view's queries after its timeouts, in milliseconds."""
+    # None for API_STATEMENT_TIMEOUT and API_LOCK_TIMEOUT, 0 for no limit.
+    statement_timeout = None
+    lock_timeout = None
+
+    def get_query_timeouts(self):
+        """Return (statement_timeout, lock_timeout) of the request."""
+        return (
+            settings.API_STATEMENT_TIMEOUT
+            if self.statement_timeout is None else self.statement_timeout,
+            settings.API_LOCK_TIMEOUT
+            if self.lock_timeout is None else self.lock_timeout,
+        )
+
+    # Authentication runs in dispatch(), so its queries get the timeouts too.
+    def dispatch(self, request, *args, **kwargs):
+        with query_timeouts(*self.get_query_timeouts()):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class TracingMixin:
+    """Trace authentication and permission checks."""
+
+    def perform_authentication(self, request):
+        with span('authenticate'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with span('check_permissions'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with span('check_object_permissions'):
+            super().check_object_permissions(request, obj)
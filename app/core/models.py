@@ -112,6 +112,11 @@ class Tag(models.Model):
         on_delete=models.CASCADE,
     )
 
+    # A stable default order makes recipe.tags.all() (and so the nested
+    # serializer output) deterministic instead of depending on the plan.
+    class Meta:
+        ordering = ['id']
+
     def __str__(self):
         return self.name
 
@@ -124,5 +129,27 @@ class Ingredient(models.Model):
         on_delete=models.CASCADE,
     )
 
+    # A stable default order makes recipe.ingredients.all() (and so the nested
+    # serializer output) deterministic instead of depending on the plan.
+    class Meta:
+        ordering = ['id']
+
     def __str__(self):
         return self.name
+
+
+class UserShard(models.Model):
+    """Database shard holding a user's recipes, tags and ingredients."""
+    # Users without a row live on the shard picked by consistent hashing.
+    # A row pins a user to another shard, e.g. after moving them.
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    shard = models.CharField(max_length=64)
+    # Writes are refused while the user's data is being copied.
+    moving = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f'{self.user_id} -> {self.shard}'
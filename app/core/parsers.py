@@ -0,0 +1,57 @@
+"""
+Parsers for the API.
+"""
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+from core import renderers
+from core.renderers import (
+    cbor2,
+    msgpack,
+    orjson,
+)
+
+
+class ORJSONParser(parsers.JSONParser):
+    """Parses JSON-serialized data with orjson."""
+    renderer_class = renderers.ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the incoming bytestream as JSON."""
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+
+        # orjson only reads UTF-8.
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(parsers.BaseParser):
+    """Parses MessagePack-serialized data."""
+    media_type = 'application/msgpack'
+    renderer_class = renderers.MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the incoming bytestream as MessagePack."""
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
+
+
+class CBORParser(parsers.BaseParser):
+    """Parses CBOR-serialized data."""
+    media_type = 'application/cbor'
+    renderer_class = renderers.CBORRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the incoming bytestream as CBOR."""
+        try:
+            return cbor2.loads(stream.read())
+        except (ValueError, cbor2.CBORDecodeError) as exc:
+            raise ParseError('CBOR parse error - %s' % str(exc))
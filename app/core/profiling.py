@@ -0,0 +1,157 @@
+"""
+On-demand cProfile capture of single requests, for staff users.
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+
+_RUNCALL = cProfile.Profile.runcall.__code__
+
+# Only one profiler can run at a time in a process, so concurrent capture
+# requests in other threads are served without profiling.
+_profiler_lock = threading.Lock()
+
+
+def wants_profile(request):
+    """Return True if the request asks to be profiled."""
+    return (
+        request.META.get('HTTP_X_PROFILE') == '1'
+        or request.GET.get('profile') == '1'
+    )
+
+
+def staff_user(request):
+    """Return the staff user of the request's API token, or None."""
+    # TokenAuthentication only reads the Authorization header, so it works
+    # with the plain Django request too.
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    if result is None or not result[0].is_staff:
+        return None
+    return result[0]
+
+
+def _label(code):
+    filename = os.path.basename(code.co_filename)
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+# cProfile only keeps caller -> callee totals, which can't be turned back
+# into stacks (Django's middleware chain alone recurses through the same
+# function). The flamegraph comes from sampling the stack of the request's
+# thread instead, while cProfile runs. Its times include cProfile's overhead,
+# which inflates functions called very often.
+class StackSampler(threading.Thread):
+    """Count the stacks of a thread every PROFILING_SAMPLE_INTERVAL."""
+
+    def __init__(self, thread_id):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.stacks = Counter()
+        self._done = threading.Event()
+
+    def run(self):
+        interval = settings.PROFILING_SAMPLE_INTERVAL
+        while not self._done.wait(interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            # Frames above the profiled call belong to the server.
+            while frame is not None and frame.f_code is not _RUNCALL:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            # Without the profiled call, the sample was taken before or
+            # after the request ran.
+            if stack and frame is not None:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def run_profiled(func, *args):
+    """Return (result, profiler, sampler); both None if one is running."""
+    if not _profiler_lock.acquire(blocking=False):
+        return func(*args), None, None
+
+    profiler = cProfile.Profile()
+    sampler = StackSampler(threading.get_ident())
+    sampler.start()
+    try:
+        result = profiler.runcall(func, *args)
+    finally:
+        sampler.stop()
+        _profiler_lock.release()
+    return result, profiler, sampler
+
+
+def save_profile(profiler, sampler, meta):
+    """Write the pstats and collapsed stacks of a capture, return its id."""
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    view = meta.get('view') or 'unmatched'
+    capture_id = (
+        f'{time.strftime("%Y%m%d-%H%M%S")}-{view}-{uuid.uuid4().hex[:8]}'
+    )
+    base = os.path.join(settings.PROFILING_DIR, capture_id)
+
+    profiler.dump_stats(f'{base}.prof')
+    # One "frame;frame;... count" line per stack, as read by flamegraph.pl
+    # and speedscope.
+    with open(f'{base}.collapsed', 'w') as f:
+        for stack, count in sorted(sampler.stacks.items()):
+            f.write(f'{stack} {count}\n')
+    # The metadata is written last: a capture is listed once it exists.
+    with open(f'{base}.json', 'w') as f:
+        json.dump({**meta, 'id': capture_id}, f)
+
+    prune()
+    return capture_id
+
+
+def list_profiles():
+    """Return the metadata of the captures, newest first."""
+    directory = settings.PROFILING_DIR
+    names = os.listdir(directory) if os.path.isdir(directory) else []
+
+    captures = []
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                captures.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+
+    return sorted(captures, key=lambda c: c['captured_at'], reverse=True)
+
+
+def prune():
+    """Delete the oldest captures beyond PROFILING_MAX_CAPTURES."""
+    for capture in list_profiles()[settings.PROFILING_MAX_CAPTURES:]:
+        for extension in ('json', 'prof', 'collapsed'):
+            try:
+                os.remove(profile_path(capture['id'], extension))
+            except FileNotFoundError:
+                pass
+
+
+def profile_path(capture_id, extension):
+    """Return the path of a capture file, or None for unknown names."""
+    # The id comes from the URL, so it must not be able to leave the
+    # directory.
+    if os.path.basename(capture_id) != capture_id or capture_id in ('.', '..'):
+        return None
+    return os.path.join(settings.PROFILING_DIR, f'{capture_id}.{extension}')
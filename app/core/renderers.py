@@ -0,0 +1,115 @@
+"""
+Renderers for the API.
+"""
+from datetime import timezone
+
+from rest_framework import renderers
+from rest_framework.utils.encoders import JSONEncoder
+
+# orjson is in the Pipfile, but the JSON renderer below still works without
+# it, behaving exactly like the DRF one it extends.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# So are msgpack and cbor2. Their renderers are only added to REST_FRAMEWORK
+# in settings.py when the package is installed.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+# DRF's encoder knows how to turn lazy translations, querysets, Decimals and
+# timedeltas into JSON types. We use it for anything orjson can't encode by
+# itself, so both renderers give the same output, with two exceptions for
+# floats: orjson writes exponents without '+' and leading zeros (1e16, not
+# 1e+16, which parses to the same value), and NaN and Infinity as null where
+# DRF raises ValueError. The serializers of the API return no floats (prices
+# are Decimals, rendered as strings).
+_encoder = JSONEncoder()
+
+ORJSON_OPTIONS = 0
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """Renderer which serializes to JSON with orjson."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render data into JSON, returning a bytestring."""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+
+        # orjson only writes compact UTF-8, so pretty printing (used by the
+        # browsable API) and ASCII only output are left to the stdlib.
+        if (orjson is None or data is None or indent is not None
+                or self.ensure_ascii or not self.compact):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data,
+            default=_encoder.default,
+            option=ORJSON_OPTIONS,
+        )
+
+        # Like JSONRenderer, escape U+2028 and U+2029 so the output is a
+        # strict javascript subset.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028')
+            ret = ret.replace(b'\xe2\x80\xa9', b'\\u2029')
+
+        return ret
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """Renderer which serializes to MessagePack."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render data into MessagePack, returning a bytestring."""
+        if data is None:
+            return b''
+
+        # MessagePack has no Decimal, datetime or UUID types, so they are
+        # converted the same way as in the JSON response.
+        return msgpack.packb(
+            data,
+            default=_encoder.default,
+            use_bin_type=True,
+        )
+
+
+def _cbor_default(encoder, value):
+    """Encode values cbor2 doesn't know about the way DRF does."""
+    encoder.encode(_encoder.default(value))
+
+
+class CBORRenderer(renderers.BaseRenderer):
+    """Renderer which serializes to CBOR."""
+    media_type = 'application/cbor'
+    format = 'cbor'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render data into CBOR, returning a bytestring."""
+        if data is None:
+            return b''
+
+        # CBOR has standard tags for Decimal, datetime and UUID, so cbor2
+        # encodes those itself. Naive datetimes are taken as UTC.
+        return cbor2.dumps(
+            data,
+            timezone=timezone.utc,
+            default=_cbor_default,
+        )
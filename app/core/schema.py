@@ -0,0 +1,131 @@
+"""
+OpenAPI schema generated once, then cached in memory and on disk, and the
+view serving it. The API-only workers (app.settings_api) never import it.
+"""
+import contextlib
+import hashlib
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import translation
+from django.utils.cache import get_conditional_response, patch_cache_control
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+
+RENDERERS = {
+    'yaml': OpenApiYamlRenderer,
+    'json': OpenApiJsonRenderer,
+}
+
+# {(format, lang): (content, etag)}, for the lifetime of the worker.
+_cache = {}
+_lock = threading.Lock()
+
+
+def normalize_lang(lang):
+    """Return lang if it is one of LANGUAGES, else None (the default)."""
+    # The language comes from the query string, so unknown ones must not
+    # create cache entries or files.
+    return lang if lang in dict(settings.LANGUAGES) else None
+
+
+def schema_path(fmt, lang=None):
+    """Return the path of the cached schema file."""
+    name = f'schema.{lang}.{fmt}' if lang else f'schema.{fmt}'
+    return os.path.join(settings.SCHEMA_CACHE_DIR, name)
+
+
+def etag(content):
+    """Return the strong ETag of content."""
+    return '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+
+
+def generate(fmt, lang=None):
+    """Introspect the API and return the rendered schema."""
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    override = (
+        translation.override(lang) if lang else contextlib.nullcontext()
+    )
+    with override:
+        schema = generator.get_schema(request=None, public=True)
+        return RENDERERS[fmt]().render(schema, renderer_context={})
+
+
+def build(fmt, lang=None):
+    """Generate the schema and write it to SCHEMA_CACHE_DIR."""
+    content = generate(fmt, lang)
+    os.makedirs(settings.SCHEMA_CACHE_DIR, exist_ok=True)
+    # Write then rename, so other workers never read half a file.
+    handle, tmp_path = tempfile.mkstemp(dir=settings.SCHEMA_CACHE_DIR)
+    with os.fdopen(handle, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, schema_path(fmt, lang))
+    return content
+
+
+def _load(fmt, lang):
+    try:
+        with open(schema_path(fmt, lang), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return generate(fmt, lang)
+
+
+# Only the build_schema command writes the files, when the container starts
+# (see compose/production/django/start), so a deploy replaces them and its
+# new workers start with an empty memory cache. Nothing else invalidates
+# them: the schema only changes with the code. Without the files, each
+# worker generates the schema on its first request and keeps it in memory
+# only, so a file left from older code is never written behind our back.
+def get_schema(fmt, lang=None):
+    """Return (content, etag) of the schema, generating it if needed."""
+    lang = normalize_lang(lang)
+    if not settings.SCHEMA_CACHE:
+        content = generate(fmt, lang)
+        return content, etag(content)
+
+    key = (fmt, lang)
+    cached = _cache.get(key)
+    if cached is None:
+        # Concurrent first requests of a worker wait for one generation.
+        with _lock:
+            cached = _cache.get(key)
+            if cached is None:
+                content = _load(fmt, lang)
+                cached = _cache[key] = (content, etag(content))
+    return cached
+
+
+def clear():
+    """Forget the schemas cached in memory."""
+    _cache.clear()
+
+
+class SchemaView(SpectacularAPIView):
+    """Serve the cached OpenAPI schema, answering 304 if it is unchanged."""
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        # DRF picked the renderer from the Accept header or ?format=.
+        content, schema_etag = get_schema(
+            request.accepted_renderer.format,
+            request.query_params.get('lang'),
+        )
+        response = HttpResponse(
+            content,
+            content_type=f'{request.accepted_media_type}; charset=utf-8',
+        )
+        response['ETag'] = schema_etag
+        # Clients may keep the schema but must check it is still current.
+        patch_cache_control(response, no_cache=True)
+        return get_conditional_response(
+            request,
+            etag=schema_etag,
+            response=response,
+        )
@@ -0,0 +1,40 @@
+"""
+Serializer helpers shared by the apps.
+"""
+from rest_framework import serializers
+
+from core.metrics import time_serializer
+from core.tracing import span
+
+
+# Only the top level serializer's .data is timed. Nested serializers and the
+# children of a list serializer are built through to_representation(), so
+# their time is included once.
+class TimedListSerializer(serializers.ListSerializer):
+    """List serializer recording the time spent building its data."""
+
+    @property
+    def data(self):
+        with time_serializer():
+            return super().data
+
+
+class TimedSerializerMixin:
+    """Record the time spent building the serializer data."""
+
+    @property
+    def data(self):
+        with time_serializer():
+            return super().data
+
+
+class TracedSerializerMixin:
+    """Trace validating and saving the serializer."""
+
+    def is_valid(self, *args, **kwargs):
+        with span(f'{type(self).__name__}.is_valid'):
+            return super().is_valid(*args, **kwargs)
+
+    def save(self, **kwargs):
+        with span(f'{type(self).__name__}.save'):
+            return super().save(**kwargs)
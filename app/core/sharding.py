@@ -0,0 +1,168 @@
+"""
+Per-user sharding of the recipe data.
+"""
+import bisect
+import contextlib
+import contextvars
+import functools
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.cache import caches
+
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.models import UserShard
+
+
+# Models whose rows live on the shard of the user owning them. Users, tokens
+# and shard assignments stay on the primary.
+SHARDED_MODELS = {
+    'core.Recipe',
+    'core.Tag',
+    'core.Ingredient',
+    'core.Recipe_tags',
+    'core.Recipe_ingredients',
+}
+
+# The shard queries go to when they carry no instance to route by. Views set
+# it once the user is known (see core.mixins.ShardMixin).
+_current_shard = contextvars.ContextVar('current_shard', default=None)
+
+
+class ShardMoveInProgress(APIException):
+    """Raised on writes while the user's data moves to another shard."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Your data is being moved, please retry shortly.'
+    default_code = 'shard_move_in_progress'
+    # Sent as the Retry-After header by DRF's exception handler.
+    wait = 5
+
+
+# Consistent hashing only moves about 1/n of the users when a shard is added,
+# instead of nearly all of them with hash(user_id) % n. Each shard is placed
+# at many points (virtual nodes) so users spread evenly.
+class HashRing:
+    """Consistent hash ring mapping keys to nodes."""
+
+    def __init__(self, nodes, vnodes=100):
+        self._ring = sorted(
+            (self._hash(f'{node}:{i}'), node)
+            for node in nodes
+            for i in range(vnodes)
+        )
+        self._hashes = [point for point, _ in self._ring]
+
+    @staticmethod
+    def _hash(key):
+        # md5 is stable across processes, unlike hash() on strings.
+        return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+    def get(self, key):
+        """Return the node for key."""
+        index = bisect.bisect(self._hashes, self._hash(str(key)))
+        return self._ring[index % len(self._ring)][1]
+
+
+@functools.lru_cache(maxsize=4)
+def _ring(shards):
+    return HashRing(shards)
+
+
+def hashed_shard(user_id):
+    """Return the shard consistent hashing picks for the user."""
+    return _ring(tuple(settings.DATABASE_SHARDS)).get(user_id)
+
+
+def _assignment_key(user_id):
+    """Return the cache key of the user's shard assignment."""
+    return f'user-shard:{user_id}'
+
+
+def get_assignment(user_id):
+    """Return (shard, moving) for the user."""
+    if len(settings.DATABASE_SHARDS) == 1:
+        return settings.DATABASE_SHARDS[0], False
+
+    cache = caches[settings.SHARD_ASSIGNMENT_CACHE]
+    key = _assignment_key(user_id)
+    assignment = cache.get(key)
+
+    if assignment is None:
+        row = UserShard.objects.using('default').filter(
+            user_id=user_id,
+        ).values_list('shard', 'moving').first()
+        assignment = row or (hashed_shard(user_id), False)
+        cache.set(
+            key,
+            assignment,
+            timeout=settings.SHARD_ASSIGNMENT_CACHE_SECONDS,
+        )
+
+    return tuple(assignment)
+
+
+def shard_for_user(user_id):
+    """Return the alias of the database holding the user's data."""
+    return get_assignment(user_id)[0]
+
+
+def set_assignment(user_id, shard, moving=False):
+    """Pin the user to shard and tell every worker about it."""
+    UserShard.objects.using('default').update_or_create(
+        user_id=user_id,
+        defaults={'shard': shard, 'moving': moving},
+    )
+    caches[settings.SHARD_ASSIGNMENT_CACHE].delete(_assignment_key(user_id))
+
+
+# Shards reference users with foreign keys, so each one needs a row for
+# every user whose data it holds. Users are only ever read from the primary,
+# so the row only needs the id: the other columns get placeholders. No email
+# or password hash is copied to the shards, and changes to the user have
+# nothing to update there.
+_mirrored = set()
+
+
+def mirror_user(user, shard):
+    """Add a placeholder row for the user to shard if it isn't there."""
+    if shard == 'default' or (shard, user.pk) in _mirrored:
+        return
+
+    # update_or_create also blanks rows that were full copies of the user.
+    get_user_model().objects.using(shard).update_or_create(
+        pk=user.pk,
+        defaults={
+            'email': f'user-{user.pk}@shard.invalid',
+            'name': '',
+            'password': UNUSABLE_PASSWORD_PREFIX,
+            'is_active': False,
+            'is_staff': False,
+            'is_superuser': False,
+            'last_login': None,
+        },
+    )
+    _mirrored.add((shard, user.pk))
+
+
+def current_shard():
+    """Return the shard set for this request, if any."""
+    return _current_shard.get()
+
+
+def set_current_shard(shard):
+    """Send the remaining queries of this use_shard() block to shard."""
+    _current_shard.set(shard)
+
+
+@contextlib.contextmanager
+def use_shard(shard):
+    """Send queries on sharded models inside the block to shard."""
+    token = _current_shard.set(shard)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
@@ -0,0 +1,138 @@
+"""
+Per-request SQL profiling: slow queries, repeated shapes and budgets.
+"""
+import contextvars
+import logging
+import re
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from core import metrics
+
+
+logger = logging.getLogger(__name__)
+
+# The profile of the current request, None when it is not sampled.
+_profile = contextvars.ContextVar('sql_profile', default=None)
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACES = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a view runs more queries than its budget allows."""
+
+
+def normalize_sql(sql):
+    """Return the shape of a query, without values or list lengths."""
+    # Django passes parameters separately, so values only show up as %s,
+    # apart from inlined limits and the length of IN lists.
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+class RequestProfile:
+    """The queries run by one request."""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.queries = []
+        self.token = None
+
+    @property
+    def view(self):
+        """Return the label of the request's view, None until resolved."""
+        if getattr(self.request, 'resolver_match', None) is None:
+            return None
+        return metrics.request_view_name(self.request)
+
+    def add(self, sql, duration):
+        """Record a query, logging it right away if it is slow."""
+        self.queries.append((sql, duration))
+
+        if duration * 1000 >= settings.SQL_SLOW_QUERY_MS:
+            logger.warning(
+                'Slow query (%.1fms) in %s: %s',
+                duration * 1000,
+                self.view,
+                normalize_sql(sql),
+            )
+
+    @property
+    def total_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated_shapes(self):
+        """Return [(shape, count)] of shapes run too many times."""
+        shapes = Counter(normalize_sql(sql) for sql, _ in self.queries)
+        return [
+            (shape, count) for shape, count in shapes.most_common()
+            if count >= settings.SQL_REPEATED_QUERY_THRESHOLD
+        ]
+
+
+# Like core.metrics, this wrapper is added once to every connection. It
+# only does work for the sampled requests.
+def profile_query(execute, sql, params, many, context):
+    """Database execute wrapper adding the query to the request profile."""
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add(sql, time.perf_counter() - start)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """Add the profiling wrapper to a new database connection."""
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_query)
+
+
+def start_profile(request=None):
+    """Profile the queries of the current request, returning the profile."""
+    profile = RequestProfile(request)
+    profile.token = _profile.set(profile)
+    return profile
+
+
+def stop_profile(profile):
+    """Stop profiling the queries."""
+    _profile.reset(profile.token)
+
+
+def report(profile):
+    """Log the profile, and enforce the view's query budget."""
+    logger.info(
+        '%s ran %d queries in %.1fms',
+        profile.view,
+        len(profile.queries),
+        profile.total_time * 1000,
+    )
+
+    for shape, count in profile.repeated_shapes():
+        logger.warning(
+            'Possible N+1 in %s: %d x %s',
+            profile.view,
+            count,
+            shape,
+        )
+
+    budget = settings.SQL_QUERY_BUDGETS.get(profile.view)
+    if budget is not None and len(profile.queries) > budget:
+        message = (
+            f'{profile.view} ran {len(profile.queries)} queries, '
+            f'over its budget of {budget}.'
+        )
+        if settings.SQL_QUERY_BUDGET_MODE == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
@@ -0,0 +1,14 @@
+"""
+File storage for the app.
+"""
+from django.core.files.storage import FileSystemStorage
+
+from core.tracing import span
+
+
+class TracedFileSystemStorage(FileSystemStorage):
+    """File system storage tracing file writes."""
+
+    def _save(self, name, content):
+        with span('storage.save', **{'file.name': name}):
+            return super()._save(name, content)
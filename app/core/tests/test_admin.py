@@ -4,10 +4,34 @@ Tests for Django admin modifications.
 # Django test client allows to make http request.
 # reverse() function is used to transform a view name given to URL pattern
 # into an actual URL.
-from django.test import TestCase, Client
+import csv
+import io
+import json
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from core import exports, sharding
+from core.models import Ingredient, Recipe, Tag
+
+
+def create_recipe(user, **params):
+    """Create and return a sample recipe."""
+    defaults = {
+        'title': 'Sample recipe',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
 
 class AdminSiteTests(TestCase):
     """Tests for Django admin."""
@@ -52,3 +76,318 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+    def test_search_users(self):
+        """Test users can be searched by email prefix."""
+        other = get_user_model().objects.create_user(
+            email='other@example.com',
+            password='testpass123',
+        )
+        url = reverse('admin:core_user_changelist')
+        res = self.client.get(url, {'q': 'user@'})
+
+        self.assertContains(res, self.user.email)
+        self.assertNotContains(res, other.email)
+
+
+class RecipeAdminTests(TestCase):
+    """Tests for the recipe, tag and ingredient admin pages."""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123',
+        )
+        self.client.force_login(self.admin_user)
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+
+    def changelist_queries(self):
+        """Return the number of queries of the recipe change list."""
+        url = reverse('admin:core_recipe_changelist')
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return len(context)
+
+    def test_recipe_list_queries_constant(self):
+        """Test listing recipes doesn't query once per recipe."""
+        create_recipe(self.user)
+        queries = self.changelist_queries()
+
+        for i in range(5):
+            other = get_user_model().objects.create_user(
+                email=f'other{i}@example.com',
+                password='testpass123',
+            )
+            create_recipe(other)
+
+        self.assertEqual(self.changelist_queries(), queries)
+
+    def test_edit_recipe_page(self):
+        """Test the edit page only renders the recipe's tags."""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+        Tag.objects.create(user=self.user, name='Unrelated')
+        Ingredient.objects.create(user=self.user, name='Salt')
+
+        url = reverse('admin:core_recipe_change', args=[recipe.id])
+        res = self.client.get(url)
+
+        self.assertContains(res, 'Vegan')
+        self.assertNotContains(res, 'Unrelated')
+        self.assertNotContains(res, 'Salt')
+
+    def test_tag_autocomplete(self):
+        """Test tags are searched by name prefix for the autocomplete."""
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Dessert')
+
+        res = self.client.get(reverse('admin:autocomplete'), {
+            'app_label': 'core',
+            'model_name': 'recipe',
+            'field_name': 'tags',
+            'term': 'veg',
+        })
+
+        names = [result['text'] for result in res.json()['results']]
+        self.assertEqual(names, ['Vegan'])
+
+    def test_filter_cooking_time(self):
+        """Test recipes can be filtered on ranges of cooking time."""
+        create_recipe(self.user, title='Toast', time_minutes=5)
+        create_recipe(self.user, title='Roast', time_minutes=90)
+
+        url = reverse('admin:core_recipe_changelist')
+        res = self.client.get(url, {'time': 'quick'})
+
+        self.assertContains(res, 'Toast')
+        self.assertNotContains(res, 'Roast')
+
+    def test_filter_has_image(self):
+        """Test recipes can be filtered on having an image."""
+        create_recipe(self.user, title='Pictured', image='uploads/a.jpg')
+        create_recipe(self.user, title='Plain')
+
+        url = reverse('admin:core_recipe_changelist')
+        res = self.client.get(url, {'has_image': 'no'})
+
+        self.assertContains(res, 'Plain')
+        self.assertNotContains(res, 'Pictured')
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_MIN=1000)
+    @patch('core.admin.estimated_count', return_value=123456)
+    def test_estimated_count(self, mock_count):
+        """Test big unfiltered lists show the estimated count."""
+        create_recipe(self.user)
+        url = reverse('admin:core_recipe_changelist')
+
+        res = self.client.get(url)
+        self.assertContains(res, '123456 recipes')
+
+        # Filtered lists are counted exactly.
+        res = self.client.get(url, {'q': 'Sample'})
+        self.assertContains(res, '1 recipe')
+
+
+def read_stream(res):
+    """Return the text of a streaming response."""
+    return b''.join(res.streaming_content).decode()
+
+
+class ExportTests(TestCase):
+    """Tests for the CSV and NDJSON exports of the admin."""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123',
+        )
+        self.client.force_login(self.admin_user)
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+            name='Test User',
+        )
+
+    def test_export_selected_recipes_csv(self):
+        """Test the admin action exports the selected recipes."""
+        recipe = create_recipe(self.user, title='Curry')
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name='Spicy'),
+            Tag.objects.create(user=self.user, name='Vegan'),
+        )
+        create_recipe(self.user, title='Not selected')
+
+        res = self.client.post(reverse('admin:core_recipe_changelist'), {
+            'action': 'export_csv',
+            '_selected_action': [recipe.id],
+        })
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        self.assertIn('attachment', res['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(read_stream(res))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], 'Curry')
+        self.assertEqual(rows[0]['user__email'], 'user@example.com')
+        self.assertEqual(rows[0]['price'], '5.25')
+        self.assertEqual(rows[0]['tags__name'], 'Spicy;Vegan')
+
+    def test_export_csv_formulas_escaped(self):
+        """Test cells that spreadsheets would run as formulas are escaped."""
+        recipe = create_recipe(self.user, title='=HYPERLINK("http://x")')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='@Spicy'))
+
+        url = reverse('admin:core_recipe_export', args=['csv'])
+        rows = list(csv.DictReader(io.StringIO(read_stream(
+            self.client.get(url),
+        ))))
+
+        self.assertEqual(rows[0]['title'], '\'=HYPERLINK("http://x")')
+        self.assertEqual(rows[0]['tags__name'], "'@Spicy")
+        self.assertEqual(rows[0]['price'], '5.25')
+
+    def test_export_changelist_ndjson(self):
+        """Test the export link exports what the change list shows."""
+        create_recipe(self.user, title='Toast', time_minutes=5)
+        create_recipe(self.user, title='Roast', time_minutes=90)
+
+        url = reverse('admin:core_recipe_export', args=['ndjson'])
+        res = self.client.get(url, {'time': 'quick'})
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in read_stream(res).splitlines()]
+        self.assertEqual([line['title'] for line in lines], ['Toast'])
+        self.assertEqual(lines[0]['tags__name'], [])
+        self.assertEqual(lines[0]['image'], '')
+
+    def test_export_link_keeps_filters(self):
+        """Test the change list links to the export with its filters."""
+        url = reverse('admin:core_recipe_changelist')
+        res = self.client.get(url, {'time': 'quick'})
+
+        export_url = reverse('admin:core_recipe_export', args=['csv'])
+        self.assertContains(res, f'{export_url}?time=quick')
+
+    def test_export_users(self):
+        """Test users can be exported."""
+        url = reverse('admin:core_user_export', args=['csv'])
+        res = self.client.get(url, {'q': 'user@'})
+
+        rows = list(csv.DictReader(io.StringIO(read_stream(res))))
+        self.assertEqual([row['email'] for row in rows], [self.user.email])
+        self.assertEqual(rows[0]['last_login'], '')
+
+    def test_export_unknown_format(self):
+        """Test unknown formats are not found."""
+        url = reverse('admin:core_recipe_export', args=['xml'])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_export_requires_staff(self):
+        """Test non staff users can't export."""
+        self.client.force_login(self.user)
+        url = reverse('admin:core_recipe_export', args=['csv'])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 302)
+
+    def test_export_chunks(self):
+        """Test exports read the queryset a chunk at a time."""
+        for i in range(5):
+            create_recipe(self.user, title=f'Recipe {i}')
+        fields = ['id', 'tags__name']
+
+        with patch('core.exports.CHUNK_SIZE', 2):
+            with CaptureQueriesContext(connection) as context:
+                lines = list(exports.ndjson_lines(Recipe.objects, fields))
+
+        # Three chunks plus the empty one, each reading its tags at once.
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(len(context), 7)
+
+
+@override_settings(DATABASE_SHARDS=['default', 'shard_1'])
+class ShardAdminTests(TestCase):
+    """Tests for picking the shard of the recipe data pages."""
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123',
+        )
+        self.client.force_login(self.admin_user)
+
+    def test_shard_filter(self):
+        """Test the change list offers the shards and no add button."""
+        res = self.client.get(reverse('admin:core_recipe_changelist'))
+
+        self.assertContains(res, '?shard=shard_1')
+        self.assertNotContains(res, reverse('admin:core_recipe_add'))
+
+    def test_unknown_shard(self):
+        """Test unknown shards are not found."""
+        url = reverse('admin:core_tag_changelist')
+        res = self.client.get(url, {'shard': 'unknown'})
+
+        self.assertEqual(res.status_code, 404)
+
+
+@unittest.skipUnless(
+    len(settings.DATABASE_SHARDS) > 1,
+    'Needs a second shard, see POSTGRES_SHARD_HOSTS.',
+)
+class ShardedRecipeAdminTests(TestCase):
+    """Tests for the recipe admin pages of another shard."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.client = Client()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123',
+        )
+        self.client.force_login(self.admin_user)
+        self.shard = settings.DATABASE_SHARDS[1]
+        user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+        )
+        sharding.mirror_user(user, self.shard)
+        self.addCleanup(sharding._mirrored.clear)
+        with sharding.use_shard(self.shard):
+            self.recipe = create_recipe(user, title='Sharded curry')
+
+    def test_changelist_of_shard(self):
+        """Test the change list shows the recipes of the picked shard."""
+        url = reverse('admin:core_recipe_changelist')
+
+        self.assertNotContains(self.client.get(url), 'Sharded curry')
+        self.assertContains(
+            self.client.get(url, {'shard': self.shard}),
+            'Sharded curry',
+        )
+
+    def test_change_page_of_shard(self):
+        """Test the change page links keep the shard of the change list."""
+        url = reverse('admin:core_recipe_change', args=[self.recipe.id])
+        res = self.client.get(url, {
+            '_changelist_filters': f'shard={self.shard}',
+        })
+
+        self.assertContains(res, 'Sharded curry')
+
+    def test_export_of_shard(self):
+        """Test the export reads the picked shard."""
+        url = reverse('admin:core_recipe_export', args=['ndjson'])
+        res = self.client.get(url, {'shard': self.shard})
+
+        lines = [json.loads(line) for line in read_stream(res).splitlines()]
+        self.assertEqual([line['title'] for line in lines], ['Sharded curry'])
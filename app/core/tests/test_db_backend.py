@@ -0,0 +1,118 @@
+"""
+Tests for the PostgreSQL backend keeping connections between requests.
+"""
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.test import SimpleTestCase
+
+from core import metrics
+
+
+def events():
+    """Return the connection events counted so far, by name."""
+    return {
+        event: value
+        for (alias, event), value in metrics.DB_CONNECTIONS.values.items()
+        if alias == 'test-backend'
+    }
+
+
+# Each test uses connections of its own to the test database, outside the
+# transactions of the test cases, like a worker between two requests.
+class DatabaseWrapperTests(SimpleTestCase):
+    """Test reusing, checking and expiring kept connections."""
+
+    def setUp(self):
+        metrics.REGISTRY.clear()
+
+    def make_wrapper(self, **settings_dict):
+        """Return a new connection to the test database."""
+        wrapper = type(connections['default'])(
+            {
+                **connections['default'].settings_dict,
+                'CONN_MAX_AGE': 600,
+                'CONN_HEALTH_CHECKS': True,
+                **settings_dict,
+            },
+            alias='test-backend',
+        )
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def next_request(self, wrapper):
+        """Run a query as the next request would."""
+        # What the request_started and request_finished signals do.
+        wrapper.close_if_unusable_or_obsolete()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            return cursor.fetchone()[0]
+
+    def terminate(self, wrapper):
+        """Close the connection of wrapper from the server side."""
+        admin = self.make_wrapper()
+        with admin.cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_terminate_backend(%s)',
+                [wrapper.connection.get_backend_pid()],
+            )
+
+    def test_connection_reused(self):
+        """Test the next requests reuse the connection."""
+        wrapper = self.make_wrapper()
+        self.next_request(wrapper)
+        raw = wrapper.connection
+
+        self.next_request(wrapper)
+        self.next_request(wrapper)
+
+        self.assertIs(wrapper.connection, raw)
+        self.assertEqual(events(), {'opened': 1, 'reused': 2})
+
+    def test_dead_connection_replaced(self):
+        """Test a connection closed by the server is replaced."""
+        wrapper = self.make_wrapper()
+        self.next_request(wrapper)
+        raw = wrapper.connection
+        self.terminate(wrapper)
+
+        self.assertEqual(self.next_request(wrapper), 1)
+        self.assertIsNot(wrapper.connection, raw)
+        self.assertEqual(events()['unhealthy'], 1)
+
+    def test_dead_connection_without_health_checks(self):
+        """Test without health checks, the request finds a dead connection."""
+        wrapper = self.make_wrapper(CONN_HEALTH_CHECKS=False)
+        self.next_request(wrapper)
+        self.terminate(wrapper)
+
+        with self.assertRaises(OperationalError):
+            self.next_request(wrapper)
+        # The error makes the next request replace the connection.
+        self.assertEqual(self.next_request(wrapper), 1)
+
+    def test_connection_expires(self):
+        """Test a connection older than CONN_MAX_AGE is closed."""
+        wrapper = self.make_wrapper(CONN_MAX_AGE=0)
+        self.next_request(wrapper)
+
+        wrapper.close_if_unusable_or_obsolete()
+
+        self.assertIsNone(wrapper.connection)
+        self.assertEqual(events(), {'opened': 1, 'expired': 1, 'closed': 1})
+
+
+class BenchmarkConnectionsTests(SimpleTestCase):
+    """Test the connection benchmark command."""
+
+    def test_benchmark_connections(self):
+        """Test every mode is reported with its connection events."""
+        out = StringIO()
+        call_command('benchmark_connections', '--requests', '5', stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('connect per request', output)
+        self.assertIn('opened 5', output)
+        self.assertIn('kept, health checked', output)
+        self.assertIn('reused 5', output)
@@ -0,0 +1,154 @@
+"""
+Tests for the database routers.
+"""
+from unittest.mock import patch
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import db_routers
+from core.db_routers import (
+    ReplicaRouter,
+    is_sticky,
+    mark_write,
+    use_replicas,
+)
+from core.models import Recipe
+from recipe.utils.create_object import create_recipe, create_user
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica_1', 'replica_2'],
+    REPLICA_MAX_LAG_SECONDS=10,
+    REPLICA_LAG_CHECK_INTERVAL=5,
+)
+class ReplicaRouterTests(SimpleTestCase):
+    """Test routing reads with a simulated replica lag."""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.lags = {'replica_1': 0.5, 'replica_2': 0.5}
+        db_routers._lag_cache.clear()
+        patcher = patch(
+            'core.db_routers.replica_lag',
+            side_effect=lambda alias: self.lags[alias],
+        )
+        self.replica_lag = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(db_routers._lag_cache.clear)
+
+    def test_reads_use_primary_by_default(self):
+        """Test reads outside use_replicas() go to the primary."""
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_reads_use_replicas(self):
+        """Test reads inside use_replicas() go to a replica."""
+        with use_replicas():
+            self.assertIn(
+                self.router.db_for_read(Recipe),
+                ['replica_1', 'replica_2'],
+            )
+
+    def test_writes_use_primary(self):
+        """Test writes always go to the primary."""
+        with use_replicas():
+            self.assertEqual(self.router.db_for_write(Recipe), 'default')
+
+    def test_lagging_replica_removed(self):
+        """Test a replica lagging too much is out of rotation."""
+        self.lags['replica_1'] = 60
+
+        with use_replicas():
+            for _ in range(20):
+                self.assertEqual(
+                    self.router.db_for_read(Recipe),
+                    'replica_2',
+                )
+
+    def test_all_replicas_down_uses_primary(self):
+        """Test reads fall back to the primary without healthy replicas."""
+        self.replica_lag.side_effect = ConnectionError
+
+        with use_replicas():
+            self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_lag_checked_periodically(self):
+        """Test the lag is cached between checks."""
+        with use_replicas(), patch('core.db_routers.time') as mock_time:
+            mock_time.monotonic.return_value = 100
+            self.router.db_for_read(Recipe)
+            self.router.db_for_read(Recipe)
+            self.assertEqual(self.replica_lag.call_count, 2)
+
+            mock_time.monotonic.return_value = 106
+            self.router.db_for_read(Recipe)
+            self.assertEqual(self.replica_lag.call_count, 4)
+
+    def test_no_migrations_on_replicas(self):
+        """Test migrations only run on the primary."""
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica_1', 'core'))
+
+
+@override_settings(
+    DATABASE_REPLICAS=['default'],
+    REPLICA_STICKY_CACHE='default',
+    REPLICA_STICKY_SECONDS=5,
+)
+class ReplicaReadAPITests(TestCase):
+    """Test which requests read from the replicas."""
+
+    def setUp(self):
+        # Writes by the earlier tests leave their users sticky to the
+        # primary, and the ids are reused.
+        caches['default'].clear()
+        caches['shared'].clear()
+
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        patcher = patch(
+            'core.db_routers.choose_replica',
+            return_value='default',
+        )
+        self.choose_replica = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_safe_request_reads_from_replica(self):
+        """Test a list request reads from a replica."""
+        create_recipe(self.user)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.choose_replica.assert_called()
+
+    def test_read_your_writes(self):
+        """Test reads stay on the primary right after a write."""
+        payload = {'title': 'Pho', 'time_minutes': 30, 'price': '5.50'}
+        self.client.post(RECIPES_URL, payload)
+
+        self.assertTrue(is_sticky(self.user.id))
+        self.choose_replica.reset_mock()
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+        self.choose_replica.assert_not_called()
+
+    def test_other_users_not_sticky(self):
+        """Test a write only makes the writer sticky."""
+        mark_write(self.user.id + 1)
+
+        self.client.get(RECIPES_URL)
+
+        self.assertFalse(is_sticky(self.user.id))
+        self.choose_replica.assert_called()
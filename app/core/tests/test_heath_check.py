@@ -1,12 +1,22 @@
 """
 Tests for the health check API.
 """
-from django.test import TestCase
+import json
+import tempfile
+from unittest.mock import patch
+
+from django.db.utils import OperationalError
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from core import health, schema
+
+
+HEALTH_CHECK_URL = reverse('health-check')
+
 
 class HealthCheckTests(TestCase):
     """Test the health check API."""
@@ -18,3 +28,98 @@ class HealthCheckTests(TestCase):
         res = client.get(url)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+@override_settings(
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    HEALTH_CHECK_CACHE_SECONDS=5,
+)
+class DeepHealthCheckTests(TestCase):
+    """Test the health check probing the dependencies."""
+
+    def setUp(self):
+        self.client = APIClient()
+        health._last_check.clear()
+        self.addCleanup(health._last_check.clear)
+
+    def test_deep_check(self):
+        """Test every dependency is probed and reported."""
+        res = self.client.get(HEALTH_CHECK_URL, {'deep': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data['healthy'])
+        self.assertEqual(
+            set(res.data['checks']),
+            {'database:default', 'cache:default', 'cache:shared', 'storage'},
+        )
+        for check in res.data['checks'].values():
+            self.assertTrue(check['healthy'])
+            self.assertIn('latency_ms', check)
+
+    def test_shallow_check_probes_nothing(self):
+        """Test the default health check doesn't probe dependencies."""
+        with patch('core.health.run_checks') as run_checks:
+            res = self.client.get(HEALTH_CHECK_URL)
+
+        self.assertEqual(res.data, {'healthy': True})
+        run_checks.assert_not_called()
+
+    def test_broken_database(self):
+        """Test a failing database makes the node unready."""
+        with patch(
+            'core.health.check_database',
+            side_effect=OperationalError('could not connect to db-host'),
+        ):
+            res = self.client.get(reverse('readiness'))
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(res.data['healthy'])
+        check = res.data['checks']['database:default']
+        self.assertFalse(check['healthy'])
+        # The message could expose the host, so only the type is shown.
+        self.assertEqual(check['error'], 'OperationalError')
+        self.assertNotIn(b'db-host', res.content)
+        self.assertTrue(res.data['checks']['storage']['healthy'])
+
+    def test_broken_storage(self):
+        """Test a read only media volume makes the node unready."""
+        with patch(
+            'core.health.default_storage.save',
+            side_effect=PermissionError,
+        ):
+            res = self.client.get(HEALTH_CHECK_URL, {'deep': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertFalse(res.data['checks']['storage']['healthy'])
+
+    def test_result_cached(self):
+        """Test the dependencies are probed at most every few seconds."""
+        with patch('core.health.check_database') as check_database:
+            self.client.get(reverse('readiness'))
+            res = self.client.get(reverse('readiness'))
+
+        self.assertEqual(check_database.call_count, 1)
+        self.assertIn('age_seconds', res.data)
+
+    def test_liveness_ignores_dependencies(self):
+        """Test liveness doesn't depend on the database."""
+        with patch(
+            'core.health.check_database',
+            side_effect=OperationalError,
+        ):
+            res = self.client.get(reverse('liveness'))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'healthy': True})
+
+    def test_schema(self):
+        """Test the schema describes what the health views answer."""
+        paths = json.loads(schema.generate('json'))['paths']
+
+        for path in ('/api/health-check/', '/api/health-check/live/',
+                     '/api/health-check/ready/'):
+            content = paths[path]['get']['responses']['200']['content']
+            self.assertEqual(
+                content['application/json']['schema'],
+                {'$ref': '#/components/schemas/Health'},
+            )
@@ -0,0 +1,174 @@
+"""
+Tests for the worker memory diagnostics.
+"""
+import os
+import signal
+import tracemalloc
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import (
+    AsyncClient,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import memory
+from recipe.utils.create_object import create_user
+
+
+MEMORY_URL = reverse('memory')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def allocate():
+    """Allocate memory that stays alive."""
+    return [bytearray(1024) for _ in range(1000)]
+
+
+class MemoryStatsTests(SimpleTestCase):
+    """Test recording RSS growth and diffing snapshots."""
+
+    def setUp(self):
+        self.addCleanup(tracemalloc.stop)
+
+    def test_rss(self):
+        """Test the resident memory of the process is read."""
+        self.assertGreater(memory.rss_bytes(), 1024 * 1024)
+
+    def test_record_growth_per_view(self):
+        """Test only growth is added up per view."""
+        stats = memory.MemoryStats()
+
+        stats.record('RecipeViewSet.list', 100, 150)
+        stats.record('RecipeViewSet.list', 150, 120)
+        stats.record('RecipeViewSet.list', 120, 200)
+
+        [view] = stats.report()['views']
+        self.assertEqual(view['requests'], 3)
+        self.assertEqual(view['requests_grown'], 2)
+        self.assertEqual(view['growth_bytes'], 130)
+        self.assertEqual(view['max_growth_bytes'], 80)
+
+    def test_snapshot_diff_finds_allocation(self):
+        """Test the line allocating the most shows up first."""
+        stats = memory.MemoryStats()
+        stats.take_snapshot()
+        kept = allocate()
+
+        stats.take_snapshot()
+
+        top = stats.report()['top_since_start'][0]
+        line = allocate.__code__.co_firstlineno + 2
+        self.assertTrue(top['site'].endswith(f'test_memory.py:{line}'))
+        self.assertGreaterEqual(top['size_diff_bytes'], len(kept) * 1024)
+
+    @override_settings(MEMORY_SNAPSHOT_INTERVAL=60)
+    def test_snapshot_due(self):
+        """Test snapshots are taken every MEMORY_SNAPSHOT_INTERVAL."""
+        stats = memory.MemoryStats()
+        self.assertTrue(stats.snapshot_due())
+
+        stats.take_snapshot()
+
+        self.assertFalse(stats.snapshot_due())
+
+
+@mock.patch('core.memory.os.kill')
+@override_settings(MEMORY_RECYCLE_RSS_MB=100)
+class RecycleTests(SimpleTestCase):
+    """Test recycling workers over the RSS limit."""
+
+    def setUp(self):
+        patcher = mock.patch('core.memory.STATS', memory.MemoryStats())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('core.memory.uwsgi', mock.Mock())
+    def test_recycle_over_limit(self, mock_kill):
+        """Test uWSGI is signalled once when going over the limit."""
+        memory.check_rss_limit(50 * 1024 * 1024)
+        mock_kill.assert_not_called()
+
+        with self.assertLogs('core.memory', 'WARNING'):
+            memory.check_rss_limit(150 * 1024 * 1024)
+        memory.check_rss_limit(160 * 1024 * 1024)
+
+        mock_kill.assert_called_once_with(os.getpid(), signal.SIGHUP)
+
+    @mock.patch('core.memory.uwsgi', None)
+    def test_no_recycle_outside_uwsgi(self, mock_kill):
+        """Test nothing is signalled without uWSGI."""
+        with self.assertLogs('core.memory', 'WARNING'):
+            memory.check_rss_limit(150 * 1024 * 1024)
+
+        mock_kill.assert_not_called()
+
+
+@override_settings(MEMORY_DIAGNOSTICS=True, MEMORY_SNAPSHOT_INTERVAL=3600)
+class MemoryEndpointTests(TestCase):
+    """Test recording requests and the staff endpoint."""
+
+    def setUp(self):
+        patcher = mock.patch('core.memory.STATS', memory.MemoryStats())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(tracemalloc.stop)
+
+        self.client = APIClient()
+        self.staff = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123',
+        )
+
+    def test_requests_recorded_per_view(self):
+        """Test requests are recorded under their view."""
+        self.client.force_authenticate(self.staff)
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(MEMORY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        views = [view['view'] for view in res.data['views']]
+        self.assertIn('RecipeViewSet.list', views)
+        self.assertEqual(res.data['pid'], os.getpid())
+        self.assertTrue(res.data['tracing'])
+
+    def test_post_takes_snapshot(self):
+        """Test POST diffs a new snapshot with the previous one."""
+        self.client.force_authenticate(self.staff)
+        self.client.get(RECIPES_URL)
+        kept = allocate()
+
+        res = self.client.post(MEMORY_URL)
+
+        self.assertTrue(res.data['top_since_start'])
+        self.assertTrue(kept)
+
+    def test_staff_only(self):
+        """Test other users can't see the diagnostics."""
+        self.client.force_authenticate(create_user())
+
+        res = self.client.get(MEMORY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    async def test_async_requests_recorded(self):
+        """Test requests to the async views are recorded under ASGI."""
+        await AsyncClient().get(reverse('recipe-async:recipe-list'))
+
+        views = [view['view'] for view in memory.STATS.report()['views']]
+        self.assertEqual(views, ['_recipes'])
+
+    @override_settings(MEMORY_DIAGNOSTICS=False)
+    def test_disabled(self):
+        """Test nothing is recorded unless enabled."""
+        self.client.force_authenticate(self.staff)
+        self.client.get(RECIPES_URL)
+
+        self.assertEqual(memory.STATS.report()['views'], [])
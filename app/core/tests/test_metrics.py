@@ -0,0 +1,211 @@
+"""
+Tests for the request metrics.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import resolve, reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import metrics
+from recipe.utils.create_object import create_recipe, create_user
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+METRICS_URL = reverse('metrics')
+
+
+def view_for(url, method='GET'):
+    """Return the metrics label of the view serving url."""
+    return metrics.view_name(resolve(url).func, method)
+
+
+class ViewNameTests(TestCase):
+    """Test the view labels."""
+
+    def test_viewset_actions(self):
+        """Test viewsets are labelled with the action."""
+        self.assertEqual(view_for(RECIPES_URL), 'RecipeViewSet.list')
+        self.assertEqual(
+            view_for(RECIPES_URL, 'POST'),
+            'RecipeViewSet.create',
+        )
+        self.assertEqual(
+            view_for(reverse('recipe:recipe-upload-image', args=[1]), 'POST'),
+            'RecipeViewSet.upload_image',
+        )
+
+    def test_api_views(self):
+        """Test API views and functions are labelled by name."""
+        self.assertEqual(view_for(reverse('user:token')), 'CreateTokenView')
+        self.assertEqual(view_for(reverse('health-check')), 'health_check')
+
+
+class MetricsTests(TestCase):
+    """Test recording and exposing the metrics."""
+
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir)
+        settings = override_settings(METRICS_DIR=self.metrics_dir)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        metrics.REGISTRY.clear()
+        self.addCleanup(metrics.REGISTRY.clear)
+
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_request_recorded(self):
+        """Test a request is counted with its latency, queries and time."""
+        create_recipe(self.user)
+        self.client.get(RECIPES_URL)
+
+        labels = ('RecipeViewSet.list',)
+        self.assertEqual(
+            metrics.REQUESTS.values[('RecipeViewSet.list', 'GET', '200')],
+            1,
+        )
+        self.assertEqual(
+            sum(metrics.REQUEST_DURATION.values[labels][:-1]),
+            1,
+        )
+        # Authentication is forced, so: recipes, tags and ingredients.
+        self.assertEqual(metrics.DB_QUERIES.values[labels][-1], 3)
+        self.assertGreater(metrics.DB_DURATION.values[labels], 0)
+        self.assertGreater(metrics.SERIALIZER_DURATION.values[labels][-1], 0)
+
+    def test_serializer_time_excludes_queries(self):
+        """Test queries run while serializing count as database time only."""
+        stats = metrics.RequestStats()
+        token = metrics.start_request(stats)
+        try:
+            with metrics.time_serializer():
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_sleep(0.2)')
+        finally:
+            metrics.end_request(token)
+
+        self.assertGreater(stats.db_time, 0.2)
+        self.assertLess(stats.serializer_time, 0.1)
+
+    def test_unmatched_url(self):
+        """Test requests to unknown URLs share one label."""
+        self.client.get('/api/unknown/')
+
+        self.assertEqual(
+            metrics.REQUESTS.values[('unmatched', 'GET', '404')],
+            1,
+        )
+
+    async def test_async_request_recorded(self):
+        """Test requests to the async views are recorded under ASGI."""
+        await AsyncClient().get(reverse('recipe-async:recipe-list'))
+
+        self.assertEqual(
+            metrics.REQUESTS.values[('_recipes', 'GET', '401')],
+            1,
+        )
+
+    def test_metrics_endpoint(self):
+        """Test the metrics are exposed in the Prometheus format."""
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        body = res.content.decode()
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn(
+            'http_requests_total{view="RecipeViewSet.list",method="GET",'
+            'status="200"} 1',
+            body,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_bucket'
+            '{view="RecipeViewSet.list",le="+Inf"} 1',
+            body,
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token_required(self):
+        """Test the metrics need the bearer token when one is set."""
+        client = APIClient()
+
+        res = client.get(METRICS_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        res = client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        res = client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_workers_summed(self):
+        """Test the metrics of every worker process are added up."""
+        self.client.get(RECIPES_URL)
+        metrics.REGISTRY.write(force=True)
+        # Another worker that served the same view twice.
+        with open(metrics.REGISTRY.path()) as f:
+            snapshot = json.load(f)
+        snapshot['http_requests_total'] = [
+            [['RecipeViewSet.list', 'GET', '200'], 2],
+        ]
+        with open(os.path.join(self.metrics_dir, '1.json'), 'w') as f:
+            json.dump(snapshot, f)
+
+        totals = metrics.collect()
+
+        self.assertEqual(
+            totals['http_requests_total'][
+                ('RecipeViewSet.list', 'GET', '200')
+            ],
+            3,
+        )
+
+    def test_servers_summed(self):
+        """Test the files of the other servers sharing the directory count."""
+        self.client.get(RECIPES_URL)
+        with override_settings(METRICS_SERVER='api'):
+            metrics.REGISTRY.write(force=True)
+            self.assertEqual(
+                os.path.basename(metrics.REGISTRY.path()),
+                f'api-{os.getpid()}.json',
+            )
+        # The app server's worker with the same pid, in another container.
+        with override_settings(METRICS_SERVER='app'):
+            metrics.REGISTRY.write(force=True)
+
+        totals = metrics.collect()
+
+        self.assertEqual(
+            totals['http_requests_total'][
+                ('RecipeViewSet.list', 'GET', '200')
+            ],
+            2,
+        )
+
+    def test_histogram_buckets_cumulative(self):
+        """Test rendered buckets count every value up to their bound."""
+        histogram = metrics.Histogram('h', 'Test.', ('view',), buckets=(1, 2))
+        histogram.observe(('v',), 0.5)
+        histogram.observe(('v',), 2)
+        histogram.observe(('v',), 3)
+        registry = metrics.Registry()
+        registry.register(histogram)
+
+        body = metrics.render({'h': dict(histogram.values)}, registry)
+
+        self.assertIn('h_bucket{view="v",le="1"} 1', body)
+        self.assertIn('h_bucket{view="v",le="2"} 2', body)
+        self.assertIn('h_bucket{view="v",le="+Inf"} 3', body)
+        self.assertIn('h_sum{view="v"} 5.5', body)
+        self.assertIn('h_count{view="v"} 3', body)
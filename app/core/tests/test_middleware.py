@@ -0,0 +1,150 @@
+"""
+Tests for the app middleware.
+"""
+import gzip
+import json
+import zlib
+from unittest import skipIf
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.middleware import (
+    CompressionMiddleware,
+    brotli,
+    choose_encoding,
+)
+
+
+PAYLOAD = json.dumps(
+    [{'id': i, 'title': f'Recipe {i}'} for i in range(200)]
+).encode()
+
+
+def run_middleware(response, accept_encoding='gzip, deflate, br'):
+    """Pass response through CompressionMiddleware and return it."""
+    request = RequestFactory().get(
+        '/api/recipe/recipes/',
+        HTTP_ACCEPT_ENCODING=accept_encoding,
+    )
+    middleware = CompressionMiddleware(lambda request: response)
+    return middleware(request)
+
+
+def json_response(content=PAYLOAD):
+    """Return a JSON response with content."""
+    return HttpResponse(content, content_type='application/json')
+
+
+class ChooseEncodingTests(SimpleTestCase):
+    """Test parsing the Accept-Encoding header."""
+
+    def test_gzip_only(self):
+        """Test gzip is chosen when brotli is not accepted."""
+        self.assertEqual(choose_encoding('gzip, deflate'), 'gzip')
+
+    def test_refused_with_q_zero(self):
+        """Test a coding with q=0 is not used."""
+        self.assertIsNone(choose_encoding('gzip;q=0, identity'))
+
+    def test_wildcard(self):
+        """Test the wildcard accepts any coding."""
+        self.assertIn(choose_encoding('*'), ['br', 'gzip'])
+
+    def test_empty_header(self):
+        """Test no coding is chosen without the header."""
+        self.assertIsNone(choose_encoding(''))
+
+
+@override_settings(COMPRESSION_ENABLED=True, COMPRESSION_MIN_SIZE=512)
+class CompressionMiddlewareTests(SimpleTestCase):
+    """Test compressing responses."""
+
+    def test_gzip_response(self):
+        """Test a large JSON response is gzipped."""
+        res = run_middleware(json_response(), 'gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+        self.assertEqual(res['Content-Length'], str(len(res.content)))
+        self.assertEqual(gzip.decompress(res.content), PAYLOAD)
+
+    @skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_preferred(self):
+        """Test brotli is used when the client accepts it."""
+        res = run_middleware(json_response())
+
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(res.content), PAYLOAD)
+
+    def test_small_response_not_compressed(self):
+        """Test responses under the threshold are left alone."""
+        res = run_middleware(json_response(b'{"healthy":true}'))
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_client_without_compression(self):
+        """Test the Vary header is set even if nothing is compressed."""
+        res = run_middleware(json_response(), '')
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+        self.assertEqual(res.content, PAYLOAD)
+
+    def test_html_not_compressed(self):
+        """Test HTML pages are not compressed."""
+        res = run_middleware(HttpResponse(PAYLOAD, content_type='text/html'))
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+
+    def test_strong_etag_made_weak(self):
+        """Test a strong ETag becomes weak once compressed."""
+        response = json_response()
+        response['ETag'] = '"abc"'
+
+        res = run_middleware(response, 'gzip')
+
+        self.assertEqual(res['ETag'], 'W/"abc"')
+
+    @override_settings(COMPRESSION_STREAM_FLUSH_SIZE=1024)
+    def test_streaming_response(self):
+        """Test streaming responses are compressed chunk by chunk."""
+        chunks = [PAYLOAD[i:i + 100] for i in range(0, len(PAYLOAD), 100)]
+        response = StreamingHttpResponse(
+            iter(chunks),
+            content_type='application/json',
+        )
+
+        res = run_middleware(response, 'gzip')
+        compressed = list(res.streaming_content)
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertGreater(len(compressed), 2)
+        # The first flushed chunks can be decompressed before the stream ends.
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        partial = decompressor.decompress(b''.join(compressed[:2]))
+        self.assertTrue(partial)
+        self.assertTrue(PAYLOAD.startswith(partial))
+        self.assertEqual(gzip.decompress(b''.join(compressed)), PAYLOAD)
+
+    def test_ndjson_compressed(self):
+        """Test the NDJSON exports are compressed."""
+        response = StreamingHttpResponse(
+            iter([PAYLOAD]),
+            content_type='application/x-ndjson',
+        )
+
+        res = run_middleware(response, 'gzip')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            gzip.decompress(b''.join(res.streaming_content)),
+            PAYLOAD,
+        )
+
+    @override_settings(COMPRESSION_ENABLED=False)
+    def test_disabled(self):
+        """Test nothing is compressed when compression is disabled."""
+        res = run_middleware(json_response())
+
+        self.assertFalse(res.has_header('Content-Encoding'))
@@ -0,0 +1,182 @@
+"""
+Tests for the on-demand request profiling.
+"""
+import cProfile
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.test import (
+    AsyncClient,
+    Client,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core import profiling
+from recipe.utils.create_object import create_recipe, create_user
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+PROFILES_URL = reverse('profiles')
+
+
+def busy(seconds):
+    """Keep the CPU busy for a while."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+@override_settings(PROFILING_SAMPLE_INTERVAL=0.001)
+class StackSamplerTests(SimpleTestCase):
+    """Test sampling the stacks of the request thread."""
+
+    def test_samples_profiled_call(self):
+        """Test stacks are collapsed from the profiled call down."""
+        sampler = profiling.StackSampler(threading.get_ident())
+        sampler.start()
+        busy(0.02)
+        cProfile.Profile().runcall(busy, 0.05)
+        sampler.stop()
+
+        self.assertTrue(sampler.stacks)
+        line = busy.__code__.co_firstlineno
+        self.assertEqual(
+            list(sampler.stacks),
+            [f'busy (test_profiling.py:{line})'],
+        )
+
+
+class ProfilingTests(TestCase):
+    """Test capturing and listing profiles."""
+
+    def setUp(self):
+        self.profiling_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profiling_dir)
+        settings = override_settings(
+            PROFILING_DIR=self.profiling_dir,
+            PROFILING_MAX_CAPTURES=2,
+            PROFILING_SAMPLE_INTERVAL=0.0001,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.staff = get_user_model().objects.create_superuser(
+            email='admin@example.com',
+            password='testpass123',
+        )
+        self.user = create_user()
+        create_recipe(self.staff)
+        self.client = Client()
+
+    def get_recipes(self, user, **extra):
+        """List recipes with the API token of user."""
+        token, _ = Token.objects.get_or_create(user=user)
+        return self.client.get(
+            RECIPES_URL,
+            HTTP_AUTHORIZATION=f'Token {token.key}',
+            **extra,
+        )
+
+    def test_staff_capture(self):
+        """Test a staff user's flagged request is profiled."""
+        res = self.get_recipes(self.staff, HTTP_X_PROFILE='1')
+
+        self.assertEqual(res.status_code, 200)
+        capture_id = res['X-Profile-Id']
+        self.assertIn('RecipeViewSet.list', capture_id)
+        for extension in ('prof', 'collapsed', 'json'):
+            self.assertTrue(os.path.exists(
+                profiling.profile_path(capture_id, extension)
+            ))
+        [profile] = profiling.list_profiles()
+        self.assertEqual(profile['view'], 'RecipeViewSet.list')
+        self.assertEqual(profile['user'], self.staff.email)
+        self.assertEqual(profile['status'], 200)
+
+    async def test_async_request_not_profiled(self):
+        """Test requests to the async views go through unprofiled."""
+        res = await AsyncClient().get(
+            reverse('recipe-async:recipe-list'),
+            x_profile='1',
+        )
+
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_query_flag(self):
+        """Test ?profile=1 works like the header."""
+        token, _ = Token.objects.get_or_create(user=self.staff)
+        res = self.client.get(
+            RECIPES_URL,
+            {'profile': '1'},
+            HTTP_AUTHORIZATION=f'Token {token.key}',
+        )
+
+        self.assertIn('X-Profile-Id', res)
+
+    def test_non_staff_not_profiled(self):
+        """Test the flag is ignored for other users and without a token."""
+        res = self.get_recipes(self.user, HTTP_X_PROFILE='1')
+        anonymous = self.client.get(RECIPES_URL, HTTP_X_PROFILE='1')
+
+        self.assertNotIn('X-Profile-Id', res)
+        self.assertNotIn('X-Profile-Id', anonymous)
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_captures_are_capped(self):
+        """Test only the newest PROFILING_MAX_CAPTURES are kept."""
+        for _ in range(3):
+            self.get_recipes(self.staff, HTTP_X_PROFILE='1')
+
+        self.assertEqual(len(profiling.list_profiles()), 2)
+        self.assertEqual(len(os.listdir(self.profiling_dir)), 6)
+
+    def test_admin_list_and_download(self):
+        """Test staff can list and download the captures."""
+        capture_id = self.get_recipes(
+            self.staff,
+            HTTP_X_PROFILE='1',
+        )['X-Profile-Id']
+        self.client.force_login(self.staff)
+
+        res = self.client.get(PROFILES_URL)
+        download = self.client.get(
+            reverse('profile-download', args=[capture_id, 'collapsed']),
+        )
+
+        self.assertContains(res, capture_id)
+        self.assertEqual(download.status_code, 200)
+        stacks = b''.join(download.streaming_content).decode()
+        self.assertTrue(stacks.startswith('inner (exception.py'))
+        self.assertIn(';dispatch (views.py', stacks)
+
+    def test_download_rejects_other_files(self):
+        """Test only capture files can be downloaded."""
+        self.client.force_login(self.staff)
+
+        res = self.client.get(
+            reverse('profile-download', args=['..', 'prof']),
+        )
+        json_res = self.client.get(
+            reverse('profile-download', args=['missing', 'json']),
+        )
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(json_res.status_code, 404)
+
+    def test_admin_list_requires_staff(self):
+        """Test other users are sent to the admin login."""
+        self.client.force_login(self.user)
+
+        res = self.client.get(PROFILES_URL)
+
+        self.assertEqual(res.status_code, 302)
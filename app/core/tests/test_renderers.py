@@ -0,0 +1,288 @@
+"""
+Tests for the API renderers and parsers.
+"""
+import io
+import json
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.parsers import (
+    CBORParser,
+    MessagePackParser,
+    ORJSONParser,
+)
+from core.renderers import (
+    CBORRenderer,
+    MessagePackRenderer,
+    ORJSONRenderer,
+    cbor2,
+    msgpack,
+    orjson,
+)
+from recipe.utils.create_object import create_recipe, create_user
+
+
+def sample_payload():
+    """Return a payload shaped like the recipe detail response."""
+    return [
+        {
+            'id': 1,
+            'title': 'Bánh mì \u2028',
+            'time_minutes': 15,
+            'price': '6.99',
+            'link': 'https://example.com',
+            'tags': [{'id': 1, 'name': 'Lunch'}],
+            'ingredients': [],
+            'image': None,
+            'description': 'A "quoted" description',
+        },
+    ]
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """Test the orjson renderer."""
+
+    def test_matches_json_renderer(self):
+        """Test output is identical to DRF's JSONRenderer."""
+        payload = sample_payload()
+
+        self.assertEqual(
+            ORJSONRenderer().render(payload),
+            JSONRenderer().render(payload),
+        )
+
+    def test_render_python_types(self):
+        """Test rendering Decimal, datetime and UUID values."""
+        payload = {
+            'price': Decimal('6.99'),
+            'created': datetime(2023, 8, 8, 12, 30, tzinfo=timezone.utc),
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        }
+
+        self.assertEqual(
+            ORJSONRenderer().render(payload),
+            JSONRenderer().render(payload),
+        )
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_render_floats(self):
+        """Test floats parse back to the values DRF's renderer writes."""
+        payload = [0.1, 2.0, -0.0, 123456789.123, 1e16, 1e-7, 5e-324]
+
+        self.assertEqual(
+            json.loads(ORJSONRenderer().render(payload)),
+            json.loads(JSONRenderer().render(payload)),
+        )
+        self.assertEqual(ORJSONRenderer().render([1e16]), b'[1e16]')
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_render_non_finite_floats(self):
+        """Test NaN and Infinity are written as null."""
+        payload = [float('nan'), float('inf'), float('-inf')]
+
+        self.assertEqual(
+            ORJSONRenderer().render(payload),
+            b'[null,null,null]',
+        )
+        with self.assertRaises(ValueError):
+            JSONRenderer().render(payload)
+
+    def test_render_none(self):
+        """Test rendering None gives an empty body."""
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_indent_uses_json_renderer(self):
+        """Test an indent request is rendered by the stdlib encoder."""
+        payload = sample_payload()
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(
+            ORJSONRenderer().render(payload, media_type),
+            JSONRenderer().render(payload, media_type),
+        )
+
+    @patch('core.renderers.orjson', None)
+    def test_fallback_without_orjson(self):
+        """Test the renderer falls back when orjson is not installed."""
+        payload = sample_payload()
+
+        self.assertEqual(
+            ORJSONRenderer().render(payload),
+            JSONRenderer().render(payload),
+        )
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """Test the orjson parser."""
+
+    def test_matches_json_parser(self):
+        """Test parsed data is the same as DRF's JSONParser."""
+        body = JSONRenderer().render(sample_payload())
+
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(body)),
+            JSONParser().parse(io.BytesIO(body)),
+        )
+
+    def test_invalid_json(self):
+        """Test invalid JSON raises a parse error."""
+        with self.assertRaises(ParseError):
+            ORJSONParser().parse(io.BytesIO(b'{"title": '))
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_other_encodings_use_json_parser(self):
+        """Test non UTF-8 bodies are parsed by the stdlib parser."""
+        body = '{"title": "Bánh mì"}'.encode('latin-1')
+
+        data = ORJSONParser().parse(
+            io.BytesIO(body),
+            parser_context={'encoding': 'latin-1'},
+        )
+
+        self.assertEqual(data, {'title': 'Bánh mì'})
+
+
+@skipIf(msgpack is None, 'msgpack is not installed')
+class MessagePackTests(SimpleTestCase):
+    """Test the MessagePack renderer and parser."""
+
+    def test_round_trip(self):
+        """Test rendered data parses back to the same data."""
+        payload = sample_payload()
+        body = MessagePackRenderer().render(payload)
+
+        self.assertEqual(MessagePackParser().parse(io.BytesIO(body)), payload)
+        self.assertLess(len(body), len(JSONRenderer().render(payload)))
+
+    def test_python_types_match_json(self):
+        """Test Decimal and UUID values are converted like in JSON."""
+        payload = {
+            'price': Decimal('6.99'),
+            'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        }
+        body = MessagePackRenderer().render(payload)
+
+        self.assertEqual(
+            MessagePackParser().parse(io.BytesIO(body)),
+            JSONParser().parse(io.BytesIO(JSONRenderer().render(payload))),
+        )
+
+    def test_invalid_body(self):
+        """Test a truncated body raises a parse error."""
+        body = MessagePackRenderer().render(sample_payload())
+
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(body[:-3]))
+
+
+@skipIf(cbor2 is None, 'cbor2 is not installed')
+class CBORTests(SimpleTestCase):
+    """Test the CBOR renderer and parser."""
+
+    def test_round_trip(self):
+        """Test rendered data parses back to the same data."""
+        payload = sample_payload()
+        body = CBORRenderer().render(payload)
+
+        self.assertEqual(CBORParser().parse(io.BytesIO(body)), payload)
+
+    def test_native_types(self):
+        """Test Decimal and datetime values keep their types."""
+        payload = {
+            'price': Decimal('6.99'),
+            'created': datetime(2023, 8, 8, 12, 30, tzinfo=timezone.utc),
+        }
+        body = CBORRenderer().render(payload)
+
+        self.assertEqual(CBORParser().parse(io.BytesIO(body)), payload)
+
+    def test_invalid_body(self):
+        """Test a truncated body raises a parse error."""
+        body = CBORRenderer().render(sample_payload())
+
+        with self.assertRaises(ParseError):
+            CBORParser().parse(io.BytesIO(body[:-3]))
+
+
+@skipIf(msgpack is None, 'msgpack is not installed')
+class BinaryNegotiationAPITests(TestCase):
+    """Test clients can pick MessagePack with the HTTP headers."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_list_recipes_as_msgpack(self):
+        """Test the Accept header selects MessagePack."""
+        create_recipe(self.user)
+        url = reverse('recipe:recipe-list')
+
+        res = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(res.content), res.data)
+
+    def test_create_recipe_from_msgpack(self):
+        """Test a MessagePack request body is parsed."""
+        payload = {
+            'title': 'Pho',
+            'time_minutes': 30,
+            'price': '5.50',
+            'tags': [{'name': 'Dinner'}],
+        }
+        url = reverse('recipe:recipe-list')
+
+        res = self.client.post(
+            url,
+            msgpack.packb(payload),
+            content_type='application/msgpack',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.title, payload['title'])
+        self.assertEqual(recipe.tags.count(), 1)
+
+    def test_token_accepts_msgpack(self):
+        """Test the token endpoint parses MessagePack bodies."""
+        client = APIClient()
+        payload = {'email': 'test@example.com', 'password': 'testpass123'}
+
+        res = client.post(
+            reverse('user:token'),
+            msgpack.packb(payload),
+            content_type='application/msgpack',
+            HTTP_ACCEPT='application/msgpack',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('token', msgpack.unpackb(res.content))
+
+    def test_schema_advertises_msgpack(self):
+        """Test the OpenAPI schema lists the MessagePack media type."""
+        res = self.client.get(reverse('api-schema'), {'format': 'json'})
+
+        operation = res.json()['paths']['/api/recipe/recipes/']['post']
+        self.assertIn(
+            'application/msgpack',
+            operation['requestBody']['content'],
+        )
+        self.assertIn(
+            'application/msgpack',
+            operation['responses']['201']['content'],
+        )
@@ -0,0 +1,109 @@
+"""
+Tests for the cached OpenAPI schema.
+"""
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import schema
+
+
+SCHEMA_URL = reverse('api-schema')
+
+
+class SchemaTests(TestCase):
+    """Test serving the schema from the cache."""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        settings = override_settings(
+            SCHEMA_CACHE=True,
+            SCHEMA_CACHE_DIR=self.cache_dir,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        schema.clear()
+        self.addCleanup(schema.clear)
+
+    def test_generated_once(self):
+        """Test the schema is only generated on the first request."""
+        with patch('core.schema.generate', wraps=schema.generate) as gen:
+            first = self.client.get(SCHEMA_URL)
+            second = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(gen.call_count, 1)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(
+            first['Content-Type'],
+            'application/vnd.oai.openapi; charset=utf-8',
+        )
+        self.assertIn(b'/api/recipe/recipes/', first.content)
+        # Only build_schema writes files.
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_not_modified(self):
+        """Test a matching If-None-Match gets a 304 without a body."""
+        res = self.client.get(SCHEMA_URL, {'format': 'json'})
+        etag = res['ETag']
+        self.assertEqual(etag, schema.etag(res.content))
+        self.assertIn('no-cache', res['Cache-Control'])
+
+        res = self.client.get(
+            SCHEMA_URL,
+            {'format': 'json'},
+            HTTP_IF_NONE_MATCH=etag,
+        )
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['ETag'], etag)
+
+    def test_formats_have_own_etag(self):
+        """Test the YAML and JSON schemas are cached separately."""
+        yaml = self.client.get(SCHEMA_URL)
+        json = self.client.get(SCHEMA_URL, HTTP_ACCEPT='application/json')
+
+        self.assertEqual(
+            json['Content-Type'],
+            'application/json; charset=utf-8',
+        )
+        self.assertNotEqual(yaml['ETag'], json['ETag'])
+
+    def test_build_schema_command(self):
+        """Test the command writes the files the view serves."""
+        call_command('build_schema', stdout=StringIO())
+
+        for fmt in ('yaml', 'json'):
+            self.assertTrue(os.path.exists(schema.schema_path(fmt)))
+        with open(schema.schema_path('json'), 'wb') as f:
+            f.write(b'{"openapi": "3.0.3"}')
+
+        with patch('core.schema.generate') as gen:
+            res = self.client.get(SCHEMA_URL, {'format': 'json'})
+
+        gen.assert_not_called()
+        self.assertEqual(res.json(), {'openapi': '3.0.3'})
+
+    def test_unknown_lang(self):
+        """Test unknown languages share the default schema."""
+        self.client.get(SCHEMA_URL, {'lang': 'xx'})
+        self.client.get(SCHEMA_URL, {'lang': 'yy'})
+
+        self.assertEqual(list(schema._cache), [('yaml', None)])
+
+    @override_settings(SCHEMA_CACHE=False)
+    def test_cache_off(self):
+        """Test the schema is generated on each request without the cache."""
+        with patch('core.schema.generate', wraps=schema.generate) as gen:
+            self.client.get(SCHEMA_URL)
+            res = self.client.get(SCHEMA_URL)
+
+        self.assertEqual(gen.call_count, 2)
+        self.assertEqual(res['ETag'], schema.etag(res.content))
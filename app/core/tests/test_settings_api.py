@@ -0,0 +1,101 @@
+"""
+Tests for the API-only settings and their benchmark.
+"""
+import json
+import os
+import subprocess
+import sys
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from app import settings_api
+
+
+# Modules the API workers must not load. django.contrib.admin itself and
+# drf_spectacular.utils are still imported, by DRF's rest_framework.schemas
+# and by the schema annotations of the views (see app.settings_api).
+EXCLUDED_MODULES = [
+    'django.contrib.admin.models',
+    'django.contrib.sessions.models',
+    'django.contrib.staticfiles',
+    'core.admin',
+    'drf_spectacular.generators',
+    'drf_spectacular.openapi',
+    'drf_spectacular.views',
+]
+
+# Requests the API-only URLconf, then reports which EXCLUDED_MODULES were
+# loaded.
+SCRIPT = '''
+import json
+import sys
+
+from app.wsgi import application
+from django.conf import settings
+from django.test import Client
+from django.urls import get_resolver
+
+client = Client()
+print(json.dumps({
+    'live': client.get('/api/health-check/live/').status_code,
+    'recipes': client.get('/api/recipe/recipes/').status_code,
+    'admin': client.get('/admin/').status_code,
+    'schema': client.get('/api/schema/').status_code,
+    'middleware': settings.MIDDLEWARE,
+    'modules': [name for name in sys.argv[1:] if name in sys.modules],
+}))
+'''
+
+
+class SettingsApiTests(SimpleTestCase):
+    """Test the settings of the API-only workers."""
+
+    def test_middleware_without_sessions(self):
+        """Test the session and CSRF middleware are left out."""
+        self.assertNotIn(
+            'django.contrib.sessions.middleware.SessionMiddleware',
+            settings_api.MIDDLEWARE,
+        )
+        self.assertNotIn(
+            'django.middleware.csrf.CsrfViewMiddleware',
+            settings_api.MIDDLEWARE,
+        )
+        self.assertLess(len(settings_api.MIDDLEWARE), len(settings.MIDDLEWARE))
+        self.assertNotIn('django.contrib.admin', settings_api.INSTALLED_APPS)
+
+    def test_api_workers(self):
+        """Test the API is served without the admin app and schema."""
+        result = subprocess.run(
+            [sys.executable, '-c', SCRIPT, *EXCLUDED_MODULES],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                'DJANGO_SETTINGS_MODULE': 'app.settings_api',
+                'WARMUP': '0',
+                'DJANGO_ALLOWED_HOSTS': 'testserver',
+            },
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+
+        self.assertEqual(report['live'], 200)
+        self.assertEqual(report['recipes'], 401)
+        self.assertEqual(report['admin'], 404)
+        self.assertEqual(report['schema'], 404)
+        self.assertEqual(report['middleware'], settings_api.MIDDLEWARE)
+        self.assertEqual(report['modules'], [])
+
+    def test_benchmark_settings(self):
+        """Test the benchmark compares both settings modules."""
+        out = StringIO()
+        call_command('benchmark_settings', '--requests', '5', stdout=out)
+
+        output = out.getvalue()
+        self.assertIn('app.settings_api', output)
+        self.assertIn('admin app no', output)
+        self.assertIn('liveness', output)
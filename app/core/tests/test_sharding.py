@@ -0,0 +1,212 @@
+"""
+Tests for sharding the recipe data by user.
+"""
+import io
+import unittest
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db_routers import ShardRouter
+from core.models import Recipe, UserShard
+from core.sharding import (
+    HashRing,
+    get_assignment,
+    shard_for_user,
+    use_shard,
+)
+from recipe.utils.create_object import (
+    create_recipe,
+    create_tag,
+    create_user,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class HashRingTests(SimpleTestCase):
+    """Test the consistent hash ring."""
+
+    def test_keys_spread_over_nodes(self):
+        """Test every node gets a fair share of the keys."""
+        ring = HashRing(['a', 'b', 'c'])
+
+        counts = Counter(ring.get(key) for key in range(3000))
+
+        for node in ['a', 'b', 'c']:
+            self.assertGreater(counts[node], 700)
+
+    def test_adding_node_moves_few_keys(self):
+        """Test adding a node only moves the keys it takes over."""
+        before = HashRing(['a', 'b', 'c'])
+        after = HashRing(['a', 'b', 'c', 'd'])
+
+        moved = [
+            key for key in range(3000) if before.get(key) != after.get(key)
+        ]
+
+        self.assertLess(len(moved), 1100)
+        self.assertTrue(all(after.get(key) == 'd' for key in moved))
+
+
+@override_settings(
+    DATABASE_SHARDS=['default', 'shard_1'],
+    SHARD_ASSIGNMENT_CACHE='default',
+)
+class ShardRouterTests(TestCase):
+    """Test routing queries to the shards."""
+
+    def setUp(self):
+        self.router = ShardRouter()
+        self.user = create_user()
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_current_shard_used(self):
+        """Test sharded models go to the request's shard."""
+        with use_shard('shard_1'):
+            self.assertEqual(self.router.db_for_read(Recipe), 'shard_1')
+            self.assertEqual(self.router.db_for_write(Recipe), 'shard_1')
+            self.assertEqual(
+                self.router.db_for_write(Recipe.tags.through),
+                'shard_1',
+            )
+            self.assertIsNone(self.router.db_for_read(type(self.user)))
+
+    def test_instance_shard_used(self):
+        """Test related queries stay on the instance's shard."""
+        recipe = Recipe(user=self.user)
+        recipe._state.db = 'shard_1'
+
+        self.assertEqual(
+            self.router.db_for_read(Recipe.tags.through, instance=recipe),
+            'shard_1',
+        )
+
+    def test_primary_left_to_next_router(self):
+        """Test the first shard is left to the replica router."""
+        with use_shard('default'):
+            self.assertIsNone(self.router.db_for_read(Recipe))
+
+    def test_assignment_overrides_hash(self):
+        """Test a pinned user goes to the pinned shard."""
+        UserShard.objects.create(user=self.user, shard='shard_1')
+
+        self.assertEqual(shard_for_user(self.user.id), 'shard_1')
+
+    def test_assignment_cached(self):
+        """Test the assignment is only read once."""
+        shard_for_user(self.user.id)
+
+        with CaptureQueriesContext(connection) as queries:
+            shard_for_user(self.user.id)
+
+        self.assertEqual(len(queries), 0)
+
+    def test_single_shard_without_queries(self):
+        """Test nothing is looked up with a single shard."""
+        with override_settings(DATABASE_SHARDS=['default']):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(
+                    get_assignment(self.user.id),
+                    ('default', False),
+                )
+
+        self.assertEqual(len(queries), 0)
+
+
+@override_settings(
+    DATABASE_SHARDS=['default', 'shard_1'],
+    SHARD_ASSIGNMENT_CACHE='default',
+)
+class ShardMoveAPITests(TestCase):
+    """Test the API while a user's data is moving."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        create_recipe(self.user)
+        UserShard.objects.create(user=self.user, shard='default', moving=True)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_reads_allowed(self):
+        """Test the user can read during the move."""
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+    def test_writes_refused(self):
+        """Test writes get a 503 with Retry-After during the move."""
+        payload = {'title': 'Pho', 'time_minutes': 30, 'price': '5.50'}
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '5')
+        self.assertEqual(Recipe.objects.count(), 1)
+
+
+@unittest.skipUnless(
+    len(settings.DATABASE_SHARDS) > 1,
+    'Needs a second shard, see POSTGRES_SHARD_HOSTS.',
+)
+@override_settings(SHARD_ASSIGNMENT_CACHE='default')
+class MoveUserShardTests(TestCase):
+    """Test moving a user to another shard."""
+    databases = '__all__'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.target = settings.DATABASE_SHARDS[1]
+        UserShard.objects.create(user=self.user, shard='default')
+        self.recipe = create_recipe(self.user, title='Pho')
+        self.recipe.tags.add(create_tag(self.user, name='Dinner'))
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_move_user(self):
+        """Test the data is moved and served from the new shard."""
+        call_command(
+            'move_user_shard', self.user.email, self.target, grace=0,
+            stdout=io.StringIO(),
+        )
+
+        self.assertEqual(shard_for_user(self.user.id), self.target)
+        self.assertFalse(Recipe.objects.filter(user=self.user).exists())
+        moved = Recipe.objects.using(self.target).get(id=self.recipe.id)
+        self.assertEqual(moved.tags.get().name, 'Dinner')
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['title'], 'Pho')
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Dinner')
+
+    def test_user_mirror_has_no_credentials(self):
+        """Test the target shard only gets a placeholder user row."""
+        call_command(
+            'move_user_shard', self.user.email, self.target, grace=0,
+            stdout=io.StringIO(),
+        )
+
+        mirror = get_user_model().objects.using(self.target).get(
+            pk=self.user.pk,
+        )
+        self.assertNotEqual(mirror.email, self.user.email)
+        self.assertFalse(mirror.has_usable_password())
+        self.assertFalse(mirror.is_active)
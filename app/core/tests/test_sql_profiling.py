@@ -0,0 +1,121 @@
+"""
+Tests for the SQL profiling middleware.
+"""
+from unittest.mock import patch
+
+from django.test import (
+    AsyncClient,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.sql_profiling import (
+    QueryBudgetExceeded,
+    RequestProfile,
+    normalize_sql,
+)
+from recipe.utils.create_object import create_recipe, create_user
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class NormalizeSQLTests(SimpleTestCase):
+    """Test reducing queries to their shape."""
+
+    def test_in_lists_collapsed(self):
+        """Test IN lists of any length have the same shape."""
+        self.assertEqual(
+            normalize_sql('SELECT * FROM t WHERE id IN (%s, %s, %s)'),
+            normalize_sql('SELECT * FROM t WHERE id IN (%s)'),
+        )
+
+    def test_literals_removed(self):
+        """Test inlined numbers and strings are replaced."""
+        self.assertEqual(
+            normalize_sql("SELECT  *\nFROM t WHERE a = 'x''y' LIMIT 21"),
+            'SELECT * FROM t WHERE a = ? LIMIT ?',
+        )
+
+    @override_settings(SQL_REPEATED_QUERY_THRESHOLD=3)
+    def test_repeated_shapes(self):
+        """Test the same shape run many times is reported."""
+        profile = RequestProfile()
+        for recipe_id in range(3):
+            profile.queries.append((
+                f'SELECT * FROM core_tag WHERE recipe_id = {recipe_id}',
+                0.001,
+            ))
+        profile.queries.append(('SELECT * FROM core_recipe', 0.001))
+
+        self.assertEqual(
+            profile.repeated_shapes(),
+            [('SELECT * FROM core_tag WHERE recipe_id = ?', 3)],
+        )
+
+
+@override_settings(
+    SQL_PROFILING_SAMPLE_RATE=1,
+    SQL_QUERY_BUDGETS={'RecipeViewSet.list': 1},
+)
+class SQLProfilingMiddlewareTests(TestCase):
+    """Test profiling the queries of requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        create_recipe(self.user)
+
+    def test_summary_logged(self):
+        """Test the queries of a sampled request are summed up."""
+        with override_settings(SQL_QUERY_BUDGETS={}), \
+                self.assertLogs('core.sql_profiling', 'INFO') as logs:
+            self.client.get(RECIPES_URL)
+
+        self.assertIn('RecipeViewSet.list ran 3 queries', logs.output[0])
+
+    @override_settings(SQL_SLOW_QUERY_MS=0)
+    def test_slow_query_logged(self):
+        """Test slow queries are logged with their shape and view."""
+        with self.assertLogs('core.sql_profiling', 'WARNING') as logs:
+            self.client.get(RECIPES_URL)
+
+        slow = [line for line in logs.output if 'Slow query' in line]
+        self.assertTrue(slow)
+        self.assertIn('in RecipeViewSet.list: SELECT', slow[0])
+
+    def test_budget_logged(self):
+        """Test going over the budget is logged by default."""
+        with self.assertLogs('core.sql_profiling', 'WARNING') as logs:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('over its budget of 1', logs.output[-1])
+
+    @override_settings(SQL_QUERY_BUDGET_MODE='raise')
+    def test_budget_raised(self):
+        """Test going over the budget is an error in raise mode."""
+        with self.assertRaises(QueryBudgetExceeded), \
+                self.assertLogs('core.sql_profiling', 'INFO'):
+            self.client.get(RECIPES_URL)
+
+    async def test_async_request_profiled(self):
+        """Test requests to the async views are profiled under ASGI."""
+        with self.assertLogs('core.sql_profiling', 'INFO') as logs:
+            await AsyncClient().get(reverse('recipe-async:recipe-list'))
+
+        self.assertIn('_recipes ran 0 queries', logs.output[0])
+
+    @override_settings(SQL_PROFILING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        """Test requests outside the sample are not profiled."""
+        with patch('core.sql_profiling.report') as report:
+            self.client.get(RECIPES_URL)
+
+        report.assert_not_called()
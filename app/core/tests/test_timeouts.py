@@ -0,0 +1,177 @@
+"""
+Tests for the per-view query timeouts.
+"""
+from unittest.mock import patch
+
+from django.db import DataError, OperationalError, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import metrics, timeouts
+from core.models import Recipe
+from recipe.utils.create_object import create_recipe, create_user
+from recipe.views import RecipeViewSet
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+# Only true once pg_sleep() returned, so every row waits.
+SLOW_WHERE = '(SELECT TRUE FROM pg_sleep(0.5))'
+
+
+def slow_queryset(view):
+    """Return recipes that take half a second per row to filter."""
+    return Recipe.objects.filter(user=view.request.user).extra(
+        where=[SLOW_WHERE],
+    )
+
+
+class TimeoutSqlTests(SimpleTestCase):
+    """Test the SQL setting the timeouts."""
+
+    def test_set_sql(self):
+        """Test values are set and None resets to the database's."""
+        self.assertEqual(
+            timeouts._set_sql((5000, None), local=False),
+            'SET statement_timeout TO 5000; SET lock_timeout TO DEFAULT',
+        )
+        self.assertEqual(
+            timeouts._set_sql((0, 100), local=True),
+            'SET LOCAL statement_timeout TO 0; SET LOCAL lock_timeout TO 100',
+        )
+
+
+# A connection of its own, in autocommit like the workers' connections.
+class ApplyTimeoutsTests(SimpleTestCase):
+    """Test applying the timeouts to the queries."""
+
+    def setUp(self):
+        self.wrapper = type(connections['default'])(
+            {**connections['default'].settings_dict, 'CONN_MAX_AGE': 600},
+            alias='test-timeouts',
+        )
+        self.addCleanup(self.wrapper.close)
+
+    def show(self, name):
+        """Return the current value of a setting of the connection."""
+        with self.wrapper.cursor() as cursor:
+            cursor.execute(f'SHOW {name}')
+            return cursor.fetchone()[0]
+
+    def test_timeouts_set_once(self):
+        """Test the session keeps the timeouts until they change."""
+        with timeouts.query_timeouts(1234, 567):
+            self.assertEqual(self.show('statement_timeout'), '1234ms')
+            self.assertEqual(self.show('lock_timeout'), '567ms')
+            self.assertEqual(self.wrapper.query_timeouts, (1234, 567))
+
+            with patch.object(timeouts, '_set_sql') as set_sql:
+                self.show('statement_timeout')
+            set_sql.assert_not_called()
+
+        self.assertEqual(self.show('statement_timeout'), '0')
+        self.assertEqual(self.wrapper.query_timeouts, (None, None))
+
+    def test_timeouts_in_transaction(self):
+        """Test a transaction gets the timeouts and can still roll back."""
+        self.wrapper.set_autocommit(False)
+        self.addCleanup(self.wrapper.set_autocommit, True)
+        self.addCleanup(self.wrapper.rollback)
+
+        with timeouts.query_timeouts(1234):
+            self.assertEqual(self.show('statement_timeout'), '1234ms')
+            self.assertEqual(self.wrapper.query_timeouts, (None, None))
+            with self.assertRaises(DataError):
+                with self.wrapper.cursor() as cursor:
+                    cursor.execute('SELECT 1 / 0')
+
+        # The failed transaction accepts no SET, only its rollback.
+        with timeouts.query_timeouts(100):
+            with self.wrapper.cursor() as cursor:
+                cursor.execute('ROLLBACK')
+
+        self.assertEqual(self.show('statement_timeout'), '0')
+
+    def test_timeouts_set_once_per_transaction(self):
+        """Test SET LOCAL runs once per transaction, not per query."""
+        self.wrapper.set_autocommit(False)
+        self.addCleanup(self.wrapper.set_autocommit, True)
+        self.addCleanup(self.wrapper.rollback)
+
+        with timeouts.query_timeouts(1234), \
+                patch.object(timeouts, '_set_sql',
+                             wraps=timeouts._set_sql) as set_sql:
+            self.assertEqual(self.show('statement_timeout'), '1234ms')
+            self.show('statement_timeout')
+            self.assertEqual(set_sql.call_count, 1)
+
+            # The next transaction starts without them.
+            self.wrapper.commit()
+            self.assertEqual(self.show('statement_timeout'), '1234ms')
+            self.assertEqual(set_sql.call_count, 2)
+
+            # So does the rest of one rolled back to a savepoint.
+            sid = self.wrapper.savepoint()
+            self.wrapper.savepoint_rollback(sid)
+            self.assertEqual(self.show('statement_timeout'), '1234ms')
+            self.assertEqual(set_sql.call_count, 3)
+
+    def test_statement_timeout(self):
+        """Test a slow query is cancelled and its shape is kept."""
+        with timeouts.query_timeouts(50):
+            with self.assertRaises(OperationalError) as cm:
+                with self.wrapper.cursor() as cursor:
+                    cursor.execute('SELECT pg_sleep(%s)', [1])
+
+        self.assertEqual(timeouts.timeout_kind(cm.exception), 'statement')
+        self.assertEqual(cm.exception.query_shape, 'SELECT pg_sleep(%s)')
+
+    def test_other_errors(self):
+        """Test other database errors are not timeouts."""
+        with self.assertRaises(DataError) as cm:
+            with self.wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1 / 0')
+
+        self.assertIsNone(timeouts.timeout_kind(cm.exception))
+        self.assertIsNone(timeouts.as_query_timeout(cm.exception, 'view'))
+
+
+class QueryTimeoutViewTests(TestCase):
+    """Test the API answers slow queries with a 503."""
+
+    def setUp(self):
+        metrics.REGISTRY.clear()
+        self.user = create_user()
+        create_recipe(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(API_STATEMENT_TIMEOUT=50)
+    def test_slow_query_returns_503(self):
+        """Test a cancelled query gives a 503 with a retry hint."""
+        with patch.object(RecipeViewSet, 'get_queryset', slow_queryset), \
+                self.assertLogs('core.timeouts', 'WARNING') as logs:
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '5')
+        self.assertEqual(res.data['detail'].code, 'query_timeout')
+        log = logs.output[0]
+        self.assertIn('statement timeout in RecipeViewSet.list', log)
+        self.assertIn('FROM pg_sleep(?.?)', log)
+        self.assertEqual(
+            metrics.DB_QUERY_TIMEOUTS.values,
+            {('RecipeViewSet.list', 'statement'): 1},
+        )
+
+    def test_view_timeouts(self):
+        """Test views can set their own timeouts."""
+        view = RecipeViewSet()
+        with override_settings(API_STATEMENT_TIMEOUT=5000,
+                               API_LOCK_TIMEOUT=2000):
+            self.assertEqual(view.get_query_timeouts(), (5000, 2000))
+            with patch.object(RecipeViewSet, 'statement_timeout', 0):
+                self.assertEqual(view.get_query_timeouts(), (0, 2000))
@@ -0,0 +1,185 @@
+"""
+Tests for request tracing.
+"""
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+
+from django.test import (
+    AsyncClient,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import tracing
+from recipe.utils.create_object import create_recipe, create_user
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+PARENT = '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'
+
+
+class TraceContextTests(SimpleTestCase):
+    """Test reading the W3C traceparent header."""
+
+    def test_parse_traceparent(self):
+        """Test a valid header is parsed."""
+        self.assertEqual(
+            tracing.parse_traceparent(PARENT),
+            ('0af7651916cd43dd8448eb211c80319c', 'b7ad6b7169203331', True),
+        )
+
+    def test_invalid_traceparent(self):
+        """Test malformed headers are ignored."""
+        for header in [None, '', 'garbage', PARENT[:-3], '00-' + '0' * 32
+                       + '-b7ad6b7169203331-01']:
+            self.assertIsNone(tracing.parse_traceparent(header))
+
+    @override_settings(TRACING_SAMPLE_RATE=1)
+    def test_parent_decides_sampling(self):
+        """Test an unsampled caller turns sampling off."""
+        unsampled = tracing.parse_traceparent(PARENT[:-2] + '00')
+
+        self.assertFalse(tracing.should_sample(unsampled))
+
+    def test_span_outside_trace(self):
+        """Test spans outside a sampled trace record nothing."""
+        with tracing.span('work') as child:
+            self.assertIsNone(child)
+
+    def test_otlp_payload(self):
+        """Test spans are converted to OTLP JSON."""
+        finished = tracing.Span('a' * 32, None, 'GET', {'http.status': 200})
+        finished.end_ns = finished.start_ns + 1000
+
+        payload = tracing.OTLPExporter().payload([finished])
+
+        otlp_span = payload['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+        self.assertEqual(otlp_span['traceId'], 'a' * 32)
+        self.assertEqual(otlp_span['parentSpanId'], '')
+        self.assertEqual(
+            otlp_span['attributes'],
+            [{'key': 'http.status', 'value': {'intValue': '200'}}],
+        )
+
+
+class TracingMiddlewareTests(TestCase):
+    """Test tracing requests end to end."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.trace_file = os.path.join(self.tmp_dir, 'traces.jsonl')
+        settings = override_settings(
+            TRACING_EXPORTER='file',
+            TRACING_FILE=self.trace_file,
+            TRACING_SAMPLE_RATE=1,
+            MEDIA_ROOT=self.tmp_dir,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        tracing.get_processor().drain()
+
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def spans(self):
+        """Export the queued spans and return them by name."""
+        tracing.get_processor().flush()
+        if not os.path.exists(self.trace_file):
+            return {}
+        spans = {}
+        with open(self.trace_file) as f:
+            for line in f:
+                finished = json.loads(line)
+                spans.setdefault(finished['name'], []).append(finished)
+        return spans
+
+    def test_create_recipe_spans(self):
+        """Test creating a recipe records the spans of each layer."""
+        payload = {
+            'title': 'Pho',
+            'time_minutes': 30,
+            'price': '5.50',
+            'tags': [{'name': 'Dinner'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        spans = self.spans()
+        root = spans['POST RecipeViewSet.create'][0]
+        self.assertIsNone(root['parent_span_id'])
+        self.assertEqual(root['attributes']['http.status_code'], 201)
+        for name in [
+            'authenticate',
+            'check_permissions',
+            'RecipeDetailSerializer.is_valid',
+            'RecipeDetailSerializer.save',
+            'RecipeSerializer.get_or_create_tags',
+            'db.query',
+        ]:
+            self.assertIn(name, spans)
+        # Every span belongs to the same trace and its parent was recorded.
+        all_spans = [span for group in spans.values() for span in group]
+        ids = {span['span_id'] for span in all_spans}
+        for span in all_spans:
+            self.assertEqual(span['trace_id'], root['trace_id'])
+            if span is not root:
+                self.assertIn(span['parent_span_id'], ids)
+
+    async def test_async_request_traced(self):
+        """Test requests to the async views are traced under ASGI."""
+        res = await AsyncClient().get(reverse('recipe-async:recipe-list'))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        root = self.spans()['GET _recipes'][0]
+        self.assertEqual(root['attributes']['http.status_code'], 401)
+
+    def test_continue_caller_trace(self):
+        """Test the trace of the caller is continued."""
+        self.client.get(RECIPES_URL, HTTP_TRACEPARENT=PARENT)
+
+        root = self.spans()['GET RecipeViewSet.list'][0]
+        self.assertEqual(root['trace_id'], PARENT[3:35])
+        self.assertEqual(root['parent_span_id'], 'b7ad6b7169203331')
+
+    def test_request_id_used_as_trace_id(self):
+        """Test nginx's request id becomes the trace id."""
+        request_id = 'f' * 32
+        self.client.get(RECIPES_URL, HTTP_X_REQUEST_ID=request_id)
+
+        root = self.spans()['GET RecipeViewSet.list'][0]
+        self.assertEqual(root['trace_id'], request_id)
+
+    def test_unsampled_caller(self):
+        """Test nothing is recorded when the caller didn't sample."""
+        self.client.get(RECIPES_URL, HTTP_TRACEPARENT=PARENT[:-2] + '00')
+
+        self.assertEqual(self.spans(), {})
+
+    def test_upload_image_storage_span(self):
+        """Test writing the image to the media storage is traced."""
+        recipe = create_recipe(self.user)
+        image_file = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+        image_file.name = 'image.jpg'
+        image_file.seek(0)
+
+        res = self.client.post(
+            reverse('recipe:recipe-upload-image', args=[recipe.id]),
+            {'image': image_file},
+            format='multipart',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('storage.save', self.spans())
@@ -0,0 +1,78 @@
+"""
+Tests for the startup warmup and the import time report.
+"""
+import json
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from core import warmup
+from core.management.commands.importtime import digest, parse_importtime
+
+
+IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   django.utils
+import time:       400 |        500 | django
+import time:        50 |         50 |   rest_framework.fields
+import time:       250 |        300 | rest_framework
+"""
+
+
+class WarmupTests(TransactionTestCase):
+    """Test warming up the process."""
+
+    def test_warmup_steps(self):
+        """Test every step runs and the connections are closed."""
+        with self.assertLogs('core.warmup', 'INFO'):
+            timings = warmup.warmup()
+
+        self.assertEqual(
+            [name for name, _, _ in timings],
+            [step.__name__ for step in warmup.STEPS],
+        )
+        counts = {name: count for name, count, _ in timings}
+        self.assertGreater(counts['urls'], 0)
+        self.assertGreater(counts['serializers'], 0)
+        self.assertIsNone(connection.connection)
+
+    def test_failed_step(self):
+        """Test a failing step is logged and the others still run."""
+        def broken():
+            raise RuntimeError('no database')
+
+        with patch.object(warmup, 'STEPS', [broken, warmup.urls]):
+            with self.assertLogs('core.warmup') as logs:
+                timings = warmup.warmup()
+
+        self.assertIn('Warmup step broken failed', logs.output[0])
+        self.assertIsNone(timings[0][1])
+        self.assertGreater(timings[1][1], 0)
+
+
+class ImportTimeTests(SimpleTestCase):
+    """Test the import time report."""
+
+    def test_digest(self):
+        """Test imports are summed per package."""
+        report = digest(parse_importtime(IMPORTTIME))
+
+        self.assertEqual(report['total_ms'], 0.8)
+        self.assertEqual(report['modules'], 4)
+        self.assertEqual(report['packages'][0], {
+            'package': 'django', 'self_ms': 0.5, 'modules': 2,
+        })
+        self.assertEqual(report['slowest'][0]['module'], 'django')
+
+    def test_importtime_command(self):
+        """Test the command reports the imports of the application."""
+        out = StringIO()
+        call_command('importtime', json=True, stdout=out)
+
+        report = json.loads(out.getvalue())
+        packages = [package['package'] for package in report['packages']]
+        self.assertIn('django', packages)
+        self.assertIn('rest_framework', packages)
@@ -0,0 +1,144 @@
+"""
+Per-view query timeouts, turning cancelled queries into 503 responses.
+"""
+import contextlib
+import contextvars
+import logging
+
+from django.db import OperationalError
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from core import metrics
+from core.sql_profiling import normalize_sql
+
+
+logger = logging.getLogger(__name__)
+
+# Postgres error codes of queries cancelled by statement_timeout and
+# lock_timeout.
+TIMEOUT_CODES = {
+    '57014': 'statement',
+    '55P03': 'lock',
+}
+
+# (statement_timeout, lock_timeout) in milliseconds for the queries of the
+# current request. None leaves the database's own setting.
+_timeouts = contextvars.ContextVar(
+    'query_timeouts',
+    default=(None, None),
+)
+
+
+class QueryTimeout(APIException):
+    """Raised when a query of the request ran out of time."""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The server is busy, please retry shortly.'
+    default_code = 'query_timeout'
+    # Sent as the Retry-After header by DRF's exception handler.
+    wait = 5
+
+
+@contextlib.contextmanager
+def query_timeouts(statement_timeout=None, lock_timeout=None):
+    """Apply the timeouts to the queries run in the block."""
+    token = _timeouts.set((statement_timeout, lock_timeout))
+    try:
+        yield
+    finally:
+        _timeouts.reset(token)
+
+
+def _set_sql(timeouts, local):
+    """Return the SQL setting timeouts for the session or transaction."""
+    command = 'SET LOCAL' if local else 'SET'
+    return '; '.join(
+        f'{command} {name} TO {"DEFAULT" if value is None else int(value)}'
+        for name, value in zip(('statement_timeout', 'lock_timeout'), timeouts)
+    )
+
+
+# Setting the timeouts costs a round trip, so it is only done when they
+# differ from the ones the connection already has, which the connection may
+# keep from its previous request (see CONN_MAX_AGE). In a transaction they
+# are set with SET LOCAL, because a rollback would undo a plain SET without
+# us knowing. The backend forgets them when the transaction ends (see
+# core.backends.postgresql), so they are set once per transaction.
+def _current_timeouts(connection):
+    """Return the timeouts the next query of connection would run with."""
+    if connection.get_autocommit() or connection.transaction_timeouts is None:
+        return connection.query_timeouts
+    return connection.transaction_timeouts
+
+
+def apply_timeouts(execute, sql, params, many, context):
+    """Database execute wrapper applying the request's timeouts."""
+    connection = context['connection']
+    wanted = _timeouts.get()
+    if wanted != _current_timeouts(connection):
+        local = not connection.get_autocommit()
+        # On a cursor of the driver, so the other wrappers don't see it, and
+        # not on the query's own, which may be a server side cursor.
+        with connection.wrap_database_errors:
+            try:
+                with connection.connection.cursor() as cursor:
+                    cursor.execute(_set_sql(wanted, local))
+            except connection.Database.InternalError:
+                # A failed transaction only accepts being rolled back, which
+                # is what the query does then, so it must still run.
+                if not local:
+                    raise
+            else:
+                if local:
+                    connection.transaction_timeouts = wanted
+                else:
+                    connection.query_timeouts = wanted
+
+    try:
+        return execute(sql, params, many, context)
+    except OperationalError as exc:
+        # Kept for the log line, which is written where the view is known.
+        exc.query_shape = normalize_sql(sql)
+        raise
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """Add the timeouts wrapper to a new database connection."""
+    # A new connection has the database's settings.
+    connection.query_timeouts = (None, None)
+    connection.transaction_timeouts = None
+    if apply_timeouts not in connection.execute_wrappers:
+        connection.execute_wrappers.append(apply_timeouts)
+
+
+def timeout_kind(exc):
+    """Return 'statement' or 'lock' if exc is a cancelled query, else None."""
+    if not isinstance(exc, OperationalError):
+        return None
+    return TIMEOUT_CODES.get(getattr(exc.__cause__, 'pgcode', None))
+
+
+def as_query_timeout(exc, view):
+    """Log and count a cancelled query, returning the QueryTimeout for it."""
+    kind = timeout_kind(exc)
+    if kind is None:
+        return None
+
+    shape = getattr(exc, 'query_shape', 'unknown')
+    logger.warning('%s timeout in %s: %s', kind, view, shape)
+    metrics.record_query_timeout(view, kind)
+    return QueryTimeout()
+
+
+def _view_label(view):
+    """Return the metrics label of a DRF view instance."""
+    name = type(view).__name__
+    action = getattr(view, 'action', None)
+    return f'{name}.{action}' if action else name
+
+
+def exception_handler(exc, context):
+    """DRF exception handler answering cancelled queries with a 503."""
+    timeout = as_query_timeout(exc, _view_label(context['view']))
+    return drf_exception_handler(timeout or exc, context)
@@ -0,0 +1,309 @@
+"""
+Lightweight request tracing with W3C trace context.
+"""
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+import urllib.request
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+# The innermost open span. None outside sampled requests, so span() costs a
+# context variable lookup when tracing is off.
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+# version-trace_id-parent_id-flags, see https://www.w3.org/TR/trace-context/
+TRACEPARENT = re.compile(
+    r'^00-(?P<trace_id>[0-9a-f]{32})-(?P<parent_id>[0-9a-f]{16})'
+    r'-(?P<flags>[0-9a-f]{2})$'
+)
+REQUEST_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _random_id(size):
+    return '%0*x' % (size * 2, random.getrandbits(size * 8))
+
+
+class Span:
+    """A timed operation within a trace."""
+    __slots__ = (
+        'trace_id', 'span_id', 'parent_id', 'name', 'attributes',
+        'start_ns', 'end_ns', 'error',
+    )
+
+    def __init__(self, trace_id, parent_id, name, attributes):
+        self.trace_id = trace_id
+        self.span_id = _random_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def to_dict(self):
+        """Return the span as a JSON friendly dict."""
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'name': self.name,
+            'start_time_unix_nano': self.start_ns,
+            'end_time_unix_nano': self.end_ns,
+            'attributes': self.attributes,
+            'error': self.error,
+        }
+
+
+def parse_traceparent(header):
+    """Return (trace_id, parent_id, sampled) or None if header is invalid."""
+    match = TRACEPARENT.match(header.strip().lower()) if header else None
+    if match is None or match['trace_id'] == '0' * 32:
+        return None
+
+    return (
+        match['trace_id'],
+        match['parent_id'],
+        bool(int(match['flags'], 16) & 1),
+    )
+
+
+def should_sample(parent):
+    """Decide whether to record a trace, following the caller's choice."""
+    if parent is not None:
+        return parent[2]
+    return random.random() < settings.TRACING_SAMPLE_RATE
+
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Record the block as a child span of the current one, if sampled."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+
+    child = Span(parent.trace_id, parent.span_id, name, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.error = type(exc).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end_ns = time.time_ns()
+        export(child)
+
+
+@contextlib.contextmanager
+def trace(name, traceparent=None, request_id=None, **attributes):
+    """Start a trace, continuing the caller's one if there is a header."""
+    parent = parse_traceparent(traceparent)
+    if not should_sample(parent):
+        yield None
+        return
+
+    if parent is not None:
+        trace_id, parent_id = parent[0], parent[1]
+    else:
+        # nginx's $request_id has the shape of a trace id, so the trace can
+        # be found from the access log.
+        valid = request_id and REQUEST_ID.match(request_id)
+        trace_id = request_id if valid else _random_id(16)
+        parent_id = None
+
+    root = Span(trace_id, parent_id, name, attributes)
+    token = _current_span.set(root)
+    try:
+        yield root
+    finally:
+        _current_span.reset(token)
+        root.end_ns = time.time_ns()
+        export(root)
+
+
+def current_traceparent():
+    """Return the traceparent header for calls made from the current span."""
+    current = _current_span.get()
+    if current is None:
+        return None
+    return f'00-{current.trace_id}-{current.span_id}-01'
+
+
+def trace_query(execute, sql, params, many, context):
+    """Database execute wrapper recording each statement as a span."""
+    if _current_span.get() is None:
+        return execute(sql, params, many, context)
+
+    # Parameters are sent separately, so the statement holds no user data.
+    with span(
+        'db.query',
+        **{
+            'db.system': 'postgresql',
+            'db.name': context['connection'].alias,
+            'db.statement': sql,
+        },
+    ):
+        return execute(sql, params, many, context)
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """Add the tracing wrapper to a new database connection."""
+    if trace_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(trace_query)
+
+
+class FileExporter:
+    """Append spans to a file, one JSON object per line."""
+
+    def export(self, spans):
+        with open(settings.TRACING_FILE, 'a') as f:
+            for finished in spans:
+                f.write(json.dumps(finished.to_dict()) + '\n')
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OTLPExporter:
+    """Send spans to an OpenTelemetry collector with OTLP/HTTP JSON."""
+
+    def payload(self, spans):
+        """Return the OTLP request body for spans."""
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [{
+                    'key': 'service.name',
+                    'value': {'stringValue': settings.TRACING_SERVICE_NAME},
+                }]},
+                'scopeSpans': [{
+                    'scope': {'name': __name__},
+                    'spans': [
+                        {
+                            'traceId': finished.trace_id,
+                            'spanId': finished.span_id,
+                            'parentSpanId': finished.parent_id or '',
+                            'name': finished.name,
+                            'kind': 2 if finished.parent_id is None else 1,
+                            'startTimeUnixNano': str(finished.start_ns),
+                            'endTimeUnixNano': str(finished.end_ns),
+                            'attributes': [
+                                {'key': key, 'value': _otlp_value(value)}
+                                for key, value in finished.attributes.items()
+                            ],
+                            'status': (
+                                {'code': 2, 'message': finished.error}
+                                if finished.error else {}
+                            ),
+                        }
+                        for finished in spans
+                    ],
+                }],
+            }],
+        }
+
+    def export(self, spans):
+        request = urllib.request.Request(
+            settings.TRACING_OTLP_ENDPOINT,
+            data=json.dumps(self.payload(spans)).encode(),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=5):
+            pass
+
+
+EXPORTERS = {
+    'file': FileExporter,
+    'otlp': OTLPExporter,
+}
+
+
+# Spans are handed to a background thread that exports them in batches, so
+# requests never wait on the disk or the collector.
+class BatchProcessor:
+    """Queue finished spans and export them from a background thread."""
+
+    def __init__(self, exporter, max_batch=512, interval=1.0):
+        self.exporter = exporter
+        self.max_batch = max_batch
+        self.interval = interval
+        self.queue = queue.Queue(maxsize=10000)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_thread(self):
+        # Threads don't survive the fork of the uWSGI workers, so each
+        # process starts its own.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                threading.Thread(target=self._run, daemon=True).start()
+                self._pid = os.getpid()
+
+    def add(self, finished):
+        """Queue a finished span, dropping it if the queue is full."""
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait(finished)
+        except queue.Full:
+            pass
+
+    def drain(self):
+        """Return up to max_batch queued spans."""
+        batch = []
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Export everything queued so far."""
+        batch = self.drain()
+        while batch:
+            try:
+                self.exporter.export(batch)
+            except Exception:
+                logger.warning('Could not export %d spans', len(batch))
+            batch = self.drain()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+_processor = None
+
+
+def get_processor():
+    """Return the span processor for TRACING_EXPORTER."""
+    global _processor
+    if _processor is None:
+        _processor = BatchProcessor(EXPORTERS[settings.TRACING_EXPORTER]())
+    return _processor
+
+
+def export(finished):
+    """Hand a finished span to the exporter."""
+    get_processor().add(finished)
@@ -1,11 +1,127 @@
 """
 Core views for app.
 """
-from rest_framework.decorators import api_view
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import (
+    OpenApiParameter,
+    extend_schema,
+    inline_serializer,
+)
+from rest_framework import authentication, permissions, serializers, status
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
 from rest_framework.response import Response
 
+from core import memory as app_memory
+from core import metrics as app_metrics
+from core.health import deep_check
+
+
+# The health views answer with plain dicts, so their schema is described
+# here for drf_spectacular, which can't guess it from a serializer.
+HEALTH_RESPONSE = inline_serializer(
+    name='Health',
+    fields={
+        'healthy': serializers.BooleanField(),
+        # Only in the answers that probed the dependencies.
+        'checks': serializers.DictField(
+            child=serializers.DictField(),
+            required=False,
+        ),
+    },
+)
+
+
+def _readiness_response():
+    """Probe the dependencies, answering 503 if any is broken."""
+    report = deep_check()
+    return Response(
+        report,
+        status=(
+            status.HTTP_200_OK if report['healthy']
+            else status.HTTP_503_SERVICE_UNAVAILABLE
+        ),
+    )
 
+
+@extend_schema(
+    parameters=[
+        OpenApiParameter(
+            name='deep',
+            type=OpenApiTypes.INT,
+            enum=[0, 1],
+            description='Also probe the database, cache and media storage.',
+        ),
+    ],
+    responses={200: HEALTH_RESPONSE, 503: HEALTH_RESPONSE},
+)
 @api_view(['GET'])
 def health_check(request):
     """Returns successful response."""
+    if request.query_params.get('deep') == '1':
+        return _readiness_response()
+
+    return Response({'healthy': True})
+
+
+# Liveness only says the process is up and serving, so the orchestrator
+# restarts it if not. It must not depend on the database: a database outage
+# would get every container restarted without fixing anything.
+@extend_schema(responses=HEALTH_RESPONSE)
+@api_view(['GET'])
+def liveness(request):
+    """Returns successful response while the process can serve requests."""
     return Response({'healthy': True})
+
+
+# Readiness says whether this node can serve traffic right now, so the load
+# balancer stops routing to it while a dependency is broken.
+@extend_schema(responses={200: HEALTH_RESPONSE, 503: HEALTH_RESPONSE})
+@api_view(['GET'])
+def readiness(request):
+    """Returns the dependency probes, with 503 if any of them failed."""
+    return _readiness_response()
+
+
+# A plain Django view: Prometheus scrapes text, so there is no need for
+# DRF's content negotiation or authentication.
+def metrics(request):
+    """Returns the metrics of every worker in the Prometheus format."""
+    if settings.METRICS_TOKEN:
+        given = request.META.get('HTTP_AUTHORIZATION', '')
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not hmac.compare_digest(given.encode(), expected.encode()):
+            return HttpResponse(
+                status=status.HTTP_401_UNAUTHORIZED,
+                headers={'WWW-Authenticate': 'Bearer'},
+            )
+
+    # Write this worker's latest numbers, the others write theirs at most
+    # METRICS_INTERVAL seconds apart.
+    app_metrics.REGISTRY.write(force=True)
+    return HttpResponse(
+        app_metrics.render(app_metrics.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
+
+
+# Each worker answers with its own numbers, so ask a few times (or per
+# worker) to see them all. POST takes a tracemalloc snapshot right away,
+# which also starts tracing in that worker.
+@extend_schema(request=None, responses=OpenApiTypes.OBJECT)
+@api_view(['GET', 'POST'])
+@authentication_classes([authentication.TokenAuthentication])
+@permission_classes([permissions.IsAdminUser])
+def memory(request):
+    """Returns the memory diagnostics of the worker serving the request."""
+    if request.method == 'POST':
+        app_memory.STATS.take_snapshot()
+
+    return Response(app_memory.STATS.report())
@@ -0,0 +1,136 @@
+"""
+Warm up a process before it serves requests.
+"""
+import importlib
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+from django.utils import translation
+
+
+logger = logging.getLogger(__name__)
+
+# Apps whose serializers are warmed up.
+SERIALIZER_MODULES = ['user.serializers', 'recipe.serializers']
+
+
+def _compile_patterns(resolver):
+    """Compile the regex of every URL pattern below resolver."""
+    count = 0
+    for pattern in resolver.url_patterns:
+        # The regexes are compiled on first access.
+        pattern.pattern.regex
+        count += 1
+        if isinstance(pattern, URLResolver):
+            count += _compile_patterns(pattern)
+    return count
+
+
+def urls():
+    """Populate the URL resolver and compile its patterns."""
+    resolver = get_resolver()
+    # Otherwise populated by the first reverse() or resolve().
+    resolver.reverse_dict
+    return _compile_patterns(resolver)
+
+
+def _serializer_fields(serializer, seen):
+    """Build the fields of serializer and of its nested serializers."""
+    from rest_framework.serializers import BaseSerializer, ListSerializer
+
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    if type(serializer) in seen:
+        return
+    seen.add(type(serializer))
+    for field in serializer.fields.values():
+        if isinstance(field, BaseSerializer):
+            _serializer_fields(field, seen)
+
+
+def serializers():
+    """Instantiate the app serializers and build their fields."""
+    from rest_framework.serializers import BaseSerializer
+
+    seen = set()
+    for name in SERIALIZER_MODULES:
+        module = importlib.import_module(name)
+        for value in vars(module).values():
+            if (isinstance(value, type) and issubclass(value, BaseSerializer)
+                    and value.__module__ == name):
+                # Field validators compile their regexes on first use, and
+                # the models' _meta caches their field lookups.
+                _serializer_fields(value(), seen)
+    return len(seen)
+
+
+def database():
+    """Connect to every database once, then close the connections."""
+    from django.apps import apps
+    from django.contrib.contenttypes.models import ContentType
+
+    for alias in settings.DATABASES:
+        connections[alias].ensure_connection()
+    # Filled once per process, then used by the admin and permissions.
+    ContentType.objects.get_for_models(*apps.get_models())
+    # A connection must never be shared by forked workers, so each one
+    # opens its own on its first query.
+    connections.close_all()
+    return len(settings.DATABASES)
+
+
+def images():
+    """Load the Pillow image plugins, otherwise loaded on the first upload."""
+    from PIL import Image
+    Image.init()
+    return len(Image.ID)
+
+
+def translations():
+    """Load the translation catalogs of the default language."""
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.gettext('')
+    translation.deactivate()
+    return 1
+
+
+def schema():
+    """Load the cached OpenAPI schemas (see core.schema)."""
+    if not settings.SCHEMA_CACHE:
+        return 0
+    from core import schema as app_schema
+
+    for fmt in app_schema.RENDERERS:
+        app_schema.get_schema(fmt)
+    return len(app_schema.RENDERERS)
+
+
+STEPS = [urls, serializers, images, translations, schema, database]
+
+
+def warmup():
+    """Run every warmup step, return [(step, count, seconds)]."""
+    timings = []
+    for step in STEPS:
+        start = time.perf_counter()
+        # A failed step only means that work happens on a first request
+        # instead, so it must not stop the server from starting.
+        try:
+            count = step()
+        except Exception:
+            logger.warning('Warmup step %s failed', step.__name__,
+                           exc_info=True)
+            count = None
+        timings.append((step.__name__, count, time.perf_counter() - start))
+
+    logger.info(
+        'Warmed up in %.0fms (%s)',
+        sum(seconds for _, _, seconds in timings) * 1000,
+        ', '.join(
+            f'{name} {seconds * 1000:.0f}ms' for name, _, seconds in timings
+        ),
+    )
+    return timings
@@ -0,0 +1,218 @@
+"""
+Async views for reading recipes, tags and ingredients under ASGI.
+"""
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections
+from django.http import HttpResponse
+
+from rest_framework import status
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import APIException, NotFound, ParseError
+
+from core.db_routers import is_sticky, use_replicas
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from core.renderers import ORJSONRenderer
+from core.sharding import get_assignment, mirror_user, use_shard
+from core.timeouts import as_query_timeout, query_timeouts
+from recipe import serializers
+from recipe.utils.fast_serializer import serialize_recipes
+
+
+# Django 3.2 has no async ORM, and its ASGI handler runs every sync view on a
+# single thread. So these views are written as coroutines, and only the
+# blocking part (authentication and the queries) runs on a thread pool. The
+# event loop keeps accepting requests while queries wait on Postgres, and
+# ASYNC_DB_THREADS caps how many run at once, which is also the number of
+# database connections each ASGI worker opens.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_DB_THREADS,
+    thread_name_prefix='async-db',
+)
+
+_renderer = ORJSONRenderer()
+
+
+def _in_thread(func, *args):
+    """Run func on the database thread pool, then release its connection."""
+    try:
+        return func(*args)
+    finally:
+        # Same as the request_finished signal does for sync views.
+        close_old_connections()
+
+
+async def run_sync(func, *args):
+    """Await func(*args) run on the database thread pool."""
+    loop = asyncio.get_running_loop()
+    # Copy the context, so use_shard() and use_replicas() reach the thread.
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _executor,
+        functools.partial(context.run, _in_thread, func, *args),
+    )
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    """Return data rendered like the JSON responses of the sync API."""
+    response = HttpResponse(
+        _renderer.render(data),
+        status=status_code,
+        content_type='application/json',
+    )
+    if status_code == status.HTTP_401_UNAUTHORIZED:
+        response['WWW-Authenticate'] = 'Token'
+
+    return response
+
+
+def _read(request, loader, kwargs):
+    """Run _load() with the timeouts of the API views."""
+    timeouts = query_timeouts(
+        settings.API_STATEMENT_TIMEOUT,
+        settings.API_LOCK_TIMEOUT,
+    )
+    try:
+        with timeouts:
+            return _load(request, loader, kwargs)
+    except OperationalError as exc:
+        timeout = as_query_timeout(exc, loader.__name__)
+        if timeout is None:
+            raise
+        raise timeout
+
+
+def _load(request, loader, kwargs):
+    """Authenticate the request, then run loader on the user's shard."""
+    user_auth = TokenAuthentication().authenticate(request)
+    if user_auth is None:
+        return status.HTTP_401_UNAUTHORIZED, {
+            'detail': 'Authentication credentials were not provided.',
+        }
+    user = user_auth[0]
+
+    # The assignment and the stickiness mark are read from the 'shared'
+    # cache, which the uWSGI workers write to: in production the asgi
+    # container mounts its directory too (see CACHES in settings), so the
+    # moves and the writes made through the other servers are seen here.
+    shard, _ = get_assignment(user.pk)
+    mirror_user(user, shard)
+    with use_shard(shard), use_replicas(not is_sticky(user.pk)):
+        return status.HTTP_200_OK, loader(request, user, **kwargs)
+
+
+def async_read_view(loader):
+    """Turn loader(request, user, **kwargs) into an async GET view."""
+    @functools.wraps(loader)
+    async def view(request, **kwargs):
+        if request.method != 'GET':
+            response = json_response(
+                {'detail': f'Method "{request.method}" not allowed.'},
+                status.HTTP_405_METHOD_NOT_ALLOWED,
+            )
+            response['Allow'] = 'GET'
+            return response
+
+        try:
+            status_code, data = await run_sync(_read, request, loader, kwargs)
+        except APIException as exc:
+            response = json_response(
+                {'detail': str(exc.detail)},
+                exc.status_code,
+            )
+            # Same as DRF's exception handler.
+            if getattr(exc, 'wait', None):
+                response['Retry-After'] = '%d' % exc.wait
+            return response
+
+        return json_response(data, status_code)
+
+    return view
+
+
+def _params_to_ints(value):
+    """Convert a comma separated string to integers."""
+    str_ids = value.split(',')
+    if len(str_ids) > settings.RECIPE_FILTER_MAX_IDS:
+        raise ParseError(
+            f'At most {settings.RECIPE_FILTER_MAX_IDS} ids can be given.'
+        )
+    try:
+        return [int(str_id) for str_id in str_ids]
+    except ValueError:
+        raise ParseError('Ids must be comma separated integers.')
+
+
+def _recipes(request, user):
+    """Return the user's recipes, filtered like RecipeViewSet.list."""
+    queryset = Recipe.objects.filter(user=user)
+    tags = request.GET.get('tags')
+    ingredients = request.GET.get('ingredients')
+
+    if tags:
+        queryset = queryset.filter(tags__id__in=_params_to_ints(tags))
+    if ingredients:
+        queryset = queryset.filter(
+            ingredients__id__in=_params_to_ints(ingredients),
+        )
+
+    return serialize_recipes(queryset.order_by('-id').distinct())
+
+
+def _recipe(request, user, pk):
+    """Return one of the user's recipes with its details."""
+    recipe = Recipe.objects.filter(user=user, pk=pk).prefetch_related(
+        'tags',
+        'ingredients',
+    ).first()
+    if recipe is None:
+        raise NotFound()
+
+    return serializers.RecipeDetailSerializer(
+        recipe,
+        context={'request': request},
+    ).data
+
+
+def _attrs(model, serializer_class):
+    """Return loaders listing and retrieving the user's tags/ingredients."""
+    def list_loader(request, user):
+        queryset = model.objects.filter(user=user)
+        if int(request.GET.get('assigned_only', 0)):
+            queryset = queryset.filter(recipe__isnull=False)
+
+        return serializer_class(
+            queryset.order_by('-name').distinct(),
+            many=True,
+        ).data
+
+    def detail_loader(request, user, pk):
+        instance = model.objects.filter(user=user, pk=pk).first()
+        if instance is None:
+            raise NotFound()
+
+        return serializer_class(instance).data
+
+    return list_loader, detail_loader
+
+
+_tags, _tag = _attrs(Tag, serializers.TagSerializer)
+_ingredients, _ingredient = _attrs(
+    Ingredient,
+    serializers.IngredientSerializer,
+)
+
+recipe_list = async_read_view(_recipes)
+recipe_detail = async_read_view(_recipe)
+tag_list = async_read_view(_tags)
+tag_detail = async_read_view(_tag)
+ingredient_list = async_read_view(_ingredients)
+ingredient_detail = async_read_view(_ingredient)
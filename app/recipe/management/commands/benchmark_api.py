@@ -0,0 +1,237 @@
+"""
+Django command to benchmark the recipe API hot paths in process.
+"""
+import contextlib
+import json
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.benchmark import Rollback, compare, measure
+from core.models import Recipe
+from recipe.utils.seed import TAGS, BulkWriter, Seeder
+
+
+PASSWORD = 'benchpass123'
+
+
+def count_queries(func):
+    """Return the number of queries func runs, on every database."""
+    with contextlib.ExitStack() as stack:
+        contexts = [
+            stack.enter_context(CaptureQueriesContext(connections[alias]))
+            for alias in settings.DATABASES
+        ]
+        func()
+    return sum(len(context) for context in contexts)
+
+
+def git_revision():
+    """Return the current commit, if the code is in a git checkout."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cases(client, user):
+    """Return [(name, func)] of the requests to time for user."""
+    recipes_url = reverse('recipe:recipe-list')
+    recipe = Recipe.objects.filter(user=user).order_by('-id').first()
+    detail_url = reverse('recipe:recipe-detail', args=[recipe.id])
+    tag_ids = ','.join(
+        str(tag_id) for tag_id in
+        user.tag_set.order_by('id').values_list('id', flat=True)[:2]
+    )
+    ingredient_ids = ','.join(
+        str(ingredient_id) for ingredient_id in
+        user.ingredient_set.order_by('id').values_list('id', flat=True)[:3]
+    )
+    token_client = APIClient()
+
+    def request(method, url, expected, **kwargs):
+        def func():
+            res = getattr(client, method)(url, **kwargs)
+            if res.status_code != expected:
+                raise CommandError(
+                    f'{method.upper()} {url} returned {res.status_code}.'
+                )
+        return func
+
+    def login():
+        res = token_client.post(
+            reverse('user:token'),
+            {'email': user.email, 'password': PASSWORD},
+        )
+        if res.status_code != 200:
+            raise CommandError(f'Login returned {res.status_code}.')
+
+    return [
+        ('recipe list', request('get', recipes_url, 200)),
+        (
+            'recipe list ?tags',
+            request('get', recipes_url, 200, data={'tags': tag_ids}),
+        ),
+        (
+            'recipe list ?tags&ingredients',
+            request('get', recipes_url, 200, data={
+                'tags': tag_ids,
+                'ingredients': ingredient_ids,
+            }),
+        ),
+        ('recipe detail', request('get', detail_url, 200)),
+        (
+            'recipe create (20 tags)',
+            request('post', recipes_url, 201, format='json', data={
+                'title': 'Benchmark recipe',
+                'time_minutes': 20,
+                'price': '9.50',
+                'tags': [{'name': name} for name in TAGS[:20]],
+                'ingredients': [{'name': 'Salt'}, {'name': 'Pepper'}],
+            }),
+        ),
+        (
+            'recipe update',
+            request('patch', detail_url, 200, format='json', data={
+                'title': 'Updated recipe',
+                'tags': [{'name': name} for name in TAGS[:5]],
+            }),
+        ),
+        (
+            'tag list ?assigned_only',
+            request(
+                'get',
+                reverse('recipe:tag-list'),
+                200,
+                data={'assigned_only': 1},
+            ),
+        ),
+        ('token login', login),
+    ]
+
+
+class Command(BaseCommand):
+    """Time the recipe API against seeded datasets of several sizes."""
+    help = (
+        'Seed a user with each of --sizes recipes inside a transaction that '
+        'is rolled back, then time the hot API paths through the full '
+        'middleware stack. Save the results with --output and compare a '
+        'run with a saved one with --baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[100, 1000],
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Save the results as JSON.')
+        parser.add_argument('--baseline', help='JSON results to compare to.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Slowdown of p50 counted as a regression (0.1 is 10%%).',
+        )
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        results = {}
+        # The test client talks to the 'testserver' host.
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for size in options['sizes']:
+                try:
+                    with transaction.atomic():
+                        results.update(self._run(size, options))
+                        raise Rollback
+                except Rollback:
+                    pass
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                    'revision': git_revision(),
+                    'repeat': options['repeat'],
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(f'Results saved to {options["output"]}.')
+
+        if options['baseline']:
+            self._compare(results, options)
+
+    def _seed(self, size, options):
+        """Return a user owning size generated recipes."""
+        seeder = Seeder(
+            BulkWriter('default', 10000),
+            options['seed'],
+            make_password(PASSWORD),
+            f'benchmark{size}',
+        )
+        for chunk in seeder.plan(1, size):
+            seeder.seed_chunk(*chunk)
+        return get_user_model().objects.get(
+            email=f'benchmark{size}-0@example.com',
+        )
+
+    def _run(self, size, options):
+        user = self._seed(size, options)
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        self.stdout.write(f'{size} recipes:')
+        results = {}
+        for name, func in cases(client, user):
+            stats = measure(
+                func,
+                repeat=options['repeat'],
+                warmup=options['warmup'],
+            )
+            # Counted on a separate call, so capturing the SQL doesn't
+            # slow down the timed ones.
+            stats['queries'] = count_queries(func)
+            results[f'{size}/{name}'] = stats
+            self.stdout.write(
+                f'  {name:<30} p50 {stats["p50"]:8.2f}ms  '
+                f'p95 {stats["p95"]:8.2f}ms  p99 {stats["p99"]:8.2f}ms  '
+                f'{stats["queries"]:3d} queries'
+            )
+
+        return results
+
+    def _compare(self, results, options):
+        with open(options['baseline']) as f:
+            baseline = json.load(f)['results']
+
+        self.stdout.write(f'Compared with {options["baseline"]}:')
+        regressions = 0
+        for key, base, now, regressed in compare(
+            baseline, results, options['threshold'],
+        ):
+            change = (now['p50'] / base['p50'] - 1) * 100
+            line = (
+                f'  {key:<36} p50 {base["p50"]:8.2f} -> {now["p50"]:8.2f}ms '
+                f'({change:+6.1f}%)  queries {base["queries"]} -> '
+                f'{now["queries"]}'
+            )
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f'{regressions} regressions.')
@@ -0,0 +1,133 @@
+"""
+Django command to load test the sync and async recipe list side by side.
+"""
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from core.benchmark import percentile
+
+
+def rss_kb(pids):
+    """Return the summed resident memory of pids in KiB."""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except FileNotFoundError:
+            pass
+
+    return total
+
+
+class MemorySampler(threading.Thread):
+    """Record the peak memory of the server processes during a run."""
+
+    def __init__(self, pids, interval=0.05):
+        super().__init__(daemon=True)
+        self.pids = pids
+        self.interval = interval
+        self.peak = rss_kb(pids)
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, rss_kb(self.pids))
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+def load(url, token, concurrency, requests):
+    """Send requests GETs with concurrency in flight, return the stats."""
+    def fetch(_):
+        request = urllib.request.Request(
+            url,
+            headers={'Authorization': f'Token {token}'},
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                response.read()
+                ok = response.status == 200
+        except OSError:
+            ok = False
+        return ok, (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [latency for ok, latency in results if ok]
+    return {
+        'rps': len(latencies) / elapsed,
+        'errors': len(results) - len(latencies),
+        'p50': percentile(latencies, 50) if latencies else float('nan'),
+        'p99': percentile(latencies, 99) if latencies else float('nan'),
+    }
+
+
+class Command(BaseCommand):
+    """Compare throughput and memory of the uWSGI and ASGI servers."""
+    help = (
+        'Load test the sync recipe list (uWSGI) and the async one (ASGI) at '
+        'increasing concurrency. Pass the server PIDs (e.g. $(pgrep uwsgi)) '
+        'to also report the memory used per in-flight request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('token', help='API token of the test user.')
+        parser.add_argument(
+            '--sync-url',
+            default='http://localhost:8000/api/recipe/recipes/',
+        )
+        parser.add_argument(
+            '--async-url',
+            default='http://localhost:8000/api/async/recipe/recipes/',
+        )
+        parser.add_argument('--sync-pids', nargs='*', type=int, default=[])
+        parser.add_argument('--async-pids', nargs='*', type=int, default=[])
+        parser.add_argument(
+            '--concurrency', nargs='+', type=int, default=[1, 10, 50, 100],
+        )
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        servers = [
+            ('uwsgi', options['sync_url'], options['sync_pids']),
+            ('asgi', options['async_url'], options['async_pids']),
+        ]
+
+        for concurrency in options['concurrency']:
+            for name, url, pids in servers:
+                # Let every worker import and cache what it needs first, so
+                # only the memory of the requests in flight is counted.
+                load(url, options['token'], concurrency, concurrency * 2)
+                idle = rss_kb(pids)
+                sampler = MemorySampler(pids)
+                sampler.start()
+                stats = load(
+                    url,
+                    options['token'],
+                    concurrency,
+                    options['requests'],
+                )
+                sampler.stop()
+
+                # Extra memory over idle, spread over the requests in flight.
+                per_request = (sampler.peak - idle) / concurrency
+                self.stdout.write(
+                    f'{name:<6} c={concurrency:<4} '
+                    f'{stats["rps"]:8.1f} req/s  p50 {stats["p50"]:8.2f}ms  '
+                    f'p99 {stats["p99"]:8.2f}ms  errors {stats["errors"]:<4} '
+                    f'rss {sampler.peak / 1024:7.1f}MiB  '
+                    f'{per_request:7.1f}KiB/in-flight'
+                )
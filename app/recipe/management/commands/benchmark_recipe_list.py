@@ -0,0 +1,120 @@
+"""
+Django command to compare the recipe list backends.
+"""
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmark import (
+    Rollback,
+    format_stats,
+    measure,
+)
+from core.models import (
+    Recipe,
+    Tag,
+    Ingredient,
+)
+from recipe.serializers import RecipeSerializer
+from recipe.utils.create_object import create_user
+from recipe.utils.fast_serializer import serialize_recipes
+from recipe.utils.sql_serializer import stream_recipes_json
+
+
+class Command(BaseCommand):
+    """Benchmark RecipeSerializer against the values and SQL backends."""
+    help = (
+        'Seed recipes inside a transaction that is rolled back, then time '
+        'the recipe list backends.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[1000, 10000],
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    self._run(size, options['repeat'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def _seed(self, size):
+        """Create size recipes with a few tags and ingredients each."""
+        rng = random.Random(size)
+        user = create_user(email=f'benchmark-{size}@example.com')
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=f'Tag {i}') for i in range(20)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'Ingredient {i}') for i in range(50)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=rng.randint(5, 120),
+                price=Decimal(rng.randint(100, 9999)) / 100,
+                link='https://example.com',
+            )
+            for i in range(size)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in recipes
+            for tag in rng.sample(tags, 3)
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(
+                recipe_id=recipe.id,
+                ingredient_id=ingredient.id,
+            )
+            for recipe in recipes
+            for ingredient in rng.sample(ingredients, 5)
+        )
+        return Recipe.objects.filter(user=user).order_by('-id').distinct()
+
+    def _run(self, size, repeat):
+        queryset = self._seed(size)
+        renderer = JSONRenderer()
+
+        # Without prefetching, RecipeSerializer runs two queries per recipe,
+        # which is far too slow to be a useful baseline at these sizes.
+        def with_serializer():
+            prefetched = queryset.prefetch_related('tags', 'ingredients')
+            return renderer.render(
+                RecipeSerializer(prefetched, many=True).data
+            )
+
+        def with_values():
+            return renderer.render(serialize_recipes(queryset))
+
+        def with_sql():
+            return ''.join(stream_recipes_json(queryset)).encode()
+
+        if with_values() != with_serializer():
+            self.stderr.write(self.style.ERROR('Outputs differ!'))
+
+        self.stdout.write(f'{size} recipes:')
+        results = {}
+        for name, func in [
+            ('serializer', with_serializer),
+            ('values', with_values),
+            ('sql', with_sql),
+        ]:
+            results[name] = measure(func, repeat=repeat)
+            self.stdout.write('  ' + format_stats(name, results[name]))
+
+        for name in ['values', 'sql']:
+            speedup = results['serializer']['p50'] / results[name]['p50']
+            self.stdout.write(self.style.SUCCESS(
+                f'  {name} is {speedup:.1f}x faster than serializer'
+            ))
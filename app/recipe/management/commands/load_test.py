@@ -0,0 +1,307 @@
+"""
+Django command to load test a running server with a mix of recipe requests.
+"""
+import asyncio
+import io
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from PIL import Image
+
+from core import loadgen
+from recipe.utils.seed import DISHES, TAGS
+
+
+DEFAULT_MIX = ['list=40', 'filter=25', 'detail=25', 'create=8', 'upload=2']
+BOUNDARY = 'loadtestboundary'
+
+
+def parse_mix(values):
+    """Turn ['name=weight', ...] into {name: weight}."""
+    mix = {}
+    for value in values:
+        name, _, weight = value.partition('=')
+        if name not in ACTIONS:
+            raise CommandError(
+                f'Unknown action {name!r}, choose from {", ".join(ACTIONS)}.'
+            )
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f'Invalid weight in {value!r}.')
+    if not any(mix.values()):
+        raise CommandError('The mix needs at least one positive weight.')
+    return mix
+
+
+def jpeg():
+    """Return a small JPEG image."""
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def multipart(field, filename, content):
+    """Return (content type, body) of a form uploading a single file."""
+    body = (
+        f'--{BOUNDARY}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; '
+        f'filename="{filename}"\r\n'
+        'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + content + f'\r\n--{BOUNDARY}--\r\n'.encode()
+    return f'multipart/form-data; boundary={BOUNDARY}', body
+
+
+class Session:
+    """A logged in user and the ids of the recipes and tags it owns."""
+
+    def __init__(self, token, recipe_ids, tag_ids):
+        self.headers = {'Authorization': f'Token {token}'}
+        self.recipe_ids = recipe_ids
+        self.tag_ids = tag_ids
+
+
+async def login(pool, email, password):
+    """Return the Session of a seeded user."""
+    status, _, body = await pool.request(
+        'POST',
+        '/api/user/token/',
+        {'Content-Type': 'application/json'},
+        json.dumps({'email': email, 'password': password}).encode(),
+    )
+    if status != 200:
+        raise CommandError(f'Login of {email} returned {status}.')
+    token = json.loads(body)['token']
+    headers = {'Authorization': f'Token {token}'}
+
+    _, _, recipes = await pool.request(
+        'GET', '/api/recipe/recipes/?fields=id', headers,
+    )
+    _, _, tags = await pool.request('GET', '/api/recipe/tags/', headers)
+    return Session(
+        token,
+        [recipe['id'] for recipe in json.loads(recipes)],
+        [tag['id'] for tag in json.loads(tags)],
+    )
+
+
+def recipe_list(session, rng, image):
+    return 'GET', '/api/recipe/recipes/', {}, b''
+
+
+def filtered_list(session, rng, image):
+    tags = rng.sample(session.tag_ids, min(2, len(session.tag_ids)))
+    query = ','.join(str(tag_id) for tag_id in tags)
+    return 'GET', f'/api/recipe/recipes/?tags={query}', {}, b''
+
+
+def recipe_detail(session, rng, image):
+    recipe_id = rng.choice(session.recipe_ids)
+    return 'GET', f'/api/recipe/recipes/{recipe_id}/', {}, b''
+
+
+def create_recipe(session, rng, image):
+    body = json.dumps({
+        'title': f'Load test {rng.choice(DISHES)}',
+        'time_minutes': rng.randint(5, 120),
+        'price': f'{rng.randint(100, 3000) / 100:.2f}',
+        'tags': [{'name': name} for name in rng.sample(TAGS, 3)],
+    }).encode()
+    return (
+        'POST',
+        '/api/recipe/recipes/',
+        {'Content-Type': 'application/json'},
+        body,
+    )
+
+
+def upload_image(session, rng, image):
+    recipe_id = rng.choice(session.recipe_ids)
+    content_type, body = multipart('image', 'load-test.jpg', image)
+    return (
+        'POST',
+        f'/api/recipe/recipes/{recipe_id}/upload-image/',
+        {'Content-Type': content_type},
+        body,
+    )
+
+
+# Each action returns (method, path, extra headers, body) for a session.
+ACTIONS = {
+    'list': recipe_list,
+    'filter': filtered_list,
+    'detail': recipe_detail,
+    'create': create_recipe,
+    'upload': upload_image,
+}
+
+# Actions pointing at something the user owns are only sent by the sessions
+# owning one: (Session attribute, what seed_data should have created).
+NEEDS = {
+    'detail': ('recipe_ids', 'recipes'),
+    'filter': ('tag_ids', 'tags'),
+    'upload': ('recipe_ids', 'recipes'),
+}
+
+
+class Command(BaseCommand):
+    """Drive a running server at a fixed request rate and report latency."""
+    help = (
+        'Log in --users users created by seed_data, then send a weighted mix '
+        'of recipe requests to --url at --rate requests per second. Latency '
+        'is reported both from when each request was due (corrected for '
+        'coordinated omission) and from when it was sent. Creates and '
+        'uploads write to the database of the server.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000')
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='--seed given to seed_data, which picks the user emails.',
+        )
+        parser.add_argument('--password', default='seedpass123')
+        parser.add_argument('--rate', type=float, default=50)
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument(
+            '--connections', type=int, default=50,
+            help='Most requests in flight; the others wait for a connection.',
+        )
+        parser.add_argument(
+            '--mix', nargs='+', default=DEFAULT_MIX,
+            help=f'Weights of the actions, e.g. {" ".join(DEFAULT_MIX)}.',
+        )
+        parser.add_argument('--output', help='Save the report as JSON.')
+
+    def handle(self, *args, **options):
+        if options['rate'] <= 0 or options['duration'] <= 0:
+            raise CommandError('--rate and --duration must be positive.')
+        # The requests are spread over the duration, so there must be one.
+        if options['rate'] * options['duration'] < 1:
+            raise CommandError(
+                '--rate times --duration must be at least one request.'
+            )
+        mix = parse_mix(options['mix'])
+        results = asyncio.run(self._run(mix, options))
+        summary = results.summary()
+        self._report(results, summary, options)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'created_at': loadgen.now(),
+                    'url': options['url'],
+                    'rate': options['rate'],
+                    'connections': options['connections'],
+                    'mix': mix,
+                    **summary,
+                }, f, indent=2)
+            self.stdout.write(f'Report saved to {options["output"]}.')
+
+    async def _run(self, mix, options):
+        pool = loadgen.ConnectionPool(options['url'], options['connections'])
+        try:
+            return await self._send_mix(pool, mix, options)
+        finally:
+            pool.close()
+
+    async def _send_mix(self, pool, mix, options):
+        try:
+            sessions = await asyncio.gather(*(
+                login(
+                    pool,
+                    f'seed{options["seed"]}-{i}@example.com',
+                    options['password'],
+                )
+                for i in range(options['users'])
+            ))
+        except loadgen.HTTPError as exc:
+            raise CommandError(f'Could not reach {options["url"]}: {exc}')
+
+        candidates = {}
+        for name, weight in mix.items():
+            if name not in NEEDS:
+                candidates[name] = sessions
+                continue
+            attribute, missing = NEEDS[name]
+            candidates[name] = [s for s in sessions if getattr(s, attribute)]
+            if weight and not candidates[name]:
+                raise CommandError(
+                    f'The users have no {missing}, run seed_data.'
+                )
+        self.stdout.write(
+            f'Logged in {len(sessions)} users, sending '
+            f'{options["rate"]:g} req/s for {options["duration"]:g}s.'
+        )
+
+        rng = random.Random(options['seed'])
+        image = jpeg()
+        names = list(mix)
+        weights = [mix[name] for name in names]
+
+        def pick():
+            name = rng.choices(names, weights)[0]
+            session = rng.choice(candidates[name])
+            return name, ACTIONS[name](session, rng, image), session
+
+        async def send(picked, results, due):
+            name, (method, path, headers, body), session = picked
+            await loadgen.timed(
+                pool, name, results, due, method, path,
+                {**session.headers, **headers}, body,
+            )
+
+        results = loadgen.Results()
+        await loadgen.run(
+            options['rate'], options['duration'], pick, send, results,
+        )
+        return results
+
+    def _report(self, results, summary, options):
+        self.stdout.write(
+            f'\n{summary["requests"]} requests in '
+            f'{summary["duration_s"]:.1f}s: '
+            f'{summary["throughput_rps"]:.1f} req/s '
+            f'(target {options["rate"]:g}), '
+            f'{summary["errors"]} errors ({summary["error_rate"]:.2%})'
+        )
+
+        columns = [f'p{pct}' for pct in loadgen.PERCENTILES] + ['max']
+        self.stdout.write(
+            f'\n{"":<22}{"requests":>9}{"errors":>8}'
+            + ''.join(f'{column:>9}' for column in columns)
+        )
+        rows = [('all', summary)] + sorted(summary['actions'].items())
+        for name, stats in rows:
+            for kind in ('corrected', 'uncorrected'):
+                latencies = stats[f'{kind}_ms']
+                self.stdout.write(
+                    f'{name if kind == "corrected" else "":<10}{kind:<12}'
+                    + (
+                        f'{stats["requests"]:>9}{stats["errors"]:>8}'
+                        if kind == 'corrected' else f'{"":>17}'
+                    )
+                    + ''.join(f'{latencies[c]:>7.1f}ms' for c in columns)
+                )
+
+        for action, stats in sorted(summary['actions'].items()):
+            statuses = ', '.join(
+                f'{status}: {count}'
+                for status, count in sorted(stats['statuses'].items())
+            )
+            self.stdout.write(f'{action} statuses: {statuses}')
+
+        for kind in ('corrected', 'uncorrected'):
+            samples = [
+                s for values in getattr(results, kind).values()
+                for s in values
+            ]
+            self.stdout.write(f'\n{kind.capitalize()} latency histogram:')
+            buckets = loadgen.histogram(samples)
+            most = max((count for _, count in buckets), default=0)
+            for bound, count in buckets:
+                bar = '#' * round(40 * count / most) if most else ''
+                self.stdout.write(f'  <= {bound:9.2f}ms {count:>7} {bar}')
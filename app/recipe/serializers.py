@@ -7,27 +7,58 @@ from core.models import (
     Tag,
     Ingredient,
 )
+from core.serializers import (
+    TimedListSerializer,
+    TimedSerializerMixin,
+    TracedSerializerMixin,
+)
+from core.tracing import span
+
+
+# Sparse fieldsets: the view puts the set of fields the client asked for
+# (with ?fields= or ?omit=) into the context, and we drop the others before
+# any representation is built. Nested serializers are created without a
+# context, so only the top level serializer is pruned.
+class SparseFieldsMixin:
+    """Drop the fields that were not requested."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('sparse_fields')
+
+        if requested is not None:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin,
+                           SparseFieldsMixin,
+                           serializers.ModelSerializer):
     """Serializer for ingredient view."""
 
     class Meta:
         model = Ingredient
         fields = ['id', 'name']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin,
+                    SparseFieldsMixin,
+                    serializers.ModelSerializer):
     """Serializer for tags."""
 
     class Meta:
         model = Tag
         fields = ['id', 'name']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin,
+                       TracedSerializerMixin,
+                       SparseFieldsMixin,
+                       serializers.ModelSerializer):
     """Serializer for recipes."""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -37,7 +68,9 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'time_minutes',
                   'price', 'link', 'tags', 'ingredients']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
 
+    @span('RecipeSerializer.get_or_create_tags')
     def _get_or_create_tags(self, tags, recipe):
         """Handle getting or creating tags as needed."""
         # self.context['request'] will return rest_framework.request.Request.
@@ -49,6 +82,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             )
             recipe.tags.add(tag_obj)
 
+    @span('RecipeSerializer.get_or_create_ingredients')
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle getting or creating ingredients as needed."""
         auth_user = self.context['request'].user
@@ -111,7 +145,9 @@ class RecipeDetailSerializer(RecipeSerializer):
 # We make image a seperated api because it is best practice to upload only
 # 1 type of data to an api. The recipe api has a form data, and the image
 # is image data, so we have to seperate 2 of them.
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedSerializerMixin,
+                            TracedSerializerMixin,
+                            serializers.ModelSerializer):
     """Serializer for uploading images to recipe."""
 
     class Meta:
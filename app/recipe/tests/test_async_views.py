@@ -0,0 +1,208 @@
+"""
+Tests for the async recipe read API.
+"""
+import asyncio
+import json
+import time
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import (
+    AsyncClient,
+    Client,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipe.utils.create_object import (
+    create_ingredient,
+    create_recipe,
+    create_tag,
+    create_user,
+)
+
+
+RECIPES_URL = reverse('recipe-async:recipe-list')
+TAGS_URL = reverse('recipe-async:tag-list')
+INGREDIENTS_URL = reverse('recipe-async:ingredient-list')
+
+
+def detail_url(name, pk):
+    """Create and return an async detail URL."""
+    return reverse(f'recipe-async:{name}-detail', args=[pk])
+
+
+# The async views query the database from their own threads, which can't see
+# the uncommitted data of a TestCase transaction.
+class AsyncReadApiTests(TransactionTestCase):
+    """Test the async views return the same data as the sync API."""
+
+    # The threads running the queries are kept for the whole test run, so
+    # their kept connections would stop the test database from being
+    # dropped.
+    @classmethod
+    def setUpClass(cls):
+        max_age = patch.dict(connection.settings_dict, CONN_MAX_AGE=0)
+        max_age.start()
+        cls.addClassCleanup(max_age.stop)
+        super().setUpClass()
+
+    def setUp(self):
+        self.user = create_user()
+        token = Token.objects.create(user=self.user)
+        self.token = token.key
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.sync_client = APIClient()
+        self.sync_client.force_authenticate(self.user)
+
+        self.tag = create_tag(self.user, name='Dinner')
+        self.ingredient = create_ingredient(self.user, name='Rice')
+        self.recipe = create_recipe(self.user, title='Pho')
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(self.ingredient)
+        create_recipe(self.user, title='Bun cha')
+        create_recipe(create_user(email='other@example.com'))
+
+    def assertSameAsSync(self, url, sync_url, params=None):
+        """Assert the async and sync responses have the same JSON."""
+        res = self.client.get(url, params or {})
+        sync_res = self.sync_client.get(sync_url, params or {})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(res.content), json.loads(sync_res.content))
+
+    def test_list_recipes(self):
+        """Test listing recipes."""
+        self.assertSameAsSync(RECIPES_URL, reverse('recipe:recipe-list'))
+
+    def test_filter_recipes(self):
+        """Test filtering recipes by tags and ingredients."""
+        self.assertSameAsSync(
+            RECIPES_URL,
+            reverse('recipe:recipe-list'),
+            {'tags': str(self.tag.id), 'ingredients': str(self.ingredient.id)},
+        )
+
+    def test_retrieve_recipe(self):
+        """Test retrieving a recipe with its details."""
+        self.assertSameAsSync(
+            detail_url('recipe', self.recipe.id),
+            reverse('recipe:recipe-detail', args=[self.recipe.id]),
+        )
+
+    def test_list_tags_and_ingredients(self):
+        """Test listing tags and ingredients."""
+        self.assertSameAsSync(TAGS_URL, reverse('recipe:tag-list'))
+        self.assertSameAsSync(
+            INGREDIENTS_URL,
+            reverse('recipe:ingredient-list'),
+            {'assigned_only': 1},
+        )
+
+    def test_retrieve_tag(self):
+        """Test retrieving a tag."""
+        res = self.client.get(detail_url('tag', self.tag.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            json.loads(res.content),
+            {'id': self.tag.id, 'name': 'Dinner'},
+        )
+
+    def test_other_users_recipe_not_found(self):
+        """Test another user's recipe is not found."""
+        other = create_recipe(create_user(email='third@example.com'))
+
+        res = self.client.get(detail_url('recipe', other.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_auth_required(self):
+        """Test a token is required."""
+        res = Client().get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(res['WWW-Authenticate'], 'Token')
+
+    def test_invalid_token(self):
+        """Test an invalid token is rejected."""
+        client = Client(HTTP_AUTHORIZATION='Token invalid')
+
+        res = client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_invalid_ids(self):
+        """Test filtering by ids that aren't integers is rejected."""
+        res = self.client.get(RECIPES_URL, {'tags': 'a,b'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RECIPE_FILTER_MAX_IDS=3)
+    def test_too_many_ids(self):
+        """Test filtering by more ids than allowed is rejected."""
+        res = self.client.get(RECIPES_URL, {'tags': '1,2,3,4'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(API_STATEMENT_TIMEOUT=50)
+    def test_slow_query_returns_503(self):
+        """Test a cancelled query gives a 503 with a retry hint."""
+        def slow(queryset):
+            return list(queryset.extra(
+                where=['(SELECT TRUE FROM pg_sleep(1))'],
+            ))
+
+        with patch('recipe.async_views.serialize_recipes', slow), \
+                self.assertLogs('core.timeouts', 'WARNING'):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '5')
+
+    def test_write_not_allowed(self):
+        """Test the async API is read only."""
+        res = self.client.post(RECIPES_URL, {'title': 'Pho'})
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(res['Allow'], 'GET')
+
+    async def test_concurrent_requests(self):
+        """Test concurrent requests are all served."""
+        # AsyncClient in Django 3.2 takes headers per request, by name.
+        client = AsyncClient()
+
+        responses = await asyncio.gather(*[
+            client.get(RECIPES_URL, authorization=f'Token {self.token}')
+            for _ in range(10)
+        ])
+
+        for res in responses:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(json.loads(res.content)), 2)
+
+    async def test_requests_run_concurrently(self):
+        """Test the middleware lets slow requests overlap under ASGI."""
+        def slow(queryset):
+            time.sleep(0.5)
+            return []
+
+        client = AsyncClient()
+        with patch('recipe.async_views.serialize_recipes', slow):
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[
+                client.get(RECIPES_URL, authorization=f'Token {self.token}')
+                for _ in range(4)
+            ])
+            elapsed = time.perf_counter() - start
+
+        for res in responses:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # One after the other, they would take 2 seconds.
+        self.assertLess(elapsed, 1.5)
@@ -0,0 +1,61 @@
+"""
+Tests for the benchmark_api command.
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import Recipe
+
+
+class BenchmarkApiTests(TestCase):
+    """Test running the benchmark suite and comparing results."""
+
+    def setUp(self):
+        handle, self.output = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, self.output)
+
+    def benchmark(self, **options):
+        """Run a tiny benchmark, returning its output."""
+        out = StringIO()
+        call_command(
+            'benchmark_api',
+            sizes=[5],
+            repeat=1,
+            warmup=1,
+            stdout=out,
+            **options,
+        )
+        return out.getvalue()
+
+    def test_results_saved(self):
+        """Test every case is timed and its queries counted."""
+        self.benchmark(output=self.output)
+
+        with open(self.output) as f:
+            results = json.load(f)['results']
+        self.assertIn('5/recipe list', results)
+        self.assertIn('5/token login', results)
+        for stats in results.values():
+            self.assertGreater(stats['queries'], 0)
+            self.assertLessEqual(stats['p50'], stats['p99'])
+        # The seeded data is rolled back.
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_regression_against_baseline(self):
+        """Test a slower or chattier case fails the comparison."""
+        self.benchmark(output=self.output)
+        with open(self.output) as f:
+            saved = json.load(f)
+        saved['results']['5/recipe detail']['queries'] -= 1
+        with open(self.output, 'w') as f:
+            json.dump(saved, f)
+
+        with self.assertRaises(CommandError):
+            self.benchmark(baseline=self.output, fail_on_regression=True)
@@ -0,0 +1,111 @@
+"""
+Tests for the values() based recipe serializer.
+"""
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+from recipe.serializers import RecipeSerializer
+from recipe.utils.fast_serializer import serialize_recipes
+from recipe.utils.create_object import (
+    create_recipe,
+    create_user,
+    create_ingredient,
+    create_tag,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class FastSerializerParityTests(TestCase):
+    """Test the fast serializer matches RecipeSerializer byte for byte."""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def assert_parity(self, queryset):
+        """Assert both serializers render the same JSON for queryset."""
+        expected = RecipeSerializer(queryset, many=True).data
+        actual = serialize_recipes(queryset)
+
+        self.assertEqual(actual, expected)
+        self.assertEqual(
+            JSONRenderer().render(actual),
+            JSONRenderer().render(expected),
+        )
+
+    def test_empty_queryset(self):
+        """Test serializing no recipes."""
+        self.assert_parity(Recipe.objects.none())
+
+    def test_recipes_without_relations(self):
+        """Test recipes without tags or ingredients."""
+        create_recipe(self.user, title='Pho', link='')
+        create_recipe(self.user, price=Decimal('0.50'))
+
+        self.assert_parity(Recipe.objects.order_by('-id'))
+
+    def test_recipes_with_relations(self):
+        """Test nested tags and ingredients keep their order."""
+        r1 = create_recipe(self.user, title='Curry')
+        r2 = create_recipe(self.user, title='Salad', price=Decimal('100'))
+        vegan = create_tag(self.user, name='Vegan')
+        dinner = create_tag(self.user, name='Dinner')
+        salt = create_ingredient(self.user, name='Salt')
+        rice = create_ingredient(self.user, name='Rice')
+        r1.tags.add(vegan)
+        r1.tags.add(dinner)
+        r2.tags.add(dinner)
+        r1.ingredients.add(rice)
+        r1.ingredients.add(salt)
+
+        self.assert_parity(Recipe.objects.order_by('-id'))
+        self.assert_parity(Recipe.objects.order_by('title'))
+
+
+class FastListAPITests(TestCase):
+    """Test the recipe list API with the values backend."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_list_matches_serializer_backend(self):
+        """Test both list backends return identical responses."""
+        other_user = create_user(email='other@example.com')
+        create_recipe(other_user)
+        recipe = create_recipe(self.user)
+        recipe.tags.add(create_tag(self.user))
+        recipe.ingredients.add(create_ingredient(self.user))
+        create_recipe(self.user, title='Second recipe')
+
+        with override_settings(RECIPE_LIST_BACKEND='serializer'):
+            expected = self.client.get(RECIPES_URL)
+        with override_settings(RECIPE_LIST_BACKEND='values'):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+        self.assertEqual(res.content, expected.content)
+
+    def test_filters_apply_to_values_backend(self):
+        """Test tag filtering works with the values backend."""
+        r1 = create_recipe(self.user, title='Vegan curry')
+        create_recipe(self.user, title='Steak')
+        tag = create_tag(self.user, name='Vegan')
+        r1.tags.add(tag)
+
+        with override_settings(RECIPE_LIST_BACKEND='values'):
+            res = self.client.get(RECIPES_URL, {'tags': f'{tag.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, RecipeSerializer([r1], many=True).data)
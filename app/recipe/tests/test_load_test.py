@@ -0,0 +1,165 @@
+"""
+Tests for the load_test command and the load generator.
+"""
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import LiveServerTestCase, SimpleTestCase, override_settings
+
+from core import loadgen
+from core.models import Recipe, Tag
+from recipe.management.commands.load_test import parse_mix
+from recipe.utils.seed import BulkWriter, Seeder
+
+
+class LoadGeneratorTests(SimpleTestCase):
+    """Test the load generator helpers."""
+
+    def test_corrected_latency_counts_from_due_time(self):
+        """Test the corrected latency includes the wait before sending."""
+        results = loadgen.Results()
+        results.started, results.finished = 0, 2
+        results.record('list', due=0.0, sent=0.5, done=0.6, status=200)
+        results.record('list', due=1.0, sent=1.0, done=1.1, status=503)
+
+        summary = results.summary()
+
+        self.assertEqual(summary['requests'], 2)
+        self.assertEqual(summary['throughput_rps'], 1)
+        self.assertEqual(summary['errors'], 1)
+        self.assertAlmostEqual(summary['corrected_ms']['max'], 600)
+        self.assertAlmostEqual(summary['uncorrected_ms']['max'], 100)
+        self.assertEqual(
+            summary['actions']['list']['statuses'],
+            {'200': 1, '503': 1},
+        )
+
+    def test_histogram_buckets(self):
+        """Test latencies are counted in log spaced buckets."""
+        buckets = loadgen.histogram([0.001, 0.001, 0.1], buckets_per_decade=1)
+
+        self.assertEqual(buckets, [(1, 2), (10, 0), (100, 1)])
+
+    def test_parse_mix(self):
+        """Test the mix is parsed and unknown actions are rejected."""
+        self.assertEqual(
+            parse_mix(['list=3', 'create=1']),
+            {'list': 3, 'create': 1},
+        )
+        with self.assertRaises(CommandError):
+            parse_mix(['delete=1'])
+
+    def test_no_requests(self):
+        """Test a rate and duration sending no request are rejected."""
+        with self.assertRaises(CommandError):
+            call_command(
+                'load_test', rate=0.5, duration=1, stdout=StringIO(),
+            )
+
+
+class LoadTestCommandTests(LiveServerTestCase):
+    """Test driving the live test server with the load_test command."""
+
+    # Each request runs on a new thread, which ends without closing its
+    # database connection. Kept connections would then stop the test
+    # database from being dropped.
+    @classmethod
+    def setUpClass(cls):
+        max_age = patch.dict(connection.settings_dict, CONN_MAX_AGE=0)
+        max_age.start()
+        cls.addClassCleanup(max_age.stop)
+        super().setUpClass()
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        handle, self.output = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, self.output)
+
+        seeder = Seeder(
+            BulkWriter('default', 1000), 7, make_password('loadpass123'),
+            'seed7',
+        )
+        for chunk in seeder.plan(2, 10):
+            seeder.seed_chunk(*chunk)
+
+    def test_load_test_report(self):
+        """Test every action is sent and the report is saved."""
+        out = StringIO()
+        call_command(
+            'load_test',
+            url=self.live_server_url,
+            users=2,
+            seed=7,
+            password='loadpass123',
+            rate=40,
+            duration=1,
+            connections=4,
+            mix=['list=1', 'filter=1', 'detail=1', 'create=1', 'upload=1'],
+            output=self.output,
+            stdout=out,
+        )
+
+        with open(self.output) as f:
+            report = json.load(f)
+        self.assertEqual(report['requests'], 40)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(
+            set(report['actions']),
+            {'list', 'filter', 'detail', 'create', 'upload'},
+        )
+        self.assertEqual(
+            report['actions']['create']['statuses'],
+            {'201': report['actions']['create']['requests']},
+        )
+        self.assertIn('Corrected latency histogram', out.getvalue())
+        self.assertTrue(Recipe.objects.filter(
+            title__startswith='Load test',
+        ).exists())
+
+    @patch.object(
+        loadgen.ConnectionPool, 'close',
+        autospec=True, side_effect=loadgen.ConnectionPool.close,
+    )
+    def test_unknown_users(self, mock_close):
+        """Test a failed login stops the run and closes the connections."""
+        with self.assertRaises(CommandError):
+            call_command(
+                'load_test',
+                url=self.live_server_url,
+                users=1,
+                seed=8,
+                duration=1,
+                stdout=StringIO(),
+            )
+
+        mock_close.assert_called_once()
+
+    def test_filter_needs_tags(self):
+        """Test filtering is refused when the users have no tags."""
+        Tag.objects.all().delete()
+
+        with self.assertRaisesMessage(CommandError, 'no tags'):
+            call_command(
+                'load_test',
+                url=self.live_server_url,
+                users=2,
+                seed=7,
+                password='loadpass123',
+                duration=1,
+                mix=['list=1', 'filter=1'],
+                stdout=StringIO(),
+            )
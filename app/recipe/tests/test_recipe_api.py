@@ -7,7 +7,7 @@ import os
 
 from PIL import Image
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from rest_framework import status
@@ -536,6 +536,23 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(s3.data, res.data)
         self.assertIn(s4.data, res.data)
 
+    @override_settings(RECIPE_FILTER_MAX_IDS=3)
+    def test_filter_too_many_ids(self):
+        """Test filtering by more ids than allowed is rejected."""
+        res = self.client.get(RECIPES_URL, {'tags': '1,2,3,4'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.get(RECIPES_URL, {'ingredients': '1,2,3'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_filter_invalid_ids(self):
+        """Test filtering by ids that aren't integers is rejected."""
+        res = self.client.get(RECIPES_URL, {'tags': 'a,b'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class ImageUploadTests(TestCase):
     """Tests for the image upload API."""
@@ -0,0 +1,105 @@
+"""
+Tests for the seed_data command.
+"""
+import random
+from io import StringIO
+from statistics import median
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from core.models import Recipe
+from recipe.utils.seed import zipf_counts
+
+
+def seed(**options):
+    """Run seed_data quietly."""
+    call_command('seed_data', stdout=StringIO(), **options)
+
+
+def signature(seed_number):
+    """Return the generated data of a seed, without the ids."""
+    recipes = Recipe.objects.filter(
+        user__email__startswith=f'seed{seed_number}-',
+    ).prefetch_related('tags', 'ingredients').select_related('user')
+    return sorted(
+        (
+            recipe.user.email,
+            recipe.title,
+            recipe.time_minutes,
+            recipe.price,
+            recipe.description,
+            tuple(sorted(tag.name for tag in recipe.tags.all())),
+            tuple(sorted(i.name for i in recipe.ingredients.all())),
+        )
+        for recipe in recipes
+    )
+
+
+class ZipfTests(SimpleTestCase):
+    """Test splitting recipes between users."""
+
+    def test_counts_are_skewed(self):
+        """Test all recipes are given out, mostly to a few users."""
+        counts = zipf_counts(10000, 100, 1.1, random.Random(0))
+
+        self.assertEqual(sum(counts), 10000)
+        self.assertGreater(max(counts), 20 * median(counts))
+
+    def test_counts_are_deterministic(self):
+        """Test the same seed gives the same counts."""
+        self.assertEqual(
+            zipf_counts(1000, 50, 1.1, random.Random(3)),
+            zipf_counts(1000, 50, 1.1, random.Random(3)),
+        )
+
+
+class SeedDataTests(TestCase):
+    """Test generating data."""
+
+    def test_seed(self):
+        """Test users, recipes and links are created for one user."""
+        seed(users=30, recipes=600, seed=1)
+
+        users = get_user_model().objects.filter(email__startswith='seed1-')
+        self.assertEqual(users.count(), 30)
+        self.assertEqual(Recipe.objects.filter(user__in=users).count(), 600)
+        self.assertTrue(users[0].check_password('seedpass123'))
+        recipe = Recipe.objects.filter(tags__isnull=False).first()
+        for tag in recipe.tags.all():
+            self.assertEqual(tag.user_id, recipe.user_id)
+        self.assertGreaterEqual(recipe.ingredients.count(), 1)
+        for ingredient in recipe.ingredients.all():
+            self.assertEqual(ingredient.user_id, recipe.user_id)
+
+    def test_copy_matches_bulk_create(self):
+        """Test COPY and bulk_create write the same data for a seed."""
+        seed(users=20, recipes=300, seed=2, batch_size=50)
+        expected = signature(2)
+
+        seed(users=20, recipes=300, seed=2, copy=True, flush=True)
+
+        self.assertEqual(len(expected), 300)
+        self.assertEqual(signature(2), expected)
+
+    def test_existing_seed(self):
+        """Test a seed is not generated twice."""
+        seed(users=2, recipes=5, seed=3)
+
+        with self.assertRaises(CommandError):
+            seed(users=2, recipes=5, seed=3)
+
+
+class ParallelSeedDataTests(TransactionTestCase):
+    """Test generating data with several jobs."""
+
+    def test_jobs_match_single_process(self):
+        """Test the data doesn't depend on the number of jobs."""
+        seed(users=250, recipes=2000, seed=4, copy=True)
+        expected = signature(4)
+
+        seed(users=250, recipes=2000, seed=4, copy=True, jobs=2, flush=True)
+
+        self.assertEqual(signature(4), expected)
@@ -0,0 +1,104 @@
+"""
+Tests for the ?fields= and ?omit= query parameters.
+"""
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from recipe.utils.create_object import (
+    create_recipe,
+    create_user,
+    create_ingredient,
+    create_tag,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL."""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class SparseFieldsetTests(TestCase):
+    """Test sparse fieldsets on the recipe API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user, title='Pho')
+        self.recipe.tags.add(create_tag(self.user, name='Dinner'))
+        self.recipe.ingredients.add(create_ingredient(self.user, name='Rice'))
+
+    def test_list_with_fields(self):
+        """Test only the requested fields are returned."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{'id': self.recipe.id, 'title': 'Pho'}])
+        # A single query without prefetching tags or ingredients.
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"core_recipe"."link"', queries[0]['sql'])
+
+    def test_list_with_omit(self):
+        """Test omitted fields are left out."""
+        res = self.client.get(RECIPES_URL, {'omit': 'tags,ingredients'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(res.data[0]),
+            ['id', 'title', 'time_minutes', 'price', 'link'],
+        )
+
+    def test_list_prefetches_requested_relations(self):
+        """Test only the requested relation is prefetched."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, {'fields': 'id,tags'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Dinner')
+        self.assertEqual(len(queries), 2)
+
+    def test_retrieve_with_fields(self):
+        """Test detail only fields can be requested."""
+        res = self.client.get(
+            detail_url(self.recipe.id),
+            {'fields': 'description,ingredients'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(res.data), {'description', 'ingredients'})
+
+    def test_unknown_field_error(self):
+        """Test asking for an unknown field returns an error."""
+        res = self.client.get(RECIPES_URL, {'fields': 'id,password'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', res.data)
+
+    def test_update_ignores_fields(self):
+        """Test sparse fieldsets don't apply to write requests."""
+        url = f'{detail_url(self.recipe.id)}?fields=id'
+        res = self.client.patch(url, {'title': 'Bun cha'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Bun cha')
+        self.assertIn('tags', res.data)
+
+    def test_tag_list_with_fields(self):
+        """Test sparse fieldsets on the tag list keep the ordering."""
+        create_tag(self.user, name='Breakfast')
+
+        res = self.client.get(TAGS_URL, {'fields': 'id'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 2)
+        self.assertEqual(list(res.data[0]), ['id'])
@@ -0,0 +1,104 @@
+"""
+Tests for the Postgres built recipe list.
+"""
+import json
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+from recipe.serializers import RecipeSerializer
+from recipe.utils.sql_serializer import stream_recipes_json
+from recipe.utils.create_object import (
+    create_recipe,
+    create_user,
+    create_ingredient,
+    create_tag,
+)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def decode(chunks):
+    """Join and decode streamed JSON chunks."""
+    return json.loads(''.join(
+        chunk.decode() if isinstance(chunk, bytes) else chunk
+        for chunk in chunks
+    ))
+
+
+class SQLSerializerTests(TestCase):
+    """Test the JSON built by Postgres matches RecipeSerializer."""
+
+    def setUp(self):
+        self.user = create_user()
+
+    def test_empty_queryset(self):
+        """Test an empty queryset gives an empty list."""
+        queryset = Recipe.objects.filter(user=self.user)
+
+        self.assertEqual(decode(stream_recipes_json(queryset)), [])
+
+    def test_recipes_with_relations(self):
+        """Test recipes with nested tags and ingredients."""
+        r1 = create_recipe(self.user, title='Café "curry"')
+        create_recipe(self.user, price=Decimal('100'), link='')
+        r1.tags.add(create_tag(self.user, name='Vegan'))
+        r1.tags.add(create_tag(self.user, name='Dinner'))
+        r1.ingredients.add(create_ingredient(self.user, name='Rice'))
+
+        queryset = Recipe.objects.filter(user=self.user).order_by('-id')
+        expected = json.loads(json.dumps(
+            RecipeSerializer(queryset, many=True).data
+        ))
+
+        self.assertEqual(decode(stream_recipes_json(queryset)), expected)
+
+
+class SQLListAPITests(TestCase):
+    """Test the recipe list API with the sql backend."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(RECIPE_LIST_BACKEND='sql')
+    def test_list_streams_json(self):
+        """Test the list is streamed and limited to the user."""
+        other_user = create_user(email='other@example.com')
+        create_recipe(other_user)
+        recipe = create_recipe(self.user)
+        recipe.tags.add(create_tag(self.user))
+        create_recipe(self.user, title='Second recipe')
+
+        res = self.client.get(RECIPES_URL)
+
+        recipes = Recipe.objects.filter(user=self.user).order_by('-id')
+        expected = json.loads(json.dumps(
+            RecipeSerializer(recipes, many=True).data
+        ))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual(decode(res.streaming_content), expected)
+
+    @override_settings(RECIPE_LIST_BACKEND='sql')
+    def test_filter_by_ingredients(self):
+        """Test ingredient filtering works with the sql backend."""
+        r1 = create_recipe(self.user, title='Fried egg')
+        create_recipe(self.user, title='Steak')
+        egg = create_ingredient(self.user, name='Egg')
+        r1.ingredients.add(egg)
+
+        res = self.client.get(RECIPES_URL, {'ingredients': f'{egg.id}'})
+
+        data = decode(res.streaming_content)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['id'], r1.id)
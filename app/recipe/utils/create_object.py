@@ -12,30 +12,33 @@ from core.models import (
 )
 
 
-def create_tag(user, **kwargs):
-    """Create and return a tag."""
+# The build_* functions return unsaved objects with the same defaults, so
+# they can be inserted many at a time with bulk_create (see the seed_data
+# command). They take user_id instead of user to skip loading users.
+def build_tag(user_id, **kwargs):
+    """Return an unsaved tag."""
     defaults = {
-        'user': user,
+        'user_id': user_id,
         'name': 'Sample tag',
     }
     defaults.update(kwargs)
-    return Tag.objects.create(**defaults)
+    return Tag(**defaults)
 
 
-def create_ingredient(user, **kwargs):
-    """Create and return an ingredient."""
+def build_ingredient(user_id, **kwargs):
+    """Return an unsaved ingredient."""
     defaults = {
-        'user': user,
+        'user_id': user_id,
         'name': 'Sample ingredient',
     }
     defaults.update(kwargs)
-    return Ingredient.objects.create(**defaults)
+    return Ingredient(**defaults)
 
 
-def create_recipe(user, **kwargs):
-    """Create and return a recipe."""
+def build_recipe(user_id, **kwargs):
+    """Return an unsaved recipe."""
     defaults = {
-        'user': user,
+        'user_id': user_id,
         'title': 'Sample recipe',
         'time_minutes': 15,
         'price': Decimal('6.99'),
@@ -43,7 +46,40 @@ def create_recipe(user, **kwargs):
         'description': 'This is a description',
     }
     defaults.update(kwargs)
-    return Recipe.objects.create(**defaults)
+    return Recipe(**defaults)
+
+
+def build_user(password_hash, **kwargs):
+    """Return an unsaved user whose password is already hashed."""
+    # Hashing is deliberately slow, so callers creating many users hash one
+    # password with make_password() and share it.
+    defaults = {
+        'email': 'test@example.com',
+        'password': password_hash,
+    }
+    defaults.update(kwargs)
+    return get_user_model()(**defaults)
+
+
+def create_tag(user, **kwargs):
+    """Create and return a tag."""
+    tag = build_tag(user.id, **kwargs)
+    tag.save()
+    return tag
+
+
+def create_ingredient(user, **kwargs):
+    """Create and return an ingredient."""
+    ingredient = build_ingredient(user.id, **kwargs)
+    ingredient.save()
+    return ingredient
+
+
+def create_recipe(user, **kwargs):
+    """Create and return a recipe."""
+    recipe = build_recipe(user.id, **kwargs)
+    recipe.save()
+    return recipe
 
 
 def create_user(**kwargs):
@@ -0,0 +1,392 @@
+"""
+Generate large amounts of realistic looking recipe data.
+"""
+import io
+import itertools
+import math
+import random
+from decimal import Decimal
+
+from django.db import connections, transaction
+
+from core.models import Recipe
+from recipe.utils.create_object import (
+    build_ingredient,
+    build_tag,
+    build_user,
+)
+
+
+TAGS = [
+    'Breakfast', 'Lunch', 'Dinner', 'Dessert', 'Snack', 'Vegan',
+    'Vegetarian', 'Gluten free', 'Dairy free', 'Low carb', 'Keto', 'Paleo',
+    'Quick', 'Easy', 'Healthy', 'Comfort food', 'Spicy', 'Sweet', 'Savory',
+    'Soup', 'Salad', 'Baking', 'Grill', 'Slow cooker', 'One pot', 'Party',
+    'Kids', 'Budget', 'Holiday', 'Summer', 'Winter', 'Italian', 'Mexican',
+    'Vietnamese', 'Thai', 'Indian', 'Japanese', 'French', 'Greek', 'Korean',
+]
+
+INGREDIENTS = [
+    'Salt', 'Pepper', 'Olive oil', 'Butter', 'Garlic', 'Onion', 'Sugar',
+    'Flour', 'Egg', 'Milk', 'Water', 'Lemon', 'Tomato', 'Chicken', 'Beef',
+    'Pork', 'Rice', 'Pasta', 'Potato', 'Carrot', 'Celery', 'Ginger',
+    'Soy sauce', 'Fish sauce', 'Lime', 'Cilantro', 'Basil', 'Parsley',
+    'Thyme', 'Rosemary', 'Oregano', 'Cumin', 'Paprika', 'Chili', 'Cinnamon',
+    'Vanilla', 'Honey', 'Cream', 'Cheddar', 'Parmesan', 'Mozzarella',
+    'Yogurt', 'Bread', 'Noodles', 'Tofu', 'Shrimp', 'Salmon', 'Tuna',
+    'Bacon', 'Mushroom', 'Spinach', 'Kale', 'Broccoli', 'Cauliflower',
+    'Zucchini', 'Eggplant', 'Bell pepper', 'Corn', 'Peas', 'Beans',
+    'Chickpeas', 'Lentils', 'Avocado', 'Apple', 'Banana', 'Strawberry',
+    'Blueberry', 'Orange', 'Coconut milk', 'Peanut butter', 'Almonds',
+    'Walnuts', 'Oats', 'Maple syrup', 'Vinegar', 'Mustard', 'Mayonnaise',
+    'Ketchup', 'Stock', 'Wine', 'Sesame oil', 'Scallion', 'Shallot',
+    'Leek', 'Cabbage', 'Cucumber', 'Lettuce', 'Sweet potato', 'Pumpkin',
+    'Chocolate', 'Cocoa', 'Baking soda', 'Baking powder', 'Yeast', 'Lamb',
+    'Turkey', 'Duck', 'Crab', 'Squid', 'Bok choy', 'Lemongrass', 'Star anise',
+]
+
+ADJECTIVES = [
+    'Classic', 'Easy', 'Crispy', 'Creamy', 'Spicy', 'Grilled', 'Roasted',
+    'Smoky', 'Fresh', 'Homemade', 'Quick', 'Slow cooked', 'Sticky', 'Zesty',
+]
+
+DISHES = [
+    'Soup', 'Salad', 'Stew', 'Curry', 'Stir fry', 'Pie', 'Tacos', 'Bowl',
+    'Pasta', 'Noodles', 'Sandwich', 'Casserole', 'Skewers', 'Cake', 'Bread',
+]
+
+SENTENCES = [
+    'Prep everything before you start cooking.',
+    'Season to taste and serve warm.',
+    'Keeps in the fridge for up to three days.',
+    'Works just as well with leftovers.',
+    'Double the sauce if you like it saucy.',
+    'Let it rest for ten minutes before serving.',
+]
+
+TIMES = [5, 10, 15, 20, 25, 30, 40, 45, 60, 75, 90, 120, 180, 240]
+
+PRICES = [Decimal(cents).scaleb(-2) for cents in range(100, 5000, 7)]
+
+LINKS = ['', 'https://example.com/recipes']
+
+# Every way of picking up to three sentences, in order.
+DESCRIPTIONS = [
+    ' '.join(sentences)
+    for size in range(4)
+    for sentences in itertools.combinations(SENTENCES, size)
+]
+
+# Users are generated in chunks of CHUNK_USERS, the unit of work of the
+# parallel jobs, and their recipes in slices of RECIPE_SLICE. Both are fixed
+# so that the batch size doesn't change the data.
+CHUNK_USERS = 100
+RECIPE_SLICE = 1000
+
+RECIPE_COLUMNS = (
+    'user_id', 'title', 'time_minutes', 'price', 'description', 'link',
+)
+
+
+def zipf_counts(total, users, exponent, rng):
+    """Split total between users following Zipf's law, in random order."""
+    weights = [1 / rank ** exponent for rank in range(1, users + 1)]
+    scale = total / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    # Rounding down leaves a few rows over, given to the heaviest users.
+    for i in range(total - sum(counts)):
+        counts[i % users] += 1
+
+    rng.shuffle(counts)
+    return counts
+
+
+def zipf_cum_weights(size, exponent=1.0):
+    """Return cumulative weights making the first items the most popular."""
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+class BulkWriter:
+    """Insert rows with bulk_create."""
+
+    def __init__(self, using, batch_size, check_foreign_keys=True):
+        self.using = using
+        self.batch_size = batch_size
+        self.check_foreign_keys = check_foreign_keys
+
+    def prepare(self):
+        """Tune the session of this process's connection for loading."""
+        with connections[self.using].cursor() as cursor:
+            # Losing the last batches in a crash is fine for generated data.
+            cursor.execute('SET synchronous_commit = off')
+            # Foreign keys are checked row by row at commit, which takes
+            # most of the time. The generated ids are consistent, so the
+            # triggers doing it can be skipped, but only by a superuser.
+            if not self.check_foreign_keys:
+                cursor.execute('SET session_replication_role = replica')
+
+    def write(self, model, objs):
+        """Insert objs, setting their ids."""
+        model.objects.using(self.using).bulk_create(
+            objs,
+            batch_size=self.batch_size,
+        )
+
+    def write_rows(self, model, columns, rows):
+        """Insert rows (tuples of columns values), return their ids."""
+        objs = [model(**dict(zip(columns, row))) for row in rows]
+        self.write(model, objs)
+        return [obj.id for obj in objs]
+
+    def write_links(self, through, columns, pairs):
+        """Insert m2m rows given as (from_id, to_id) pairs of columns."""
+        through.objects.using(self.using).bulk_create(
+            [through(**dict(zip(columns, pair))) for pair in pairs],
+            batch_size=self.batch_size,
+        )
+
+
+# COPY skips parsing an INSERT per row and is several times faster than
+# bulk_create. Postgres can't return the ids of copied rows, so they are
+# reserved from the table's sequence first.
+class CopyWriter(BulkWriter):
+    """Insert rows with Postgres COPY."""
+
+    def _reserve_ids(self, table, count):
+        # Unlike moving the sequence with setval(), nextval() is safe with
+        # several jobs (or the app) inserting at the same time.
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) "
+                "FROM generate_series(1, %s)",
+                [table, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _copy(self, table, columns, rows):
+        # The generated text never contains tabs, newlines or backslashes,
+        # so it doesn't need escaping for COPY's text format.
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(
+                '\\N' if value is None else str(value) for value in row
+            ))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        with connections[self.using].cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {table} ({", ".join(columns)}) FROM STDIN',
+                buffer,
+            )
+
+    def write(self, model, objs):
+        if not objs:
+            return
+        meta = model._meta
+        conn = connections[self.using]
+        fields = meta.concrete_fields
+        for obj, pk in zip(objs, self._reserve_ids(meta.db_table, len(objs))):
+            obj.pk = pk
+
+        self._copy(
+            meta.db_table,
+            [field.column for field in fields],
+            (
+                [
+                    field.get_db_prep_save(getattr(obj, field.attname), conn)
+                    for field in fields
+                ]
+                for obj in objs
+            ),
+        )
+
+    def write_rows(self, model, columns, rows):
+        table = model._meta.db_table
+        ids = self._reserve_ids(table, len(rows))
+        self._copy(
+            table,
+            ('id', *columns),
+            ((pk, *row) for pk, row in zip(ids, rows)),
+        )
+        return ids
+
+    def write_links(self, through, columns, pairs):
+        self._copy(through._meta.db_table, columns, pairs)
+
+
+class Seeder:
+    """Generate users with a Zipfian number of recipes each."""
+
+    def __init__(self, writer, seed, password_hash, email_prefix,
+                 exponent=1.1, batch_size=10000, progress=None):
+        self.writer = writer
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.password_hash = password_hash
+        self.email_prefix = email_prefix
+        self.exponent = exponent
+        self.batch_size = batch_size
+        self.progress = progress
+        self.totals = {'users': 0, 'recipes': 0, 'tags': 0, 'ingredients': 0,
+                       'recipe_tags': 0, 'recipe_ingredients': 0}
+        self._tag_weights = zipf_cum_weights(len(TAGS))
+        self._ingredient_weights = zipf_cum_weights(len(INGREDIENTS))
+
+    def _vocabulary(self, words, cum_weights, size):
+        """Return size distinct words, popular ones being more likely."""
+        chosen = {}
+        while len(chosen) < size:
+            for word in self.rng.choices(words, cum_weights=cum_weights,
+                                         k=size - len(chosen)):
+                chosen[word] = None
+        return list(chosen)
+
+    def _links(self, ids, cum_weights, counts):
+        """Return one list of distinct ids per count, favouring the first."""
+        picked = self.rng.choices(ids, cum_weights=cum_weights, k=sum(counts))
+        links = []
+        start = 0
+        for count in counts:
+            links.append(dict.fromkeys(picked[start:start + count]))
+            start += count
+        return links
+
+    # Drawing all the values of a user's recipes with one choices() call
+    # per column, and writing plain rows instead of model instances, is what
+    # makes millions of recipes affordable.
+    def _recipes(self, user_id, count, tags, ingredients):
+        """Return (rows, tag ids, ingredient ids) of count new recipes."""
+        rng = self.rng
+        names = rng.choices(
+            [ingredient.name for ingredient in ingredients],
+            cum_weights=self._ingredient_weights[:len(ingredients)],
+            k=count,
+        )
+        rows = [
+            (user_id, f'{adjective} {name} {dish}', time_minutes, price,
+             description, link)
+            for adjective, name, dish, time_minutes, price, description, link
+            in zip(
+                rng.choices(ADJECTIVES, k=count),
+                names,
+                rng.choices(DISHES, k=count),
+                rng.choices(TIMES, k=count),
+                rng.choices(PRICES, k=count),
+                rng.choices(DESCRIPTIONS, k=count),
+                rng.choices(LINKS, k=count),
+            )
+        ]
+        tag_ids = self._links(
+            [tag.id for tag in tags],
+            self._tag_weights[:len(tags)],
+            rng.choices(range(0, 5), k=count),
+        )
+        ingredient_ids = self._links(
+            [ingredient.id for ingredient in ingredients],
+            self._ingredient_weights[:len(ingredients)],
+            rng.choices(range(3, 9), k=count),
+        )
+        return rows, tag_ids, ingredient_ids
+
+    def plan(self, users, recipes):
+        """Return [(index, first user, recipe counts)] chunks of users."""
+        counts = zipf_counts(recipes, users, self.exponent, self.rng)
+        return [
+            (index, start, counts[start:start + CHUNK_USERS])
+            for index, start in enumerate(range(0, users, CHUNK_USERS))
+        ]
+
+    # Every chunk has its own random generator, so the data only depends on
+    # the seed, whichever job (and in whatever order) generates the chunk.
+    def seed_chunk(self, index, start, counts):
+        """Create a chunk of users with their tags, ingredients and recipes."""
+        self.rng = random.Random(f'{self.seed}:{index}')
+        writer = self.writer
+        with transaction.atomic(using=writer.using):
+            user_objs = [
+                build_user(
+                    self.password_hash,
+                    email=f'{self.email_prefix}-{start + i}@example.com',
+                    name=f'Seed user {start + i}',
+                )
+                for i in range(len(counts))
+            ]
+            writer.write(type(user_objs[0]), user_objs)
+
+            # Heavy users have bigger vocabularies.
+            vocabularies = []
+            tag_objs, ingredient_objs = [], []
+            for user, count in zip(user_objs, counts):
+                size = min(len(TAGS), 3 + int(math.log2(count + 1) * 2))
+                tags = [
+                    build_tag(user.id, name=name) for name in
+                    self._vocabulary(TAGS, self._tag_weights, size)
+                ]
+                size = min(len(INGREDIENTS), 8 + int(math.log2(count + 1) * 6))
+                ingredients = [
+                    build_ingredient(user.id, name=name) for name in
+                    self._vocabulary(INGREDIENTS, self._ingredient_weights,
+                                     size)
+                ]
+                tag_objs.extend(tags)
+                ingredient_objs.extend(ingredients)
+                vocabularies.append((user.id, count, tags, ingredients))
+            writer.write(type(tag_objs[0]), tag_objs)
+            writer.write(type(ingredient_objs[0]), ingredient_objs)
+
+        self.totals['users'] += len(user_objs)
+        self.totals['tags'] += len(tag_objs)
+        self.totals['ingredients'] += len(ingredient_objs)
+
+        rows, tag_ids, ingredient_ids = [], [], []
+        for user_id, count, tags, ingredients in vocabularies:
+            for offset in range(0, count, RECIPE_SLICE):
+                user_rows, user_tag_ids, user_ingredient_ids = self._recipes(
+                    user_id,
+                    min(RECIPE_SLICE, count - offset),
+                    tags,
+                    ingredients,
+                )
+                rows += user_rows
+                tag_ids += user_tag_ids
+                ingredient_ids += user_ingredient_ids
+                if len(rows) >= self.batch_size:
+                    self._write_recipes(rows, tag_ids, ingredient_ids)
+                    rows, tag_ids, ingredient_ids = [], [], []
+        self._write_recipes(rows, tag_ids, ingredient_ids)
+
+    def _write_recipes(self, rows, tag_ids, ingredient_ids):
+        """Insert a batch of recipes with their tags and ingredients."""
+        if not rows:
+            return
+
+        writer = self.writer
+        with transaction.atomic(using=writer.using):
+            recipe_ids = writer.write_rows(Recipe, RECIPE_COLUMNS, rows)
+            tag_links = [
+                (recipe_id, tag_id)
+                for recipe_id, ids in zip(recipe_ids, tag_ids)
+                for tag_id in ids
+            ]
+            ingredient_links = [
+                (recipe_id, ingredient_id)
+                for recipe_id, ids in zip(recipe_ids, ingredient_ids)
+                for ingredient_id in ids
+            ]
+            writer.write_links(
+                Recipe.tags.through, ('recipe_id', 'tag_id'), tag_links,
+            )
+            writer.write_links(
+                Recipe.ingredients.through,
+                ('recipe_id', 'ingredient_id'),
+                ingredient_links,
+            )
+
+        self.totals['recipes'] += len(rows)
+        self.totals['recipe_tags'] += len(tag_links)
+        self.totals['recipe_ingredients'] += len(ingredient_links)
+        if self.progress:
+            self.progress(self.totals)
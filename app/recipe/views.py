@@ -1,6 +1,9 @@
 """
 Views for the recipe API.
 """
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
 from drf_spectacular.utils import (
     extend_schema_view,
     extend_schema,
@@ -16,8 +19,15 @@ from rest_framework import (
     status,
 )
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError, ValidationError
 from rest_framework.response import Response
 
+from core.mixins import (
+    QueryTimeoutMixin,
+    ReplicaReadMixin,
+    ShardMixin,
+    TracingMixin,
+)
 from core.models import (
     Recipe,
     Tag,
@@ -25,6 +35,8 @@ from core.models import (
 )
 
 from recipe import serializers
+from recipe.utils.fast_serializer import serialize_recipes
+from recipe.utils.sql_serializer import stream_recipes_json
 # DRF is a toolkit built on top of the Django web framework that reduces
 # the amount of code you need to write to create REST interfaces.
 
@@ -56,6 +68,80 @@ from recipe import serializers
 # evoke both get function.
 
 
+SPARSE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to return',
+    ),
+    OpenApiParameter(
+        'omit',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to leave out',
+    ),
+]
+
+
+def _split_fields(value):
+    """Convert a comma separated string to a set of field names."""
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+# Sparse fieldsets let a client ask for fewer fields, e.g. only id and title
+# for a picker. Besides shrinking the response, the requested fields decide
+# which columns are loaded (only()) and which relations are prefetched, so a
+# narrow request is cheaper for the database too. They only apply to read
+# requests, because saving an instance loaded with only() would skip the
+# deferred columns.
+class SparseFieldsetMixin:
+    """Support ?fields= and ?omit= query parameters on read requests."""
+    # relations that need prefetch_related() when they are requested.
+    prefetch_fields = []
+
+    def get_sparse_fields(self):
+        """Return the set of requested fields, or None for all of them."""
+        fields = self.request.query_params.get('fields')
+        omit = self.request.query_params.get('omit')
+
+        if (self.request.method not in permissions.SAFE_METHODS
+                or not (fields or omit)):
+            return None
+
+        available = set(self.get_serializer_class().Meta.fields)
+        requested = _split_fields(fields) if fields else set(available)
+        omitted = _split_fields(omit) if omit else set()
+        unknown = (requested | omitted) - available
+
+        if unknown:
+            raise ValidationError({
+                'fields': [
+                    f'Unknown field: {name}' for name in sorted(unknown)
+                ],
+            })
+
+        return requested - omitted
+
+    def prune_queryset(self, queryset):
+        """Load only the columns and relations the response needs."""
+        fields = self.get_sparse_fields()
+
+        if fields is None:
+            fields = set(self.get_serializer_class().Meta.fields)
+
+        related = [name for name in self.prefetch_fields if name in fields]
+        columns = fields - set(self.prefetch_fields)
+
+        # The primary key is always loaded, so listing it keeps only() valid
+        # when the client asked for relations only.
+        return queryset.prefetch_related(*related).only('id', *columns)
+
+    def get_serializer_context(self):
+        """Add the requested fields to the serializer context."""
+        context = super().get_serializer_context()
+        context['sparse_fields'] = self.get_sparse_fields()
+        return context
+
+
 # both APIView and ViewSet are used for building APIs.
 # the main difference between them is an APIView can handle SINGLE HTTP
 # request, while a ViewSet can handle MULTIPLE HTTP requests. for that reason,
@@ -74,20 +160,38 @@ from recipe import serializers
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredient IDs to filter',
             )
-        ]
-    )
+        ] + SPARSE_FIELDS_PARAMETERS
+    ),
+    retrieve=extend_schema(parameters=SPARSE_FIELDS_PARAMETERS),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(QueryTimeoutMixin,
+                    TracingMixin,
+                    ShardMixin,
+                    ReplicaReadMixin,
+                    SparseFieldsetMixin,
+                    viewsets.ModelViewSet):
     """View for manage recipe API."""
     # most situations beside listing, we want to use RecipeDetailSerializer.
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
     authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
+    prefetch_fields = ['tags', 'ingredients']
 
+    # Each id is another join candidate for the filter, so a long list on a
+    # big account makes a slow query. The list is capped, and the query is
+    # still bounded by the statement timeout (see QueryTimeoutMixin).
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers."""
-        return [int(str_id) for str_id in qs.split(',')]
+        str_ids = qs.split(',')
+        if len(str_ids) > settings.RECIPE_FILTER_MAX_IDS:
+            raise ParseError(
+                f'At most {settings.RECIPE_FILTER_MAX_IDS} ids can be given.'
+            )
+        try:
+            return [int(str_id) for str_id in str_ids]
+        except ValueError:
+            raise ParseError('Ids must be comma separated integers.')
 
     # By default, it will return all, but we only want recipes for
     # authenticated user.
@@ -104,10 +208,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
             ingredient_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredient_ids)
 
-        return queryset.filter(
+        queryset = queryset.filter(
             user=self.request.user
         ).order_by('-id').distinct()
 
+        if self.action in ('list', 'retrieve'):
+            queryset = self.prune_queryset(queryset)
+
+        return queryset
+
     def get_serializer_class(self):
         """return the serializer class for request."""
         # if action is list, we return RecipeSerializer.
@@ -118,6 +227,31 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return self.serializer_class
 
+    # RecipeSerializer spends most of its time building fields and nested
+    # serializers for every recipe. When RECIPE_LIST_BACKEND is 'values', we
+    # build the same output from plain dicts instead. When it is 'sql',
+    # Postgres builds the JSON documents and we stream the text as it is, so
+    # it only applies to JSON responses (not the browsable API). Pagination
+    # needs model instances and both build every field, so they are only
+    # used without pagination or a sparse fieldset.
+    def list(self, request, *args, **kwargs):
+        """List recipes for the authenticated user."""
+        backend = settings.RECIPE_LIST_BACKEND
+
+        if (self.paginator is None and backend in ('values', 'sql')
+                and self.get_sparse_fields() is None):
+            queryset = self.filter_queryset(self.get_queryset())
+
+            if backend == 'values':
+                return Response(serialize_recipes(queryset))
+            if request.accepted_renderer.format == 'json':
+                return StreamingHttpResponse(
+                    stream_recipes_json(queryset),
+                    content_type='application/json',
+                )
+
+        return super().list(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Create a new recipe."""
         # when creating the recipe, the user attr is missing, so we have to
@@ -182,10 +316,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 enum=[0, 1],
                 description='Filter by items assigned to recipes.',
             )
-        ]
+        ] + SPARSE_FIELDS_PARAMETERS
     )
 )
-class BaseRecipeAttrViewSet(mixins.UpdateModelMixin,
+class BaseRecipeAttrViewSet(QueryTimeoutMixin,
+                            TracingMixin,
+                            ShardMixin,
+                            ReplicaReadMixin,
+                            SparseFieldsetMixin,
+                            mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             mixins.DestroyModelMixin,
                             viewsets.GenericViewSet):
@@ -203,10 +342,15 @@ class BaseRecipeAttrViewSet(mixins.UpdateModelMixin,
         if assigned_only:
             queryset = queryset.filter(recipe__isnull=False)
 
-        return queryset.filter(
+        queryset = queryset.filter(
             user=self.request.user
         ).order_by('-name').distinct()
 
+        if self.action == 'list':
+            queryset = self.prune_queryset(queryset)
+
+        return queryset
+
 
 # In RecipeViewSet, we extend ModelViewSet because we can perform all CRUD
 # operations on recipe. But in TagViewSet, we can not create tag in recipe,
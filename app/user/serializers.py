@@ -13,6 +13,11 @@ from django.utils.translation import gettext as _
 
 from rest_framework import serializers
 
+from core.serializers import (
+    TimedSerializerMixin,
+    TracedSerializerMixin,
+)
+
 
 # ModelSerializer class provides a shortcut that lets you automatically
 # create a Serializer class with fields that correspond to the model fields.
@@ -21,7 +26,9 @@ from rest_framework import serializers
 # 2. Automatically generate validators for serializer.
 # 3. Include simple default implementations of .create() and .update()
 # https://www.django-rest-framework.org/api-guide/serializers/#modelserializer
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin,
+                     TracedSerializerMixin,
+                     serializers.ModelSerializer):
     """Serializer for the user object."""
 
     # tell framework the model, fields and extra arguments we want to parse
@@ -59,7 +66,7 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class AuthTokenSerializer(serializers.Serializer):
+class AuthTokenSerializer(TracedSerializerMixin, serializers.Serializer):
     """Serializer for the user auth token."""
     email = serializers.EmailField()
     password = serializers.CharField(
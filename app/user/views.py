@@ -5,24 +5,37 @@ from rest_framework import generics, authentication, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core.mixins import (
+    QueryTimeoutMixin,
+    ReplicaReadMixin,
+    TracingMixin,
+)
+
 from .serializers import (
     UserSerializer,
     AuthTokenSerializer,
 )
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(QueryTimeoutMixin,
+                     TracingMixin,
+                     generics.CreateAPIView):
     """Create a new user in the system."""
     serializer_class = UserSerializer
 
 
-class CreateTokenView(ObtainAuthToken):
+class CreateTokenView(QueryTimeoutMixin, TracingMixin, ObtainAuthToken):
     """Create a new auth token for user."""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    # ObtainAuthToken only accepts form and JSON data by default.
+    parser_classes = api_settings.DEFAULT_PARSER_CLASSES
 
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+class ManageUserView(QueryTimeoutMixin,
+                     TracingMixin,
+                     ReplicaReadMixin,
+                     generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
     # we will use token authentication.
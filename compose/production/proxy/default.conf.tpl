@@ -5,9 +5,45 @@ server {
         alias /vol/static;
     }
 
+    location /api/async/ {
+        proxy_pass           http://${ASGI_HOST}:${ASGI_PORT};
+        proxy_set_header     Host $host;
+        proxy_set_header     X-Forwarded-For $proxy_add_x_forwarded_for;
+        proxy_set_header     X-Forwarded-Proto $scheme;
+        proxy_set_header     X-Request-ID $request_id;
+    }
+
+    # The JSON API is served by the API-only workers (see app/settings_api.py).
+    location /api/ {
+        uwsgi_pass           ${API_HOST}:${API_PORT};
+        include              /etc/nginx/uwsgi_params;
+        uwsgi_param          HTTP_X_REQUEST_ID $request_id;
+        client_max_body_size 10M;
+    }
+
+    # The schema and the docs are served by the app, with the full settings.
+    location ~ ^/api/(schema|docs)/ {
+        uwsgi_pass           ${APP_HOST}:${APP_PORT};
+        include              /etc/nginx/uwsgi_params;
+        uwsgi_param          HTTP_X_REQUEST_ID $request_id;
+    }
+
+    # The metrics have no user authentication, so only the scraper may read
+    # them (METRICS_ALLOW is an address or a CIDR range).
+    location = /metrics {
+        allow                ${METRICS_ALLOW};
+        deny                 all;
+        uwsgi_pass           ${APP_HOST}:${APP_PORT};
+        include              /etc/nginx/uwsgi_params;
+    }
+
     location / {
         uwsgi_pass           ${APP_HOST}:${APP_PORT};
         include              /etc/nginx/uwsgi_params;
+        # $request_id becomes the trace id of requests without a traceparent
+        # header, so traces can be found from the access log. traceparent and
+        # tracestate are passed on like every other request header.
+        uwsgi_param          HTTP_X_REQUEST_ID $request_id;
         client_max_body_size 10M;
     }
 }
\ No newline at end of file